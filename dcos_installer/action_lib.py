@@ -5,6 +5,7 @@ import os
 from typing import Optional
 
 import pkgpanda
+import pkgpanda.util
 import ssh.utils
 from dcos_installer.constants import (
     BOOTSTRAP_DIR,
@@ -31,6 +32,15 @@ def get_async_runner(config, hosts, async_delegate=None):
     # if ssh_parallelism is not set, use 20 concurrent ssh sessions by default.
     parallelism = config.hacky_default_get('ssh_parallelism', 20)
 
+    # if ssh_adaptive_parallelism is true, the parallelism is reduced while the commands run slower than usual.
+    adaptive_parallelism = str(config.hacky_default_get('ssh_adaptive_parallelism', 'true')).lower() == 'true'
+
+    # if deploy_peer_fanout is set, nodes which already received the deploy artifacts forward them to the others.
+    peer_fanout = int(config.hacky_default_get('deploy_peer_fanout', 0))
+
+    # if ssh_max_failures is set, hosts which did not start yet are skipped once more hosts than that failed.
+    max_failures = config.hacky_default_get('ssh_max_failures', '')
+
     return ssh.runner.MultiRunner(
         hosts,
         user=config['ssh_user'],
@@ -39,7 +49,11 @@ def get_async_runner(config, hosts, async_delegate=None):
         extra_opts=extra_ssh_options,
         async_delegate=async_delegate,
         parallelism=parallelism,
-        default_port=int(config.hacky_default_get('ssh_port', 22)))
+        default_port=int(config.hacky_default_get('ssh_port', 22)),
+        multiplex=True,
+        peer_fanout=peer_fanout,
+        adaptive_parallelism=adaptive_parallelism,
+        max_failures=int(max_failures) if max_failures not in (None, '') else None)
 
 
 def add_pre_action(chain, ssh_user):
@@ -119,45 +133,40 @@ def run_preflight(config, pf_script_path=(SERVE_DIR + '/dcos_install.sh'), block
     cleanup_chain = ssh.utils.CommandChain('preflight_cleanup')
     add_post_action(cleanup_chain)
     chains.append(cleanup_chain)
+    # Besides preflight.json, the progress of every host is streamed to preflight.events.jsonl.
+    delegate_extra_params = dict(nodes_count_by_type(config), event_log=True)
     result = yield from pf.run_commands_chain_async(chains, block=block, state_json_dir=state_json_dir,
-                                                    delegate_extra_params=nodes_count_by_type(config))
+                                                    delegate_extra_params=delegate_extra_params)
     return result
 
 
-def _add_copy_dcos_install(chain, local_install_path=SERVE_DIR):
-    dcos_install_script = 'dcos_install.sh'
-    local_install_path = os.path.join(local_install_path, dcos_install_script)
-    remote_install_path = os.path.join(REMOTE_TEMP_DIR, dcos_install_script)
-    chain.add_copy(local_install_path, remote_install_path, stage='Copying dcos_install.sh')
-
-
-def _add_copy_package_list(chain, local_package_list_path):
-    remote_dir = os.path.join(REMOTE_TEMP_DIR, 'package_lists')
-    chain.add_execute(['mkdir', '-p', remote_dir], stage='Creating directory')
-    chain.add_copy(local_package_list_path, remote_dir, stage='Copying package list')
-
-
-def _add_copy_packages(chain, local_pkg_base_path=SERVE_DIR):
+def _get_deploy_artifacts(bootstrap_tarball, cluster_package_list, local_pkg_base_path=SERVE_DIR):
+    """Return a mapping of local artifact paths to their location relative to REMOTE_TEMP_DIR."""
     if not os.path.isfile(CLUSTER_PACKAGES_PATH):
         err_msg = '{} not found'.format(CLUSTER_PACKAGES_PATH)
         log.error(err_msg)
         raise ExecuteException(err_msg)
 
+    artifacts = {
+        os.path.join(local_pkg_base_path, 'dcos_install.sh'): 'dcos_install.sh',
+        bootstrap_tarball: os.path.join('bootstrap', os.path.basename(bootstrap_tarball)),
+        cluster_package_list: os.path.join('package_lists', os.path.basename(cluster_package_list)),
+    }
+
     cluster_packages = pkgpanda.load_json(CLUSTER_PACKAGES_PATH)
     for package, params in cluster_packages.items():
-        destination_package_dir = os.path.join(REMOTE_TEMP_DIR, 'packages', package)
         local_pkg_path = os.path.join(local_pkg_base_path, params['filename'])
-
-        chain.add_execute(['mkdir', '-p', destination_package_dir], stage='Creating package directory')
-        chain.add_copy(local_pkg_path, destination_package_dir,
-                       stage='Copying packages')
+        artifacts[local_pkg_path] = os.path.join('packages', package, os.path.basename(params['filename']))
+    return artifacts
 
 
-def _add_copy_bootstap(chain, local_bs_path):
-    remote_bs_path = REMOTE_TEMP_DIR + '/bootstrap'
-    chain.add_execute(['mkdir', '-p', remote_bs_path], stage='Creating directory')
-    chain.add_copy(local_bs_path, remote_bs_path,
-                   stage='Copying bootstrap')
+def _add_stream_artifacts(chain, bootstrap_tarball, cluster_package_list, compress=False):
+    # Everything a node needs goes out as one tar stream over a single SSH session rather than one
+    # mkdir + scp round trip per artifact.
+    artifacts = _get_deploy_artifacts(bootstrap_tarball, cluster_package_list)
+    checksums = {name: pkgpanda.util.sha1(path) for path, name in artifacts.items()}
+    chain.add_stream(artifacts, REMOTE_TEMP_DIR, compress=compress, checksums=checksums,
+                     stage='Copying {} DC/OS artifacts'.format(len(artifacts)))
 
 
 def _get_bootstrap_tarball(tarball_base_dir=BOOTSTRAP_DIR):
@@ -287,10 +296,9 @@ def install_dcos(
     chains.append(chain)
 
     add_pre_action(chain, runner.user)
-    _add_copy_dcos_install(chain)
-    _add_copy_packages(chain)
-    _add_copy_bootstap(chain, bootstrap_tarball)
-    _add_copy_package_list(chain, cluster_package_list)
+    # The artifacts are mostly xz compressed already, so gzip on top of them is only worth it on slow links.
+    compress = str(config.hacky_default_get('deploy_compress_artifacts', 'false')).lower() == 'true'
+    _add_stream_artifacts(chain, bootstrap_tarball, cluster_package_list, compress=compress)
 
     chain.add_execute(
         lambda node: (
@@ -298,8 +306,9 @@ def install_dcos(
         stage=lambda node: 'Installing DC/OS'
     )
 
-    # UI expects total_masters, total_agents to be top level keys in deploy.json
-    delegate_extra_params = nodes_count_by_type(config)
+    # UI expects total_masters, total_agents to be top level keys in deploy.json, the progress of every host is
+    # streamed to deploy.events.jsonl as well.
+    delegate_extra_params = dict(nodes_count_by_type(config), event_log=True)
     if kwargs.get('retry') and state_json_dir:
         state_file_path = os.path.join(state_json_dir, 'deploy.json')
         log.debug('retry executed for a state file deploy.json')
@@ -3,6 +3,9 @@ local shmlock = require "resty.lock"
 local http = require "resty.http"
 local resolver = require "resty.resolver"
 local util = require "util"
+-- Provides the capacity() and free_space() methods of the SHM dicts reported
+-- by `get_status`, which the builtin shdict API lacks.
+require "resty.core.shdict"
 
 -- In order to make caching code testable, these constants need to be
 -- configurable/exposed through env vars.
@@ -11,19 +14,20 @@ local util = require "util"
 --
 -- CACHE_FIRST_POLL_DELAY << CACHE_EXPIRATION < CACHE_POLL_PERIOD < CACHE_MAX_AGE_SOFT_LIMIT < CACHE_MAX_AGE_HARD_LIMIT
 --
--- There are 3 requests (2xMarathon + Mesos) made to upstream components.
+-- There are 3 requests (2xMarathon + Mesos) made to upstream components and
+-- one DNS query for the Mesos leader. They are all made concurrently, each in
+-- its own light thread, so a refresh takes as long as the slowest of them and
+-- a slow or broken backend does not delay or break the refresh of the others.
 -- The cache should be kept locked for the whole time until
 -- the responses are received from all the components. Therefore,
--- 3 * (CACHE_BACKEND_REQUEST_TIMEOUT + 2) <= CACHE_REFRESH_LOCK_TIMEOUT
--- The 2s delay between requests is choosen arbitrarily.
+-- CACHE_BACKEND_REQUEST_TIMEOUT + 2 <= CACHE_REFRESH_LOCK_TIMEOUT
+-- The 2s margin is choosen arbitrarily.
 -- On the other hand, the documentation
 -- (https://github.com/openresty/lua-resty-lock#new) says that the
 -- CACHE_REFRESH_LOCK_TIMEOUT should not exceed the expiration time, which
--- is equal to 3 * (CACHE_BACKEND_REQUEST_TIMEOUT + 2). Taking into account
--- both constraints, we would have to set CACHE_REFRESH_LOCK_TIMEOUT =
--- 3 * (CACHE_BACKEND_REQUEST_TIMEOUT + 2). We set it to
--- 3 * CACHE_BACKEND_REQUEST_TIMEOUT hoping that the 2 requests to Marathon and
--- 1 request to Mesos will be done immediately one after another.
+-- is equal to 3 * (CACHE_BACKEND_REQUEST_TIMEOUT + 2) in order to leave some
+-- headroom for the processing of the responses. We set
+-- CACHE_REFRESH_LOCK_TIMEOUT to 3 * CACHE_BACKEND_REQUEST_TIMEOUT.
 -- Before changing CACHE_POLL_INTERVAL, please check the comment for resolver
 -- CACHE_BACKEND_REQUEST_TIMEOUT << CACHE_REFRESH_LOCK_TIMEOUT
 --
@@ -73,13 +77,45 @@ for key, value in pairs(env_vars) do
     end
 end
 
+-- Per-worker cache of the decoded SHM cache entries, keyed by the entry name.
+--
+-- Decoding cache entries can cost more than proxying the request itself, so
+-- every worker decodes a given entry (or record of a keyed entry, see
+-- KEYED_ENTRIES) only once per refresh, i.e. until its `*_last_refresh`
+-- timestamp or its generation changes. The decoded tables are shared by all
+-- the requests handled by the worker and must not be modified.
+local decoded_entries = {}
+
+-- Statistics of the cache refreshes and reads, as reported by `get_status`.
+-- They are kept in a dedicated SHM zone, so that they are shared by all the
+-- workers and never evict the cache entries themselves.
+local function stats_set(key, value)
+    local ok, err = ngx.shared.cache_stats:set(key, value)
+    if not ok then
+        ngx.log(ngx.WARN, "Could not store cache statistic `" .. key .. "`: " .. err)
+    end
+end
+
+local function stats_incr(key, value)
+    ngx.shared.cache_stats:incr(key, value, 0)
+end
+
+local function record_duration(name, step, start)
+    -- Store how long `step` (fetch, decode or encode) of the refresh of entry
+    -- `name` which began at `start` took.
+    ngx.update_time()
+    stats_set(name .. ":" .. step .. "_duration", ngx.now() - start)
+end
+
 local function cache_data(key, value)
     -- Store key/value pair to SHM cache (shared across workers).
     -- Return true upon success, false otherwise.
     -- Expected to run within lock context.
 
+    -- Like the records of keyed entries, plain entries must never evict
+    -- the records in use when the SHM zone is full.
     local cache = ngx.shared.cache
-    local success, err, forcible = cache:set(key, value)
+    local success, err = cache:safe_set(key, value)
     if success then
         return true
     end
@@ -91,6 +127,122 @@ local function cache_data(key, value)
 end
 
 
+-- Mesos state and Marathon apps are big, while a request needs just one
+-- agent, framework or app out of them. Hence they are not stored as a single
+-- JSON document, but with one SHM key per record:
+--
+--   <entry name>:<generation>:<table name>:<record key>
+--
+-- All the records stored by a single refresh share a generation number, and
+-- the `<entry name>` key holds the generation currently in use. It is
+-- switched only once all the records of the new generation have been stored,
+-- so readers never see a mix of two refreshes. The records of the previous
+-- generation are kept for the requests that are still using them until the
+-- next refresh starts storing a new generation. At most two generations are
+-- thus stored at a time: the `lua_shared_dict cache` zone must fit twice the
+-- encoded size of the state (see the `size` fields of the cache status). All
+-- the writes use `safe_set`, so a full zone fails the refresh and leaves the
+-- current generation in use rather than evicting its records.
+--
+-- The tables each keyed entry consists of. An entry with a single table is
+-- exposed as that table by `get_cache_entry`.
+local KEYED_ENTRIES = {
+    mesosstate = {"agent_pids", "f_by_id", "f_by_name"},
+    svcapps = {"apps"},
+}
+
+local function delete_keys(keys)
+    local cache = ngx.shared.cache
+    for _, key in ipairs(keys) do
+        cache:delete(key)
+    end
+end
+
+local function delete_generation(name, generation)
+    -- Delete all the records of given generation of a keyed entry.
+    local cache = ngx.shared.cache
+    local index_key = name .. ":" .. generation .. ":keys"
+
+    local keys_json = cache:get(index_key)
+    if keys_json == nil then
+        return
+    end
+    local keys = cjson_safe.decode(keys_json)
+    if keys ~= nil then
+        delete_keys(keys)
+    end
+    cache:delete(index_key)
+end
+
+local function cache_keyed_data(name, records)
+    -- Store `records` ({table name = {record key = value}}) to SHM as a new
+    -- generation of the keyed entry `name` and make it the current one.
+    -- Return true upon success, false otherwise.
+    -- Expected to run within lock context.
+    local cache = ngx.shared.cache
+    ngx.update_time()
+    local encode_start = ngx.now()
+
+    -- Make room for the new generation first.
+    local obsolete = cache:get(name .. "_previous")
+    if obsolete ~= nil then
+        delete_generation(name, obsolete)
+        cache:delete(name .. "_previous")
+    end
+
+    local generation, err = cache:incr(name .. "_generation", 1, 0)
+    if generation == nil then
+        ngx.log(ngx.ERR, "Could not allocate new generation of " .. name .. ": " .. err)
+        return false
+    end
+    local prefix = name .. ":" .. generation .. ":"
+
+    local keys = {}
+    local size = 0
+    for table_name, records_table in pairs(records) do
+        for record_key, value in pairs(records_table) do
+            local key = prefix .. table_name .. ":" .. record_key
+            local value_json = cjson_safe.encode(value)
+            size = size + #key + #value_json
+            -- Don't let the records of a refresh evict the ones in use when
+            -- the SHM zone is full, fail the refresh instead.
+            local ok, err = cache:safe_set(key, value_json)
+            if not ok then
+                ngx.log(ngx.ERR, "Could not store " .. key .. " to state cache: " .. err)
+                delete_keys(keys)
+                return false
+            end
+            table.insert(keys, key)
+        end
+    end
+
+    -- Remember the keys of the new generation, so that they can be deleted
+    -- once it is no longer used.
+    local ok, err = cache:safe_set(prefix .. "keys", cjson_safe.encode(keys))
+    if not ok then
+        ngx.log(ngx.ERR, "Could not store the keys of " .. prefix .. " to state cache: " .. err)
+        delete_keys(keys)
+        return false
+    end
+
+    local previous = cache:get(name)
+    if not cache_data(name, generation) then
+        delete_generation(name, generation)
+        return false
+    end
+    if previous ~= nil and not cache_data(name .. "_previous", previous) then
+        -- Nothing would ever delete it otherwise.
+        delete_generation(name, previous)
+    end
+
+    record_duration(name, "encode", encode_start)
+    stats_set(name .. ":size", size)
+    ngx.log(ngx.INFO, string.format(
+        "Stored %d records (%d bytes) as generation %d of %s", #keys, size, generation, name))
+    return true
+end
+
+
 local function request(url, accept_404_reply, auth_token)
     -- We need to make sure that Nginx does not reuse the TCP connection here,
     -- as i.e. during failover it could result in fetching data from e.g. Mesos
@@ -148,16 +300,40 @@ end
 local function fetch_and_store_marathon_apps(auth_token)
     -- Access Marathon through localhost.
     ngx.log(ngx.NOTICE, "Cache Marathon app state")
+    ngx.update_time()
+    local fetch_start = ngx.now()
     local appsRes, err = request(UPSTREAM_MARATHON .. "/v2/apps?embed=apps.tasks&label=DCOS_SERVICE_NAME",
                                  false,
                                  auth_token)
+    record_duration("svcapps", "fetch", fetch_start)
 
     if err then
         ngx.log(ngx.NOTICE, "Marathon app request failed: " .. err)
         return
     end
 
+    local cache = ngx.shared.cache
+
+    -- The apps of a stable cluster rarely change, so skip processing and
+    -- storing them again if Marathon returned exactly the same response as
+    -- during the previous refresh. The digest is stored only after the apps
+    -- have been stored successfully.
+    local body_digest = ngx.md5(appsRes.body)
+    if body_digest == cache:get("svcapps_body_digest") and cache:get("svcapps") ~= nil then
+        local skipped = cache:incr("svcapps_skipped_refreshes", 1, 0)
+        ngx.log(ngx.INFO,
+                "Marathon apps did not change, skipping update (" ..
+                tostring(skipped) .. " refreshes skipped so far)")
+        ngx.update_time()
+        if cache_data("svcapps_last_refresh", ngx.now()) then
+            ngx.log(ngx.INFO, "Marathon apps cache has been successfully updated")
+        end
+        return
+    end
+
+    local decode_start = ngx.now()
     local apps, err = cjson_safe.decode(appsRes.body)
+    record_duration("svcapps", "decode", decode_start)
     if not apps then
         ngx.log(ngx.WARN, "Cannot decode Marathon apps JSON: " .. err)
         return
@@ -302,13 +478,12 @@ local function fetch_and_store_marathon_apps(auth_token)
        ::continue::
     end
 
-    svcApps_json = cjson_safe.encode(svcApps)
-
     ngx.log(ngx.DEBUG, "Storing Marathon apps data to SHM.")
-    if not cache_data("svcapps", svcApps_json) then
+    if not cache_keyed_data("svcapps", {apps=svcApps}) then
         ngx.log(ngx.ERR, "Storing marathon apps cache failed")
         return
     end
+    cache_data("svcapps_body_digest", body_digest)
 
     ngx.update_time()
     local time_now = ngx.now()
@@ -320,6 +495,7 @@ local function fetch_and_store_marathon_apps(auth_token)
 end
 
 function store_leader_data(leader_name, leader_ip)
+    local mleader
     if HOST_IP == 'unknown' or leader_ip == 'unknown' then
         ngx.log(ngx.ERR,
         "Private IP address of the host is unknown, aborting cache-entry creation for ".. leader_name .. " leader")
@@ -337,6 +513,7 @@ function store_leader_data(leader_name, leader_ip)
         ngx.log(ngx.ERR, "Storing " .. leader_name .. " leader cache failed")
         return
     end
+    stats_set(leader_name .. "_leader:size", #mleader)
 
     ngx.update_time()
     local time_now = ngx.now()
@@ -349,7 +526,11 @@ end
 
 
 local function fetch_generic_leader(leaderAPI_url, leader_name, auth_token)
+    local stats_name = leader_name .. "_leader"
+    ngx.update_time()
+    local fetch_start = ngx.now()
     local mleaderRes, err = request(leaderAPI_url, true, auth_token)
+    record_duration(stats_name, "fetch", fetch_start)
 
     if err then
         ngx.log(ngx.WARN, leader_name .. " leader request failed: " .. err)
@@ -370,7 +551,9 @@ local function fetch_generic_leader(leaderAPI_url, leader_name, auth_token)
         res_body = mleaderRes.body
     end
 
+    local decode_start = ngx.now()
     local mleader, err = cjson_safe.decode(res_body)
+    record_duration(stats_name, "decode", decode_start)
     if not mleader then
         ngx.log(ngx.WARN, "Cannot decode " .. leader_name .. " leader JSON: " .. err)
         return nil
@@ -381,7 +564,7 @@ end
 
 
 local function fetch_and_store_marathon_leader(auth_token)
-    leader_ip = fetch_generic_leader(
+    local leader_ip = fetch_generic_leader(
         UPSTREAM_MARATHON .. "/v2/leader", "marathon", auth_token)
 
     if leader_ip ~= nil then
@@ -393,16 +576,21 @@ end
 local function fetch_and_store_state_mesos(auth_token)
     -- Fetch state JSON summary from Mesos. If successful, store to SHM cache.
     -- Expected to run within lock context.
+    ngx.update_time()
+    local fetch_start = ngx.now()
     local response, err = request(UPSTREAM_MESOS .. "/master/state-summary",
                                   false,
                                   auth_token)
+    record_duration("mesosstate", "fetch", fetch_start)
 
     if err then
         ngx.log(ngx.NOTICE, "Mesos state request failed: " .. err)
         return
     end
 
+    local decode_start = ngx.now()
     local raw_state_summary, err = cjson_safe.decode(response.body)
+    record_duration("mesosstate", "decode", decode_start)
     if not raw_state_summary then
         ngx.log(ngx.WARN, "Cannot decode Mesos state-summary JSON: " .. err)
         return
@@ -425,14 +613,12 @@ local function fetch_and_store_state_mesos(auth_token)
     end
 
     for _, agent in ipairs(raw_state_summary["slaves"]) do
-        a_id = agent["id"]
+        local a_id = agent["id"]
         parsed_state_summary['agent_pids'][a_id] = agent["pid"]
     end
 
-    local parsed_state_summary_json = cjson_safe.encode(parsed_state_summary)
-
     ngx.log(ngx.DEBUG, "Storing parsed Mesos state to SHM.")
-    if not cache_data("mesosstate", parsed_state_summary_json) then
+    if not cache_keyed_data("mesosstate", parsed_state_summary) then
         ngx.log(ngx.WARN, "Storing parsed Mesos state to cache failed")
         return
     end
@@ -501,7 +687,10 @@ end
 
 
 local function fetch_and_store_mesos_leader()
-    leader_ip = fetch_mesos_leader_state()
+    ngx.update_time()
+    local fetch_start = ngx.now()
+    local leader_ip = fetch_mesos_leader_state()
+    record_duration("mesos_leader", "fetch", fetch_start)
 
     if leader_ip ~= nil then
         store_leader_data("mesos", leader_ip)
@@ -509,6 +698,16 @@ local function fetch_and_store_mesos_leader()
 end
 
 
+-- Cache entries and the functions that fetch and store them. The name of
+-- each entry is also the prefix of its `*_last_refresh` timestamp.
+local BACKENDS = {
+    {name="mesosstate", fetch=fetch_and_store_state_mesos},
+    {name="svcapps", fetch=fetch_and_store_marathon_apps},
+    {name="marathon_leader", fetch=fetch_and_store_marathon_leader},
+    {name="mesos_leader", fetch=fetch_and_store_mesos_leader},
+}
+
+
 local function refresh_needed(ts_name)
     -- ts_name (str): name of the '*_last_refresh' timestamp to check
     local cache = ngx.shared.cache
@@ -560,9 +759,10 @@ local function refresh_cache(from_timer, auth_token)
     -- In order to avoid deadlocks, we are relying on `exptime` param of
     -- resty.lock (https://github.com/openresty/lua-resty-lock#new)
     --
-    -- It's value is maximum time it may take to fetch data from all the
-    -- backends (ATM 2xMarathon + Mesos) plus an arbitrary two seconds period
-    -- just to be on the safe side.
+    -- The backends are queried concurrently, but each request may take up to
+    -- CACHE_BACKEND_REQUEST_TIMEOUT for every socket operation (connect,
+    -- send, read), so leave room for that plus an arbitrary two seconds
+    -- period per request just to be on the safe side.
     local lock_ttl = 3 * (_CONFIG.CACHE_BACKEND_REQUEST_TIMEOUT + 2)
 
     if from_timer then
@@ -574,6 +774,7 @@ local function refresh_cache(from_timer, auth_token)
         local elapsed, err = lock:lock("cache")
         if elapsed == nil then
             ngx.log(ngx.INFO, "Timer-based update is in progress. NOOP.")
+            stats_incr("lock:busy", 1)
             return
         end
     else
@@ -587,26 +788,49 @@ local function refresh_cache(from_timer, auth_token)
         local elapsed, err = lock:lock("cache")
         if elapsed == nil then
             ngx.log(ngx.ERR, "Could not acquire lock: " .. err)
+            stats_incr("lock:timeouts", 1)
             -- Leave early (did not make sure that cache is populated).
             return
         end
-    end
 
-    if refresh_needed("mesosstate_last_refresh") then
-        fetch_and_store_state_mesos(auth_token)
+        stats_incr("lock:waits", 1)
+        stats_incr("lock:wait_total", elapsed)
+        stats_set("lock:wait_last", elapsed)
+        if elapsed > (ngx.shared.cache_stats:get("lock:wait_max") or 0) then
+            stats_set("lock:wait_max", elapsed)
+        end
     end
 
-    if refresh_needed("svcapps_last_refresh") then
-        fetch_and_store_marathon_apps(auth_token)
+    ngx.update_time()
+    local refresh_start = ngx.now()
+
+    -- Query all the backends concurrently. Each fetch runs in its own light
+    -- thread, so an error raised by one of them does not affect the others.
+    local threads = {}
+    for _, backend in ipairs(BACKENDS) do
+        if refresh_needed(backend.name .. "_last_refresh") then
+            local thread, err = ngx.thread.spawn(backend.fetch, auth_token)
+            if thread == nil then
+                ngx.log(ngx.ERR, "Failed to spawn `" .. backend.name .. "` refresh thread: " .. err)
+            else
+                table.insert(threads, {name=backend.name, thread=thread})
+            end
+        end
     end
 
-    if refresh_needed("marathon_leader_last_refresh") then
-        fetch_and_store_marathon_leader(auth_token)
+    for _, t in ipairs(threads) do
+        local ok, err = ngx.thread.wait(t.thread)
+        if not ok then
+            ngx.log(ngx.ERR, "Refreshing `" .. t.name .. "` cache failed: " .. tostring(err))
+        end
     end
 
-    if refresh_needed("mesos_leader_last_refresh") then
-        fetch_and_store_mesos_leader()
-    end
+    ngx.update_time()
+    local refresh_duration = ngx.now() - refresh_start
+    ngx.log(ngx.INFO, string.format(
+        "Cache refresh of %d entries took %.3f seconds", #threads, refresh_duration))
+    stats_incr("refresh:count", 1)
+    stats_set("refresh:last_duration", refresh_duration)
 
     local ok, err = lock:unlock()
     if not ok then
@@ -660,6 +884,60 @@ local function periodically_refresh_cache(auth_token)
 end
 
 
+local function keyed_table_view(prefix)
+    -- Return a table which looks up its fields in the SHM records starting
+    -- with `prefix` on first access.
+    return setmetatable({}, {__index = function(view, record_key)
+        if type(record_key) ~= "string" then
+            return nil
+        end
+
+        local value_json = ngx.shared.cache:get(prefix .. record_key)
+        if value_json == nil then
+            return nil
+        end
+
+        local value, err = cjson_safe.decode(value_json)
+        if value == nil then
+            ngx.log(ngx.ERR, "Cannot decode JSON for record `" .. prefix .. record_key .. "`: " .. err)
+            return nil
+        end
+
+        rawset(view, record_key, value)
+        return value
+    end})
+end
+
+
+local function get_keyed_entry(name, tables)
+    -- Return a view of the current generation of the keyed entry `name`,
+    -- which decodes only the records that are actually looked up, each one at
+    -- most once per worker.
+    local generation = ngx.shared.cache:get(name)
+    if type(generation) ~= "number" then
+        ngx.log(ngx.ERR, "Could not retrieve `" .. name .. "` cache entry from SHM")
+        return nil
+    end
+
+    local decoded = decoded_entries[name]
+    if decoded ~= nil and decoded.generation == generation then
+        return decoded.entry
+    end
+
+    local entry = {}
+    for _, table_name in ipairs(tables) do
+        entry[table_name] = keyed_table_view(
+            name .. ":" .. generation .. ":" .. table_name .. ":")
+    end
+    if #tables == 1 then
+        entry = entry[tables[1]]
+    end
+
+    decoded_entries[name] = {generation=generation, entry=entry}
+    return entry
+end
+
+
 local function get_cache_entry(name, auth_token)
     local cache = ngx.shared.cache
     local name_last_refresh = name .. "_last_refresh"
@@ -685,12 +963,23 @@ local function get_cache_entry(name, auth_token)
     -- Cache is too old, we can't use it:
     if cache_age > _CONFIG.CACHE_MAX_AGE_HARD_LIMIT then
         ngx.log(ngx.ERR, "Cache entry `" .. name .. "` is too old, aborting request")
+        stats_incr(name .. ":too_old_reads", 1)
         return nil
     end
 
     -- Cache is stale, but still usable:
     if cache_age > _CONFIG.CACHE_MAX_AGE_SOFT_LIMIT then
         ngx.log(ngx.NOTICE, "Cache entry `" .. name .. "` is stale")
+        stats_incr(name .. ":stale_reads", 1)
+    end
+
+    if KEYED_ENTRIES[name] ~= nil then
+        return get_keyed_entry(name, KEYED_ENTRIES[name])
+    end
+
+    local decoded = decoded_entries[name]
+    if decoded ~= nil and decoded.last_refresh == entry_last_refresh then
+        return decoded.entry
     end
 
     local entry_json = cache:get(name)
@@ -705,10 +994,68 @@ local function get_cache_entry(name, auth_token)
         return nil
     end
 
+    -- The entry is stored to SHM before its timestamp, so at worst an entry
+    -- newer than `entry_last_refresh` gets remembered here and is decoded
+    -- once more after the next refresh.
+    ngx.log(ngx.DEBUG, "Decoded `" .. name .. "` cache entry")
+    decoded_entries[name] = {last_refresh=entry_last_refresh, entry=entry}
+
     return entry
 end
 
 
+local function get_status()
+    -- Return a table with the state and the statistics of the cache, as
+    -- served by the local status endpoint. Durations and ages are in seconds,
+    -- sizes in bytes. Statistics of steps which have not happened yet are
+    -- absent.
+    local cache = ngx.shared.cache
+    local stats = ngx.shared.cache_stats
+    ngx.update_time()
+    local now = ngx.now()
+
+    local entries = {}
+    for _, backend in ipairs(BACKENDS) do
+        local name = backend.name
+        local last_refresh = cache:get(name .. "_last_refresh")
+        local entry = {
+            size = stats:get(name .. ":size"),
+            last_refresh = last_refresh,
+            fetch_duration = stats:get(name .. ":fetch_duration"),
+            decode_duration = stats:get(name .. ":decode_duration"),
+            encode_duration = stats:get(name .. ":encode_duration"),
+            skipped_refreshes = cache:get(name .. "_skipped_refreshes"),
+            stale_reads = stats:get(name .. ":stale_reads") or 0,
+            too_old_reads = stats:get(name .. ":too_old_reads") or 0,
+        }
+        if last_refresh ~= nil then
+            entry.age = now - last_refresh
+        end
+        entries[name] = entry
+    end
+
+    return {
+        entries = entries,
+        refresh = {
+            count = stats:get("refresh:count") or 0,
+            last_duration = stats:get("refresh:last_duration"),
+        },
+        lock = {
+            waits = stats:get("lock:waits") or 0,
+            wait_total = stats:get("lock:wait_total") or 0,
+            wait_last = stats:get("lock:wait_last"),
+            wait_max = stats:get("lock:wait_max"),
+            timeouts = stats:get("lock:timeouts") or 0,
+            busy = stats:get("lock:busy") or 0,
+        },
+        shm = {
+            capacity = cache:capacity(),
+            free_space = cache:free_space(),
+        },
+    }
+end
+
+
 -- Expose Admin Router cache interface
 local _M = {}
 function _M.init(auth_token)
@@ -731,6 +1078,7 @@ function _M.init(auth_token)
         res.get_cache_entry = get_cache_entry
         res.periodically_refresh_cache = periodically_refresh_cache
     end
+    res.get_status = get_status
 
     return res
 end
@@ -1,10 +1,30 @@
 local url = require "url"
 local cjson_safe = require "cjson.safe"
+local lrucache = require "resty.lrucache"
+local semaphore = require "ngx.semaphore"
 local util = require "util"
 
 
 RESOLVE_LIMIT = 10
 
+-- Results of MesosDNS SRV queries are cached by every worker for a short
+-- time, so that a burst of requests to a framework without `webui_url` does
+-- not result in a subrequest to MesosDNS each. Names that MesosDNS does not
+-- know are cached as well, but for a shorter time so that newly started
+-- frameworks become reachable quickly. Failed queries are not cached.
+local SRV_CACHE_SIZE = 1000
+local SRV_CACHE_TTL = 5
+local SRV_CACHE_NEGATIVE_TTL = 1
+-- How long after it started a query is waited for by other requests for the
+-- same name. Slightly more than the timeouts of the /internal/mesos_dns/
+-- location add up to. Older queries are assumed to be lost (e.g. because
+-- the request running them was aborted) and get replaced.
+local SRV_QUERY_WAIT_TIMEOUT = 6
+
+local srv_cache = lrucache.new(SRV_CACHE_SIZE)
+-- Queries in flight, keyed by service name.
+local srv_queries = {}
+
 
 local function resolve_srv_entry(service_name)
     -- Try to resolve SRV entry for given framework name using MesosDNS
@@ -47,6 +67,54 @@ local function resolve_srv_entry(service_name)
     return records
 end
 
+local function cached_resolve_srv_entry(service_name)
+    -- Resolve SRV entry for given framework name using the per-worker SRV
+    -- cache, querying MesosDNS only on a cache miss. Concurrent misses for the
+    -- same name share one query.
+    --
+    -- Arguments and return values are the same as for `resolve_srv_entry`.
+    -- Returned records must not be modified.
+    local records = srv_cache:get(service_name)
+    if records ~= nil then
+        return records
+    end
+
+    local query = srv_queries[service_name]
+    if query ~= nil then
+        local remaining = SRV_QUERY_WAIT_TIMEOUT - (ngx.now() - query.started)
+        if remaining > 0 then
+            query.waiting = query.waiting + 1
+            local ok, err = query.sema:wait(remaining)
+            if ok then
+                return query.records
+            end
+            ngx.log(ngx.WARN, "Waiting for MesosDNS query failed: " .. err .. ", querying MesosDNS directly")
+        end
+    end
+
+    query = {sema=semaphore.new(), waiting=0, started=ngx.now()}
+    srv_queries[service_name] = query
+
+    records = resolve_srv_entry(service_name)
+    if records ~= nil then
+        if records[1] == nil or records[1]['ip'] == "" then
+            srv_cache:set(service_name, records, SRV_CACHE_NEGATIVE_TTL)
+        else
+            srv_cache:set(service_name, records, SRV_CACHE_TTL)
+        end
+    end
+
+    -- The query may have been replaced in the meantime if it took too long.
+    if srv_queries[service_name] == query then
+        srv_queries[service_name] = nil
+    end
+    query.records = records
+    if query.waiting > 0 then
+        query.sema:post(query.waiting)
+    end
+    return records
+end
+
 local function upstream_url_from_srv_query(service_name)
     -- Create upstream_url basing on the data from MesosDNS SRV entries and
     -- given service_name
@@ -63,7 +131,7 @@ local function upstream_url_from_srv_query(service_name)
     local upstream_url = nil
     local upstream_scheme = 'http' -- Hardcoded in case of MesosDNS
 
-    local records = resolve_srv_entry(service_name)
+    local records = cached_resolve_srv_entry(service_name)
 
     if records == nil then
         return nil, nil, ngx.HTTP_SERVICE_UNAVAILABLE, "503 Service Unavailable: MesosDNS request has failed"
@@ -19,6 +19,37 @@ def pytest_addoption(parser):
                               'error', 'critical'],
                      default='disabled',
                      help='Set verbosity of the testing framework.',)
+    parser.addoption('--benchmark',
+                     action='store_true',
+                     dest='run_benchmarks',
+                     default=False,
+                     help='Run the benchmarks instead of skipping them.',)
+    parser.addoption('--event-loop-mocks',
+                     action='store_true',
+                     dest='event_loop_mocks',
+                     default=False,
+                     help=('Serve the upstreams of Admin Router using an event '
+                           'loop, e.g. for benchmarks.'),)
+    parser.addoption('--benchmark-apps',
+                     type=int,
+                     dest='benchmark_apps',
+                     default=10000,
+                     help='Number of Marathon apps of the synthetic cluster.',)
+    parser.addoption('--benchmark-agents',
+                     type=int,
+                     dest='benchmark_agents',
+                     default=5000,
+                     help='Number of Mesos agents of the synthetic cluster.',)
+    parser.addoption('--benchmark-requests',
+                     type=int,
+                     dest='benchmark_requests',
+                     default=1000,
+                     help='Number of requests sent by each benchmark.',)
+    parser.addoption('--benchmark-concurrency',
+                     type=int,
+                     dest='benchmark_concurrency',
+                     default=10,
+                     help='Number of concurrent clients in throughput benchmarks.',)
 
 
 def pytest_configure(config):
@@ -26,5 +57,17 @@ def pytest_configure(config):
     util.configure_logger(config.getoption('tests_log_level'))
 
 
+def pytest_collection_modifyitems(config, items):
+    # Benchmarks take long and their results need a human to interpret them,
+    # so they are run only on request.
+    if config.getoption('run_benchmarks'):
+        return
+
+    skip_benchmark = pytest.mark.skip(reason='needs --benchmark option to run')
+    for item in items:
+        if 'benchmark' in item.keywords:
+            item.add_marker(skip_benchmark)
+
+
 pytest.register_assert_rewrite('generic_test_code.common')
 pytest.register_assert_rewrite('generic_test_code.open')
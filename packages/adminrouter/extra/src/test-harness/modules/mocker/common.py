@@ -11,6 +11,7 @@ from mocker.endpoints.marathon import MarathonEndpoint
 from mocker.endpoints.mesos import MesosEndpoint
 from mocker.endpoints.mesos_dns import MesosDnsEndpoint
 from mocker.endpoints.reflectors import (
+    EventLoopReflectingTcpIpEndpoint,
     ReflectingTcpIpEndpoint,
     ReflectingUnixSocketEndpoint,
 )
@@ -44,15 +45,28 @@ class MockerBase:
             self._endpoints[endpoint.id] = endpoint
 
     @staticmethod
-    def _create_common_endpoints():
+    def _create_common_endpoints(event_loop_endpoints=False):
         """Helper function that takes care of creating/instantiating all the
-           endpoints that are common for both EE and Open repositories"""
+           endpoints that are common for both EE and Open repositories
+
+        Args:
+            event_loop_endpoints (bool): serve the reflecting TCP/IP endpoints,
+                i.e. the upstreams which Admin Router proxies requests to,
+                using an event loop instead of a thread per request. Meant for
+                load tests, where the threaded endpoints would become the
+                bottleneck.
+        """
+        if event_loop_endpoints:
+            reflector = EventLoopReflectingTcpIpEndpoint
+        else:
+            reflector = ReflectingTcpIpEndpoint
+
         res = []
 
         # pkgpanda endpoint
         res.append(ReflectingUnixSocketEndpoint('/run/dcos/pkgpanda-api.sock'))
         # exhibitor
-        res.append(ReflectingTcpIpEndpoint(ip='127.0.0.1', port=8181))
+        res.append(reflector(ip='127.0.0.1', port=8181))
         # Mesos masters
         res.append(MesosEndpoint(ip='127.0.0.2', port=5050))
         res.append(MesosEndpoint(ip='127.0.0.3', port=5050))
@@ -60,50 +74,50 @@ class MockerBase:
         res.append(MarathonEndpoint(ip='127.0.0.1', port=8080))
         res.append(MarathonEndpoint(ip='127.0.0.2', port=8080))
         # cosmos
-        res.append(ReflectingTcpIpEndpoint(ip='127.0.0.1', port=7070))
+        res.append(reflector(ip='127.0.0.1', port=7070))
         # dcos-net
-        res.append(ReflectingTcpIpEndpoint(ip='127.0.0.1', port=62080))
+        res.append(reflector(ip='127.0.0.1', port=62080))
         # Mesos agents:
         # - plain/without TLS
-        res.append(ReflectingTcpIpEndpoint(ip='127.0.0.2', port=15001))
-        res.append(ReflectingTcpIpEndpoint(ip='127.0.0.3', port=15002))
+        res.append(reflector(ip='127.0.0.2', port=15001))
+        res.append(reflector(ip='127.0.0.3', port=15002))
         # - TLS version. It's used for testing e.g. DEFAULT_SCHEME variable
         # where AR is connecting to the upstream Mesos Agent using TLS.
         # 127.0.0.1 address stems from certificate names matching.
-        res.append(ReflectingTcpIpEndpoint(
+        res.append(reflector(
             ip='127.0.0.1',
             port=15401,
             certfile='/run/dcos/pki/tls/certs/adminrouter-ec.crt',
             keyfile='/run/dcos/pki/tls/private/adminrouter-ec.key'))
         # Agent3
-        res.append(ReflectingTcpIpEndpoint(ip='127.0.0.4', port=15003))
+        res.append(reflector(ip='127.0.0.4', port=15003))
         # Agent AR 1
-        res.append(ReflectingTcpIpEndpoint(ip='127.0.0.2', port=61001))
+        res.append(reflector(ip='127.0.0.2', port=61001))
         # Agent AR 2
-        res.append(ReflectingTcpIpEndpoint(ip='127.0.0.3', port=61001))
+        res.append(reflector(ip='127.0.0.3', port=61001))
         # task /scheduler-alwaysthere
-        res.append(ReflectingTcpIpEndpoint(ip='127.0.0.1', port=16000))
+        res.append(reflector(ip='127.0.0.1', port=16000))
         # task /nest1/scheduler-alwaysthere
-        res.append(ReflectingTcpIpEndpoint(ip='127.0.0.1', port=17000))
+        res.append(reflector(ip='127.0.0.1', port=17000))
         # task /nest2/nest1/scheduler-alwaysthere
-        res.append(ReflectingTcpIpEndpoint(ip='127.0.0.1', port=18000))
+        res.append(reflector(ip='127.0.0.1', port=18000))
         # task /nest2/nest1/scheduler-onlymarathon
-        res.append(ReflectingTcpIpEndpoint(ip='127.0.0.1', port=18001))
+        res.append(reflector(ip='127.0.0.1', port=18001))
         # task /nest2/nest1/scheduler-onlymesos
-        res.append(ReflectingTcpIpEndpoint(ip='127.0.0.1', port=18002))
+        res.append(reflector(ip='127.0.0.1', port=18002))
         # task /nest2/nest1/scheduler-onlymesosdns
-        res.append(ReflectingTcpIpEndpoint(ip='127.0.0.1', port=18003))
+        res.append(reflector(ip='127.0.0.1', port=18003))
         # task /scheduler-alwaysthere but with different ip+port, used i.e. in
         # `/service` endpoint tests
-        res.append(ReflectingTcpIpEndpoint(ip='127.0.0.15', port=16001))
+        res.append(reflector(ip='127.0.0.15', port=16001))
         # catch-all for /scheduler-alwaysthere task. Its role is to respond for all
         # the requests which i.e. used mesos_dns'es second entry in SRV reply.
         # Successfull tests will never use it.
-        res.append(ReflectingTcpIpEndpoint(ip='127.0.0.1', port=16002))
+        res.append(reflector(ip='127.0.0.1', port=16002))
         # other Admin Router Masters, used i.e. during Marathon leader testing
-        res.append(ReflectingTcpIpEndpoint(ip='127.0.0.2', port=80))
-        res.append(ReflectingTcpIpEndpoint(ip='127.0.0.3', port=80))
-        res.append(ReflectingTcpIpEndpoint(
+        res.append(reflector(ip='127.0.0.2', port=80))
+        res.append(reflector(ip='127.0.0.3', port=80))
+        res.append(reflector(
             ip='127.0.0.4',
             port=443,
             certfile='/run/dcos/pki/tls/certs/adminrouter-ec.crt',
@@ -113,17 +127,17 @@ class MockerBase:
         # log endpoint
         res.append(ReflectingUnixSocketEndpoint('/run/dcos/dcos-log.sock'))
         # DC/OS history service
-        res.append(ReflectingTcpIpEndpoint(ip='127.0.0.1', port=15055))
+        res.append(reflector(ip='127.0.0.1', port=15055))
         # Mesos DNS
         res.append(MesosDnsEndpoint(ip='127.0.0.1', port=8123))
         # DDDT, two variants:
         # TODO (prozlach): cleanup DDDT sockets
         res.append(
-            ReflectingTcpIpEndpoint(ip='127.0.0.1', port=1050))
+            reflector(ip='127.0.0.1', port=1050))
         res.append(
             ReflectingUnixSocketEndpoint('/run/dcos/dcos-diagnostics.sock'))
         # DC/OS Metronome
-        res.append(ReflectingTcpIpEndpoint(ip='127.0.0.1', port=9000))
+        res.append(reflector(ip='127.0.0.1', port=9000))
         # Checks API
         res.append(
             ReflectingUnixSocketEndpoint('/run/dcos/dcos-checks-api.sock'))
@@ -131,15 +145,16 @@ class MockerBase:
 
         return res
 
-    def __init__(self, extra_endpoints=None):
+    def __init__(self, extra_endpoints=None, event_loop_endpoints=False):
         """Initialize new MockerBase instance
 
         Args:
             extra_endpoints (obj: [EndpointA, EndpointB,...]): list of endpoints
                 that are unique to the inheriting class/represent specific behaviour
                 of given flavour
+            event_loop_endpoints (bool): see `_create_common_endpoints`
         """
-        common_endpoints = self._create_common_endpoints()
+        common_endpoints = self._create_common_endpoints(event_loop_endpoints)
         endpoints = common_endpoints + extra_endpoints
         self._register_endpoints(endpoints)
 
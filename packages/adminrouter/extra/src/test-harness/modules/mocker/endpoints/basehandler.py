@@ -4,7 +4,9 @@
 """
 
 import abc
+import asyncio
 import http.server
+import io
 import json
 import logging
 import socket
@@ -312,3 +314,159 @@ class BaseHTTPRequestHandler(http.server.BaseHTTPRequestHandler,
         http://stackoverflow.com/a/2064369
         """
         self._unified_method_handler()
+
+
+class EventLoopRequestHandler(metaclass=abc.ABCMeta):
+    """Request handler base class for endpoints served by EventLoopHTTPServer
+
+    It is the event loop counterpart of the BaseHTTPRequestHandler class and
+    honours the same endpoint commands (`always_bork`, `always_stall`, etc...).
+    Contrary to BaseHTTPRequestHandler, a single instance of the handler
+    serves all the requests of an endpoint. Requests are passed as
+    EventLoopRequest objects and the handler must never block, as that would
+    block all the other connections of the endpoint.
+    """
+    def __init__(self, context):
+        """Initialize new EventLoopRequestHandler object
+
+        Args:
+            context (EndpointContext): context of the endpoint served by this
+                handler
+        """
+        self.context = context
+
+    @abc.abstractmethod
+    def _calculate_response(self, request, base_path, url_args, body_args=None):
+        """Calculate response basing on the request arguments.
+
+        Please refer to the description of the BaseHTTPRequestHandler class
+        method with the same name for details on the arguments and return value
+        of this method. `request` is the EventLoopRequest being handled.
+
+        Responses which do not depend on the request should be serialized
+        once, when the endpoint data changes, and not for every request.
+        """
+        pass
+
+    def _reflect_request(self, request, base_path, url_args, body_args=None):
+        """Gather all the request data into single dict and prepare it for
+        sending it to the client for inspection.
+
+        The result is the same as the one of the BaseHTTPRequestHandler
+        method with the same name.
+        """
+        res = {}
+        res['method'] = request.method
+        res['path'] = request.path
+        res['path_base'] = base_path
+        res['headers'] = request.headers
+        res['request_version'] = request.version
+        res['endpoint_id'] = self.context.data["endpoint_id"]
+        res['args_url'] = url_args
+        res['args_body'] = body_args
+        blob = json.dumps(res, ensure_ascii=False).encode(
+            'utf-8', errors='backslashreplace')
+        return 200, 'application/json', blob
+
+    @staticmethod
+    def _parse_request_body(request):
+        """Parse request body in order to extract arguments.
+
+        Please refer to the description of the BaseHTTPRequestHandler class
+        method with the same name for details.
+        """
+        content_type = request.get_header('Content-Type')
+        if content_type is None:
+            return {}
+
+        ctype, pdict = parse_header(content_type)
+        if ctype == 'multipart/form-data':
+            return parse_multipart(io.BytesIO(request.body), pdict)
+        if ctype == 'application/x-www-form-urlencoded':
+            return parse_qs(request.body.decode('utf-8'),
+                            keep_blank_values=1,
+                            encoding="utf-8",
+                            errors="strict",
+                            )
+        return {}
+
+    async def _process_commands(self, request, status, content_type, blob):
+        """Apply the endpoint commands to the calculated response
+
+        Please refer to the description of the BaseHTTPRequestHandler class
+        method with the same name for details. Instead of sending the response
+        itself, this method returns it.
+
+        Returns:
+            A tuple with HTTP status, content type, body and extra headers (or
+            None) of the response.
+        """
+        ctx = self.context
+
+        with ctx.lock:
+            do_always_bork = ctx.data['always_bork']
+
+            do_always_redirect = ctx.data['always_redirect']
+            redirect_target = ctx.data['redirect_target']
+
+            do_always_stall = ctx.data['always_stall']
+            response_headers = dict(ctx.data['response_headers'])
+            stall_time = ctx.data['stall_time']
+
+        if response_headers:
+            msg_fmt = "Endpoint `%s` adding headers `%s` as requested"
+            log.debug(msg_fmt, ctx.data['endpoint_id'], response_headers)
+            return 200, content_type, blob, response_headers
+
+        if do_always_stall:
+            msg_fmt = "Endpoint `%s` waiting `%f` seconds as requested"
+            log.debug(msg_fmt, ctx.data['endpoint_id'], stall_time)
+            await asyncio.sleep(stall_time)
+            # This does not end request processing
+
+        if do_always_bork:
+            msg_fmt = "Endpoint `%s` sending broken response as requested"
+            log.debug(msg_fmt, ctx.data['endpoint_id'])
+            blob = b"Broken response due to `always_bork` flag being set"
+            return 500, 'text/plain; charset=utf-8', blob, None
+
+        if do_always_redirect:
+            msg_fmt = "Endpoint `%s` sending redirect to `%s` as requested"
+            log.debug(msg_fmt, ctx.data['endpoint_id'], redirect_target)
+            headers = {"Location": redirect_target}
+            return 307, 'text/plain; charset=utf-8', blob, headers
+
+        return status, content_type, blob, None
+
+    async def handle(self, request):
+        """Calculate the response to the EventLoopRequest `request`
+
+        This is the entry point for all the requests, the counterpart of
+        the `_unified_method_handler` method of BaseHTTPRequestHandler.
+
+        Returns:
+            A tuple with HTTP status, content type, body and extra headers (or
+            None) of the response.
+        """
+        if request.method not in ['GET', 'POST']:
+            msg = "Unsupported method `{}`".format(request.method)
+            return 501, 'text/plain; charset=utf-8', msg.encode('utf-8'), None
+
+        try:
+            parsed_url = urlparse(request.path)
+            url_args = parse_qs(parsed_url.query)
+            body_args = self._parse_request_body(request)
+            status, content_type, blob = self._calculate_response(
+                request, parsed_url.path, url_args, body_args)
+        except EndpointException as e:
+            return e.code, e.content_type, e.reason, None
+        # pylint: disable=W0703
+        except Exception:
+            endpoint_id = self.context.data['endpoint_id']
+            msg_fmt = ("Exception occurred while handling the request in "
+                       "endpoint `%s`")
+            log.exception(msg_fmt, endpoint_id)
+            blob = traceback.format_exc().encode('utf-8')
+            return 500, 'text/plain; charset=utf-8', blob, None
+
+        return await self._process_commands(request, status, content_type, blob)
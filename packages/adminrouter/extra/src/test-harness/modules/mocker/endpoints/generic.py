@@ -5,6 +5,9 @@ Shared code for DC/OS endpoints mocks used by AR instances, both EE and Open.
 """
 
 import abc
+import asyncio
+import collections
+import http
 import http.server
 import logging
 import os
@@ -255,6 +258,309 @@ class TcpIpHttpEndpoint(Endpoint):
                                               name=httpd_thread_name)
 
 
+class EventLoopRequest:
+    """A single HTTP request received by EventLoopHTTPServer
+
+    Attributes:
+        method (str): request method, e.g. `GET`
+        path (str): request target, including query arguments
+        version (str): HTTP version of the request, e.g. `HTTP/1.1`
+        headers (list): a list of (name, value) tuples, in the order they were
+            received
+        body (bytes): request body, with chunked transfer encoding already
+            decoded
+    """
+    __slots__ = ['method', 'path', 'version', 'headers', 'body']
+
+    def __init__(self, method, path, version, headers, body=b''):
+        self.method = method
+        self.path = path
+        self.version = version
+        self.headers = headers
+        self.body = body
+
+    def get_header(self, name, default=None):
+        """Return the value of the first header `name`, ignoring case"""
+        name = name.lower()
+        for header_name, value in self.headers:
+            if header_name.lower() == name:
+                return value
+        return default
+
+    @property
+    def keep_alive(self):
+        """True if the connection should be kept open after the response"""
+        connection = self.get_header('Connection', '').lower()
+        if self.version == 'HTTP/1.0':
+            return connection == 'keep-alive'
+        return connection != 'close'
+
+
+def _parse_chunked_body(buffer, pos):
+    """Decode chunked request body starting at `pos` of `buffer`
+
+    Returns:
+        A tuple with the decoded body and the offset of the end of the body in
+        `buffer`, or None if the body has not been fully received yet.
+    """
+    body = bytearray()
+    while True:
+        line_end = buffer.find(b'\r\n', pos)
+        if line_end < 0:
+            return None
+        size = int(bytes(buffer[pos:line_end]).split(b';')[0], 16)
+        pos = line_end + 2
+        if size == 0:
+            break
+        if len(buffer) < pos + size + 2:
+            return None
+        body += buffer[pos:pos + size]
+        pos += size + 2
+
+    # Skip the trailer, if any:
+    if buffer[pos:pos + 2] == b'\r\n':
+        return bytes(body), pos + 2
+    trailer_end = buffer.find(b'\r\n\r\n', pos)
+    if trailer_end < 0:
+        return None
+    return bytes(body), trailer_end + 4
+
+
+def _parse_request(buffer):
+    """Remove the first complete request from `buffer` and return it
+
+    Returns:
+        EventLoopRequest object or None if the request has not been fully
+        received yet.
+
+    Raises:
+        ValueError: the request is malformed
+    """
+    head_end = buffer.find(b'\r\n\r\n')
+    if head_end < 0:
+        if len(buffer) > EventLoopHTTPServer.MAX_HEADER_SIZE:
+            raise ValueError("Request header is too long")
+        return None
+
+    lines = bytes(buffer[:head_end]).decode('latin-1').split('\r\n')
+    try:
+        method, path, version = lines[0].split(' ')
+    except ValueError:
+        raise ValueError("Malformed request line `{}`".format(lines[0]))
+    headers = []
+    for line in lines[1:]:
+        name, sep, value = line.partition(':')
+        if not sep:
+            raise ValueError("Malformed header line `{}`".format(line))
+        headers.append((name.strip(), value.strip()))
+    request = EventLoopRequest(method, path, version, headers)
+
+    body_start = head_end + 4
+    if 'chunked' in request.get_header('Transfer-Encoding', '').lower():
+        res = _parse_chunked_body(buffer, body_start)
+        if res is None:
+            return None
+        request.body, body_end = res
+    else:
+        body_end = body_start + int(request.get_header('Content-Length', 0))
+        if len(buffer) < body_end:
+            return None
+        request.body = bytes(buffer[body_start:body_end])
+
+    del buffer[:body_end]
+    return request
+
+
+def _format_response(status, content_type, blob, extra_headers, keep_alive):
+    """Serialize response to bytes, ready to be written to the transport"""
+    status = int(status)
+    try:
+        reason = http.HTTPStatus(status).phrase
+    except ValueError:
+        reason = ''
+    lines = ['HTTP/1.1 {} {}'.format(status, reason),
+             'Content-type: {}'.format(content_type),
+             'Content-length: {}'.format(len(blob)),
+             'Connection: {}'.format('keep-alive' if keep_alive else 'close'),
+             ]
+    if extra_headers is not None:
+        for name, val in extra_headers.items():
+            lines.append('{}: {}'.format(name, val))
+    head = '\r\n'.join(lines) + '\r\n\r\n'
+    return head.encode('latin-1') + blob
+
+
+class _EventLoopHTTPProtocol(asyncio.Protocol):
+    """Server side of a single client connection of EventLoopHTTPServer
+
+    Requests are answered one after another, in the order they were received,
+    so pipelining clients are supported as well.
+    """
+    def __init__(self, server):
+        self._server = server
+        self._transport = None
+        self._buffer = bytearray()
+        self._requests = collections.deque()
+        # Task answering the requests from self._requests, if any:
+        self._worker = None
+
+    def connection_made(self, transport):
+        self._transport = transport
+        self._server.connections.add(self)
+
+    def connection_lost(self, exc):
+        self._transport = None
+        self._server.connections.discard(self)
+        if self._worker is not None:
+            self._worker.cancel()
+
+    def close(self):
+        """Close the connection, even if a request is being answered"""
+        if self._transport is not None:
+            self._transport.close()
+
+    def data_received(self, data):
+        self._buffer.extend(data)
+        try:
+            while True:
+                request = _parse_request(self._buffer)
+                if request is None:
+                    break
+                self._requests.append(request)
+        except ValueError as e:
+            msg_fmt = "Endpoint `%s` received a malformed request: %s"
+            log.warning(msg_fmt, self._server.context.data['endpoint_id'], e)
+            self._buffer.clear()
+            self._requests.append(e)
+
+        if self._worker is None and self._requests:
+            self._worker = self._server.loop.create_task(self._answer_requests())
+
+    async def _answer_requests(self):
+        while self._requests and self._transport is not None:
+            request = self._requests.popleft()
+            if isinstance(request, ValueError):
+                blob = str(request).encode('utf-8')
+                self._transport.write(_format_response(
+                    400, 'text/plain; charset=utf-8', blob, None, False))
+                self._transport.close()
+                break
+
+            status, content_type, blob, extra_headers = \
+                await self._server.handler.handle(request)
+            if self._transport is None:
+                break
+            self._transport.write(_format_response(
+                status, content_type, blob, extra_headers, request.keep_alive))
+            if not request.keep_alive:
+                self._transport.close()
+                break
+
+        self._worker = None
+
+
+class EventLoopHTTPServer:
+    """Endpoint-internal httpd server based on an asyncio event loop
+
+    All the connections are served by the single endpoint thread, which runs
+    the event loop. Unlike with StatefullHTTPServer, no thread is started per
+    request and connections are kept alive, so the server can keep up with
+    Admin Router under load.
+
+    It has the same interface as StatefullHTTPServer as far as Endpoint class
+    is concerned. Instead of a request handler class, it takes a request
+    handler object with a `handle(request)` coroutine, see the
+    EventLoopRequestHandler class.
+
+    Attributes:
+        MAX_HEADER_SIZE: requests with headers longer than this number of bytes
+            are rejected
+    """
+    MAX_HEADER_SIZE = 65536
+
+    def __init__(self, context, server_address, handler):
+        self.context = context
+        self.handler = handler
+        self.startup_done = threading.Event()
+        self.loop = asyncio.new_event_loop()
+        # Client connections which are currently open:
+        self.connections = set()
+
+        ssl_context = None
+        certfile = self.context.data['certfile']
+        keyfile = self.context.data['keyfile']
+        if certfile is not None and keyfile is not None:
+            ssl_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+            ssl_context.load_cert_chain(certfile, keyfile)
+
+        # Bind right away, so that errors surface during endpoint creation
+        # just like for StatefullHTTPServer.
+        ip, port = server_address
+        self._server = self.loop.run_until_complete(self.loop.create_server(
+            lambda: _EventLoopHTTPProtocol(self),
+            host=ip or None,
+            port=port,
+            ssl=ssl_context,
+            reuse_address=True,
+            backlog=1024))
+
+    def serve_forever(self):
+        """Run the event loop until shutdown() is called"""
+        asyncio.set_event_loop(self.loop)
+        self.loop.call_soon(self.startup_done.set)
+        self.loop.run_forever()
+
+    def shutdown(self):
+        """Stop the event loop, may be called from any thread"""
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+    def server_close(self):
+        """Close the listening socket, all connections and the event loop"""
+        self._server.close()
+        for connection in list(self.connections):
+            connection.close()
+        self.loop.run_until_complete(self._server.wait_closed())
+        self.loop.close()
+
+
+class EventLoopTcpIpHttpEndpoint(Endpoint):
+    """Base class for all endpoints that serve TCP/IP requests using
+       EventLoopHTTPServer.
+
+       It is the EventLoopHTTPServer counterpart of TcpIpHttpEndpoint and
+       takes the same arguments, except that `handler_class` must be a
+       subclass of EventLoopRequestHandler.
+    """
+    def __init__(self, handler_class, port, ip='', keyfile=None, certfile=None):
+        """Initialize new EventLoopTcpIpHttpEndpoint object
+
+        Args:
+            handler_class (obj): EventLoopRequestHandler subclass that will be
+                handling requests received by internal httpd server
+            port (int): tcp port that httpd server will listen on
+            ip (str): ip address that httpd server will listen on, by default
+                listen on all addresses
+        """
+        if certfile is not None and keyfile is not None:
+            endpoint_id = "https://{}:{}".format(ip, port)
+        else:
+            endpoint_id = "http://{}:{}".format(ip, port)
+        super().__init__(endpoint_id)
+
+        self._context.data['listen_ip'] = ip
+        self._context.data['listen_port'] = port
+        self._context.data['certfile'] = certfile
+        self._context.data['keyfile'] = keyfile
+
+        self._httpd = EventLoopHTTPServer(self._context,
+                                          (ip, port),
+                                          handler_class(self._context))
+
+        httpd_thread_name = "EventLoopHttpdThread-{}".format(self.id)
+        self._httpd_thread = threading.Thread(target=self._httpd.serve_forever,
+                                              name=httpd_thread_name)
+
+
 class UnixSocketStatefulHTTPServer(StatefullHTTPServer):
     """Base class for all endpoint-internal httpd servers that listen on
        Unix socket.
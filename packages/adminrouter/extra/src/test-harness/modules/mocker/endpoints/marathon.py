@@ -242,7 +242,12 @@ class MarathonHTTPRequestHandler(RecordingHTTPRequestHandler):
         content_type = 'application/json'
         with ctx.lock:
             if base_path == '/v2/apps':
-                blob = self._convert_data_to_blob(ctx.data['endpoint-content'])
+                # Serializing thousands of apps is slow, so do it only once
+                # per change of the apps list:
+                if ctx.data['endpoint-content-blob'] is None:
+                    ctx.data['endpoint-content-blob'] = self._convert_data_to_blob(
+                        ctx.data['endpoint-content'])
+                blob = ctx.data['endpoint-content-blob']
             elif base_path == '/v2/leader':
                 if ctx.data['leader-content'] is None:
                     msg = "Marathon leader unknown"
@@ -280,6 +285,7 @@ class MarathonEndpoint(RecordingTcpIpEndpoint):
         """
         with self._context.lock:
             self._context.data["endpoint-content"] = apps
+            self._context.data["endpoint-content-blob"] = None
 
     def remove_leader(self, *_):
         """Change the endpoint output so that it simulates absence of the Marathon
@@ -316,4 +322,7 @@ class MarathonEndpoint(RecordingTcpIpEndpoint):
             SCHEDULER_APP_ALWAYSTHERE_NEST2,
             SCHEDULER_APP_ONLYMARATHON_NEST2,
             ]})
+        # `endpoint-content` serialized, or None if it has changed since
+        # it was last served:
+        self._context.data["endpoint-content-blob"] = None
         self._context.data["leader-content"] = {"leader": "127.0.0.2:80"}
@@ -253,7 +253,12 @@ class MesosHTTPRequestHandler(RecordingHTTPRequestHandler):
         ctx = self.server.context
 
         with ctx.lock:
-            blob = self._convert_data_to_blob(ctx.data['endpoint-content'])
+            # Serializing the state of a big cluster is slow, so do it only
+            # once per change of the state:
+            if ctx.data['endpoint-content-blob'] is None:
+                ctx.data['endpoint-content-blob'] = self._convert_data_to_blob(
+                    ctx.data['endpoint-content'])
+            blob = ctx.data['endpoint-content-blob']
 
         return 200, 'application/json', blob
 
@@ -275,6 +280,9 @@ class MesosEndpoint(RecordingTcpIpEndpoint):
         """Helper function meant to initialize all the data relevant to this
            particular type of endpoint"""
         self._context.data["endpoint-content"] = copy.deepcopy(INITIAL_STATEJSON)
+        # `endpoint-content` serialized, or None if it has changed since
+        # it was last served:
+        self._context.data["endpoint-content-blob"] = None
 
     def enable_extra_agent(self, *_):
         """Change returned JSON to include extra agent, one that is by default
@@ -282,6 +290,7 @@ class MesosEndpoint(RecordingTcpIpEndpoint):
         """
         with self._context.lock:
             self._context.data["endpoint-content"]["slaves"].append(EXTRA_AGENT_DICT)
+            self._context.data["endpoint-content-blob"] = None
 
     def set_frameworks_response(self, frameworks):
         """Set response content for frameworks section of /state-summary response
@@ -292,3 +301,14 @@ class MesosEndpoint(RecordingTcpIpEndpoint):
         """
         with self._context.lock:
             self._context.data["endpoint-content"]["frameworks"] = frameworks
+            self._context.data["endpoint-content-blob"] = None
+
+    def set_agents_response(self, agents):
+        """Set response content for agents section of /state-summary response
+
+        Arguments:
+            agents (list): a list of agent dicts describing mocked agents.
+        """
+        with self._context.lock:
+            self._context.data["endpoint-content"]["slaves"] = agents
+            self._context.data["endpoint-content-blob"] = None
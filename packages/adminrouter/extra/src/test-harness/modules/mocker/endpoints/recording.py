@@ -3,9 +3,12 @@
 """All the code relevant to recording endpoint used by mocker.
 """
 
+import collections
 import copy
 import logging
+import threading
 import time
+from urllib.parse import urlparse
 
 from mocker.endpoints.basehandler import BaseHTTPRequestHandler
 from mocker.endpoints.generic import TcpIpHttpEndpoint
@@ -14,6 +17,93 @@ from mocker.endpoints.generic import TcpIpHttpEndpoint
 log = logging.getLogger(__name__)
 
 
+class RequestRecorder:
+    """A store for the requests recorded by an endpoint
+
+    Only the data of the last `max_requests` requests is kept, older requests
+    are dropped. On top of that, only a `sample_rate` fraction of requests may
+    be stored, or none at all in `count_only` mode. Either way, all the
+    requests are counted by path (without query arguments) and method, so
+    that the number of requests with given path and/or method can be checked
+    in constant time, even during long or high-volume test runs.
+
+    The recorder has its own lock, so recording does not contend for the lock
+    of the endpoint context.
+    """
+    DEFAULT_MAX_REQUESTS = 1000
+
+    def __init__(self, max_requests=DEFAULT_MAX_REQUESTS, sample_rate=1, count_only=False):
+        """Initialize new RequestRecorder object
+
+        Arguments:
+            max_requests (int): number of the most recent requests to keep the
+                data of, or None to keep all of them
+            sample_rate (float): fraction of the requests to keep the data of,
+                every 1/`sample_rate`-th request is kept
+            count_only (bool): only count the requests, do not keep their data
+        """
+        assert 0 < sample_rate <= 1
+        self.max_requests = max_requests
+        self.sample_rate = sample_rate
+        self.count_only = count_only
+
+        self._lock = threading.Lock()
+        self._requests = collections.deque(maxlen=max_requests)
+        self._sample_credit = 0
+        self._total = 0
+        self._by_path = collections.Counter()
+        self._by_method = collections.Counter()
+        self._by_method_and_path = collections.Counter()
+
+    def count_request(self, method, path):
+        """Count a request, return True if its data should be stored
+
+        Arguments:
+            method (str): request method
+            path (str): request path, query arguments are ignored
+        """
+        base_path = urlparse(path).path
+        with self._lock:
+            self._total += 1
+            self._by_path[base_path] += 1
+            self._by_method[method] += 1
+            self._by_method_and_path[(method, base_path)] += 1
+
+            if self.count_only:
+                return False
+            self._sample_credit += self.sample_rate
+            if self._sample_credit < 1:
+                return False
+            self._sample_credit -= 1
+            return True
+
+    def store_request(self, request_data):
+        """Store the data of a request for which `count_request` returned True"""
+        with self._lock:
+            self._requests.append(request_data)
+
+    def requests(self):
+        """Return a copy of the stored requests data, oldest first"""
+        with self._lock:
+            return copy.deepcopy(list(self._requests))
+
+    def count(self, path=None, method=None):
+        """Return the number of recorded requests with given path and method
+
+        Arguments:
+            path (str): path without query arguments, or None for any path
+            method (str): request method, or None for any method
+        """
+        with self._lock:
+            if path is None and method is None:
+                return self._total
+            if method is None:
+                return self._by_path[path]
+            if path is None:
+                return self._by_method[method]
+            return self._by_method_and_path[(method, path)]
+
+
 # pylint: disable=R0903
 class RecordingHTTPRequestHandler(BaseHTTPRequestHandler):
     """A request hander class implementing recording all the requests&request
@@ -26,6 +116,10 @@ class RecordingHTTPRequestHandler(BaseHTTPRequestHandler):
     def _record_request(self):
         """Store all the relevant data of the request into the endpoint context."""
         ctx = self.server.context
+        recorder = ctx.data['requests']
+
+        if not recorder.count_request(self.command, self.path):
+            return
 
         res = {}
         res['method'] = self.command
@@ -39,8 +133,7 @@ class RecordingHTTPRequestHandler(BaseHTTPRequestHandler):
             res['request_body'] = None
         res['request_time'] = time.time()
 
-        with ctx.lock:
-            ctx.data['requests'].append(res)
+        recorder.store_request(res)
         msg_fmt = "[Endpoint `%s`] Request recorded: `%s`"
         log.debug(msg_fmt, ctx.data['endpoint_id'], res)
 
@@ -85,17 +178,36 @@ class RecordingTcpIpEndpoint(TcpIpHttpEndpoint):
         super().__init__(request_handler, port, ip)
         self.__context_init()
 
-    def record_requests(self, *_):
-        """Enable recording the requests data by the handler."""
+    def record_requests(self, aux_data=None):
+        """Enable recording the requests data by the handler.
+
+        Arguments:
+            aux_data (dict): optional RequestRecorder arguments, i.e.
+                `max_requests`, `sample_rate` and `count_only`. Requests
+                recorded so far are erased if given.
+        """
         with self._context.lock:
+            if aux_data is not None:
+                self._context.data["requests"] = RequestRecorder(**aux_data)
             self._context.data["record_requests"] = True
 
     def get_recorded_requests(self, *_):
-        """Fetch all the recorded requests data from the handler"""
-        with self._context.lock:
-            requests_list_copy = copy.deepcopy(self._context.data["requests"])
+        """Fetch the data of the recorded requests from the handler"""
+        return self._context.data["requests"].requests()
+
+    def get_recorded_requests_count(self, aux_data=None):
+        """Return the number of the recorded requests
 
-        return requests_list_copy
+        Unlike the length of the `get_recorded_requests` list, this includes
+        the requests whose data was not stored, e.g. due to sampling.
+
+        Arguments:
+            aux_data (dict): optional `path` (without query arguments) and/or
+                `method` the counted requests must have
+        """
+        if aux_data is None:
+            aux_data = {}
+        return self._context.data["requests"].count(**aux_data)
 
     def set_encoded_response(self, aux_data):
         """Make endpoint to respond with provided data without encoding data
@@ -107,9 +219,11 @@ class RecordingTcpIpEndpoint(TcpIpHttpEndpoint):
             self._context.data["encoded_response"] = aux_data
 
     def erase_recorded_requests(self, *_):
-        """Fetch all the recorded requests data from the handler"""
+        """Erase all the recorded requests, keeping the recording settings"""
         with self._context.lock:
-            self._context.data["requests"] = list()
+            recorder = self._context.data["requests"]
+            self._context.data["requests"] = RequestRecorder(
+                recorder.max_requests, recorder.sample_rate, recorder.count_only)
 
     def reset(self, *_):
         """Reset the endpoint to the default/initial state."""
@@ -121,5 +235,5 @@ class RecordingTcpIpEndpoint(TcpIpHttpEndpoint):
         """Helper function meant to initialize all the data relevant to this
            particular type of endpoint"""
         self._context.data["record_requests"] = False
-        self._context.data["requests"] = list()
+        self._context.data["requests"] = RequestRecorder()
         self._context.data["encoded_response"] = None
@@ -4,8 +4,15 @@
 
 import logging
 
-from mocker.endpoints.basehandler import BaseHTTPRequestHandler
-from mocker.endpoints.generic import TcpIpHttpEndpoint, UnixSocketHTTPEndpoint
+from mocker.endpoints.basehandler import (
+    BaseHTTPRequestHandler,
+    EventLoopRequestHandler,
+)
+from mocker.endpoints.generic import (
+    EventLoopTcpIpHttpEndpoint,
+    TcpIpHttpEndpoint,
+    UnixSocketHTTPEndpoint,
+)
 
 # pylint: disable=C0103
 log = logging.getLogger(__name__)
@@ -28,6 +35,21 @@ class ReflectingHTTPRequestHandler(BaseHTTPRequestHandler):
         return self._reflect_request(base_path, url_args, body_args)
 
 
+# pylint: disable=R0903
+class EventLoopReflectingRequestHandler(EventLoopRequestHandler):
+    """Event loop counterpart of the ReflectingHTTPRequestHandler class."""
+    def _calculate_response(self, request, base_path, url_args, body_args=None):
+        """Gather all the request data into single dict and prepare it for
+        sending it to the client for inspection, irrespective of the request
+        URI.
+
+        Please refer to the description of the EventLoopRequestHandler class
+        method with the same name for details on the arguments and return value
+        of this method.
+        """
+        return self._reflect_request(request, base_path, url_args, body_args)
+
+
 # pylint: disable=R0903,C0103
 class ReflectingTcpIpEndpoint(TcpIpHttpEndpoint):
     """ReflectingTcpIpEndpoint is just a plain TCP/IP endpoint with a
@@ -42,3 +64,12 @@ class ReflectingUnixSocketEndpoint(UnixSocketHTTPEndpoint):
        request handler that pushes back request data to the client."""
     def __init__(self, path, keyfile=None, certfile=None):
         super().__init__(ReflectingHTTPRequestHandler, path, keyfile, certfile)
+
+
+# pylint: disable=R0903,C0103
+class EventLoopReflectingTcpIpEndpoint(EventLoopTcpIpHttpEndpoint):
+    """EventLoopReflectingTcpIpEndpoint is a drop-in replacement of the
+       ReflectingTcpIpEndpoint meant for load testing, which serves requests
+       using an event loop instead of a thread per request."""
+    def __init__(self, port, ip='', keyfile=None, certfile=None):
+        super().__init__(EventLoopReflectingRequestHandler, port, ip, keyfile, certfile)
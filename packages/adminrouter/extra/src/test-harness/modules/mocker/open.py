@@ -15,11 +15,15 @@ log = logging.getLogger(__name__)
 class Mocker(MockerBase):
     """This class represents mocking behaviour specific to Open variant of the
     repo."""
-    def __init__(self):
-        """Initialize new Mocker instance"""
+    def __init__(self, event_loop_endpoints=False):
+        """Initialize new Mocker instance
+
+        Args:
+            event_loop_endpoints (bool): see MockerBase
+        """
         extra_endpoints = []
 
         # Open DC/OS IAM
         extra_endpoints.append(IamEndpoint(ip='127.0.0.1', port=8101))
 
-        super().__init__(extra_endpoints)
+        super().__init__(extra_endpoints, event_loop_endpoints)
@@ -18,7 +18,7 @@ import time
 
 import pytest
 
-from util import LOG_LINE_SEARCH_INTERVAL
+from util import LOG_LINE_SEARCH_INTERVAL, LineBuffer
 
 log = logging.getLogger(__name__)
 
@@ -90,9 +90,9 @@ class SyslogMock:
         """Interface for accessing log lines captured by syslog mock
 
         Returns:
-            This returns a reference to the list that log catcher internally
-            uses to append log lines to. Thus it is *VERY* important to not to
-            modify this list and treat it as Read-Only
+            This returns a reference to the LineBuffer that log catcher
+            internally uses to append log lines to. Thus it is *VERY* important
+            to not to modify it and treat it as Read-Only
         """
         return self._log_catcher.line_buffer(self._socket)
 
@@ -100,7 +100,7 @@ class SyslogMock:
 class LogWriter:
     """LogWriter handles log lines gathered by LogCatcher.
 
-    It takes care of storing them internally in a list(), writing them to
+    It takes care of storing them internally in a LineBuffer, writing them to
     a log file if requested, and logging the log lines to python logger
 
     Worth noting is that this class should be embedded by LogCatcher object.
@@ -171,7 +171,7 @@ class LogWriter:
         """
         self._fd = fd
         self._log_level = log_level
-        self._line_buffer = list()
+        self._line_buffer = LineBuffer()
         self._log_fd = open(log_file, 'ab', buffering=0)
 
     def stop(self):
@@ -217,7 +217,7 @@ class LogWriter:
         This method exposes internal log buffer to the caller.
 
         Returns:
-            A list with each log line as a single element.
+            A LineBuffer with the most recent log lines.
         """
         return self._line_buffer
 
@@ -234,10 +234,14 @@ class LogCatcher:
     that can be grepped/searched/monitored. Internally, it uses LogWriter
     instances for storing the data.
 
+    The thread handling the file descriptors sleeps in `poll()` until there
+    is some input to handle. Adding new file descriptors and stopping the
+    instance wakes it up by writing to an internal pipe.
+
     Worth noting is that this class should be embedded by other objects - most
     notably objects derived from ManagedSubrocess abstract class.
     """
-    _POLL_TIMEOUT = 0.5
+    _POLL_TIMEOUT_MS = 500
     _LOG_DIR = './test-harness/logs/'
     _GIT_KEEP_FILE = '.keep'
 
@@ -245,6 +249,7 @@ class LogCatcher:
     _poll = None
     _writers = None
     _add_writers_queue = None
+    _wakeup_fds = None
 
     def _event_processing(self):
         """The main loop where all LogCatcher operations are handled
@@ -286,17 +291,31 @@ class LogCatcher:
         * http://stackoverflow.com/a/25249958
         * http://www.greenend.org.uk/rjk/tech/poll.html
         """
+        poll_timeout = self._POLL_TIMEOUT_MS
         while True:
             writers_to_add = self._add_writers_queue.qsize()
-            fds_ready = self._poll.poll(self._POLL_TIMEOUT)
-
-            if len(fds_ready) == 0 and writers_to_add == 0 and self._termination_flag.is_set():
+            if self._termination_flag.is_set():
+                # Only drain whatever is still left
+                poll_timeout = 0
+            fds_ready = self._poll.poll(poll_timeout)
+            poll_timeout = self._POLL_TIMEOUT_MS
+
+            if self._termination_flag.is_set() and writers_to_add == 0 and \
+                    all(fd_no == self._wakeup_fds[0] for fd_no, _ in fds_ready):
                 # Nothing else to read, termination requested
+                os.close(self._wakeup_fds[0])
                 return
 
             for fd_tuple in fds_ready:
                 fd_no, event = fd_tuple
 
+                if fd_no == self._wakeup_fds[0]:
+                    os.read(fd_no, 4096)
+                    # New writers could have been queued after `writers_to_add`
+                    # was calculated, check again without blocking
+                    poll_timeout = 0
+                    continue
+
                 # Can select.POLLIN be set for a closed connection?
                 mask = select.POLLNVAL + select.POLLHUP
                 if event & mask > 0:
@@ -370,6 +389,8 @@ class LogCatcher:
 
         self._cleanup_log_dir()
         self._add_writers_queue = queue.Queue()
+        self._wakeup_fds = os.pipe()
+        self._poll.register(self._wakeup_fds[0], select.POLLIN)
 
         self._logger_thread = threading.Thread(
             target=self._event_processing, name='LogCatcher')
@@ -397,16 +418,23 @@ class LogCatcher:
 
         writer = LogWriter(fd, log_path, log_level)
         self._add_writers_queue.put(writer)
+        self._wakeup()
         self._add_writers_queue.join()
 
+    def _wakeup(self):
+        """Make the LogCatcher thread return from `poll()` call immediately"""
+        os.write(self._wakeup_fds[1], b'x')
+
     def stop(self):
         """Stop the LogCatcher instance and perform resource cleanup."""
         self._termination_flag.set()
+        self._wakeup()
 
         while self._logger_thread.is_alive():
             self._logger_thread.join(timeout=0.5)
             log.info("Waiting for LogCatcher thread to exit")
 
+        os.close(self._wakeup_fds[1])
         log.info("LogCatcher thread has terminated, bye!")
 
     def line_buffer(self, fd):
@@ -417,8 +445,8 @@ class LogCatcher:
                 line buffer should be returned
 
         Returns:
-            A list that use used by LogWriter responsible for handling given
-            file descriptor to store log lines.
+            A LineBuffer that is used by LogWriter responsible for handling
+            given file descriptor to store log lines.
         """
         return self._writers[fd.fileno()].line_buffer
 
@@ -568,16 +596,16 @@ class ManagedSubprocess(abc.ABC):
                 log.warning(msg_fmt, self.id)
                 return False
 
-            log_buf_end = len(log_buf) - 1
-            if log_buf_end >= log_buf_pos:
-                for line in log_buf[log_buf_pos:]:
-                    if self._INIT_COMPLETE_STR in line:
-                        log.info("`%s` init process complete", self.id)
-                        return True
-                log_buf_pos = log_buf_end
+            lines, log_buf_pos = log_buf.lines_since(log_buf_pos)
+            for line in lines:
+                if self._INIT_COMPLETE_STR in line:
+                    log.info("`%s` init process complete", self.id)
+                    return True
 
             log.debug("Waiting for `%s` to start...", self.id)
-            time.sleep(LOG_LINE_SEARCH_INTERVAL)
+            # Wake up early if new lines appear, but check periodically if the
+            # process is still alive:
+            log_buf.wait_for_lines(log_buf_pos, LOG_LINE_SEARCH_INTERVAL)
 
         msg_fmt = "`%s` failed to start in `%d` seconds"
         log.warning(msg_fmt, self.id, self._START_TIMEOUT)
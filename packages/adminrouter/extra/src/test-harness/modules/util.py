@@ -4,14 +4,18 @@
 
     Attributes:
         LOG_LINE_SEARCH_INTERVAL (decimal): Defines (in seconds), intervals
-            between subsequent scans of log buffers.
+            between subsequent checks of the state of a process while waiting
+            for its log lines.
 """
 
 import code
+import collections
+import itertools
 import logging
 import os
 import re
 import signal
+import threading
 import time
 import traceback
 from contextlib import contextmanager
@@ -46,6 +50,83 @@ class GuardedSubprocess:
         self._subp.stop()
 
 
+class LineBuffer:
+    """A thread-safe buffer with the most recent log lines of a single stream
+
+    Only the last `max_lines` lines are retained, so that long test runs with
+    verbose subprocesses do not grow memory usage without bounds. Lines are
+    addressed by absolute offsets, i.e. the number of lines appended before
+    them, which stay valid even after older lines are dropped. This makes it
+    possible to scan the buffer incrementally and to block until new lines
+    arrive instead of polling it.
+
+    Iterating over the buffer yields a snapshot of the retained lines.
+    """
+    MAX_LINES = 100000
+
+    def __init__(self, max_lines=MAX_LINES):
+        """Initialize new LineBuffer object
+
+        Args:
+            max_lines (int): number of the most recent lines to retain
+        """
+        self._lines = collections.deque(maxlen=max_lines)
+        self._end = 0
+        self._cond = threading.Condition()
+
+    def append(self, line):
+        """Append a line and wake up all the threads waiting for it"""
+        with self._cond:
+            self._lines.append(line)
+            self._end += 1
+            self._cond.notify_all()
+
+    @property
+    def end(self):
+        """Offset of the next line that is going to be appended"""
+        with self._cond:
+            return self._end
+
+    def lines_since(self, offset):
+        """Return the retained lines starting at `offset`
+
+        Args:
+            offset (int): absolute offset of the first line to return
+
+        Returns:
+            A tuple with a list of lines and the offset following the last of
+            them, which can be passed to the next call of this method.
+        """
+        with self._cond:
+            count = min(self._end - offset, len(self._lines))
+            if count <= 0:
+                return [], self._end
+            lines = list(itertools.islice(reversed(self._lines), count))
+            lines.reverse()
+            return lines, self._end
+
+    def wait_for_lines(self, offset, timeout):
+        """Block until there are lines at or after `offset`
+
+        Args:
+            offset (int): absolute offset of the line to wait for
+            timeout (float): maximum time to wait, in seconds
+
+        Returns:
+            True if new lines are available, False if timed out.
+        """
+        with self._cond:
+            return self._cond.wait_for(lambda: self._end > offset, timeout)
+
+    def __iter__(self):
+        with self._cond:
+            return iter(list(self._lines))
+
+    def __len__(self):
+        with self._cond:
+            return len(self._lines)
+
+
 class SearchCriteria:
     """A helper class that is meant to group together search criteria for
        LineBufferFilter objects
@@ -115,7 +196,7 @@ class LineBufferFilter:
         seconds.
 
         Args:
-            line_buffer (list()): an array of log lines, as presented by `.*_line_buffer()`
+            line_buffer (LineBuffer): log lines, as presented by `.*_line_buffer()`
               method of the object we want to scan lines for.
             timeout (int): how long before LineBufferFilter gives up on searching for
               filter_regexp in line_buffer
@@ -132,18 +213,20 @@ class LineBufferFilter:
         """
         assert isinstance(timeout, int)
         assert timeout >= LOG_LINE_SEARCH_INTERVAL
-        assert isinstance(line_buffer, list)
+        assert isinstance(line_buffer, LineBuffer)
 
         self._line_buffer = line_buffer
         self._timeout = timeout
 
         self._filter_regexpes = filter_regexpes
+        self._compiled_regexpes = [
+            (re.compile(x), x) for x in self._filter_regexpes]
 
     def __enter__(self):
         assert self._line_buffer_start is None
         assert self._line_buffer is not None
 
-        self._line_buffer_start = len(self._line_buffer)
+        self._line_buffer_start = self._line_buffer.end
 
         return self
 
@@ -168,8 +251,8 @@ class LineBufferFilter:
         Arguments:
             line (str): a line to match
         """
-        for filter_regexp in self._filter_regexpes:
-            if re.search(filter_regexp, line, flags=0):
+        for compiled_regexp, filter_regexp in self._compiled_regexpes:
+            if compiled_regexp.search(line):
                 sc = self._filter_regexpes[filter_regexp]
                 if sc.exact and sc.occurrences <= 0:
                     log.warning("filter string `%s` matched more times than requested",
@@ -180,28 +263,32 @@ class LineBufferFilter:
         """Context manager __exit__ method for filter string search
 
         This is the heart of the LineBufferFilter - the whole matching happens
-        here.
+        here. Each line is scanned only once, and instead of polling the buffer
+        we wait for new lines to be appended to it, so the search ends as soon
+        as the last of the lines we are looking for shows up.
         """
         msg_fmt = "Beginning to scan for line `%s` in logline buffer"
         log.debug(msg_fmt, list(self._filter_regexpes.keys()))
 
         deadline = time.time() + self._timeout
 
-        while time.time() < deadline:
-            lines_scanned = 0
+        while True:
+            log_lines, self._line_buffer_start = self._line_buffer.lines_since(
+                self._line_buffer_start)
 
-            for log_line in self._line_buffer[self._line_buffer_start:]:
+            for log_line in log_lines:
                 self._match_line_against_filter_regexpes(log_line)
                 if self._all_found:
                     return
-                lines_scanned += 1
 
-            self._line_buffer_start = self._line_buffer_start + lines_scanned
+            time_left = deadline - time.time()
+            if time_left <= 0:
+                break
 
             msg_fmt = "waiting for strings `%s` to appear in logline buffer"
             log.debug(msg_fmt, self._regexpes_still_not_matched)
 
-            time.sleep(LOG_LINE_SEARCH_INTERVAL)
+            self._line_buffer.wait_for_lines(self._line_buffer_start, time_left)
 
         msg_fmt = "Timed out while waiting for strings `%s` to appear in logline buffer"
         log.debug(msg_fmt, self._regexpes_still_not_matched)
@@ -35,14 +35,17 @@ def repo_is_ee():
 # We explicitly need dns_server_mock_s fixture here as Mock HTTP servers
 # require DNS to resolve their server_names.
 @pytest.fixture(scope='session')
-def mocker_s(repo_is_ee, syslog_mock, extra_lo_ips, dns_server_mock_s):
+def mocker_s(repo_is_ee, syslog_mock, extra_lo_ips, dns_server_mock_s, pytestconfig):
     """Provide a gc-ed mocker instance suitable for the repository flavour"""
     if repo_is_ee:
         from mocker.ee import Mocker
     else:
         from mocker.open import Mocker
 
-    m = Mocker()
+    if pytestconfig.getoption('event_loop_mocks'):
+        m = Mocker(event_loop_endpoints=True)
+    else:
+        m = Mocker()
     m.start()
 
     yield m
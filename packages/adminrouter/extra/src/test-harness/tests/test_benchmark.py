@@ -0,0 +1,222 @@
+# Copyright (C) Mesosphere, Inc. See LICENSE file for details.
+
+"""Benchmarks of Admin Router with the state of a large synthetic cluster
+
+These are skipped unless pytest is given the `--benchmark` option. The size
+of the cluster and of the load can be set using the `--benchmark-apps`,
+`--benchmark-agents`, `--benchmark-requests` and `--benchmark-concurrency`
+options, e.g.:
+
+    pytest --benchmark -m benchmark --benchmark-apps 20000
+
+Results are printed to stdout.
+"""
+
+import logging
+import math
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import requests
+
+from mocker.endpoints.marathon import app_from_template
+from mocker.endpoints.mesos import AGENT1_DICT, AGENT1_ID, agent_from_template
+from util import GuardedSubprocess
+
+log = logging.getLogger(__name__)
+
+REFRESH_LOG_REGEXP = re.compile(
+    r'Cache refresh of (\d+) entries took ([\d.]+) seconds')
+STORED_LOG_REGEXP = re.compile(
+    r'Stored (\d+) records \((\d+) bytes\) as generation (\d+) of (\w+)')
+
+# Upper bound of the duration of a single cache refresh of the synthetic
+# cluster.
+REFRESH_TIMEOUT = 120
+
+
+@pytest.fixture(scope='module')
+def cluster_size(pytestconfig):
+    return {
+        'apps': pytestconfig.getoption('benchmark_apps'),
+        'agents': pytestconfig.getoption('benchmark_agents'),
+        'requests': pytestconfig.getoption('benchmark_requests'),
+        'concurrency': pytestconfig.getoption('benchmark_concurrency'),
+    }
+
+
+@pytest.fixture()
+def synthetic_cluster(mocker, cluster_size):
+    """Make the Marathon and Mesos mocks serve a cluster of `cluster_size`
+
+    All the apps and agents point to the reflecting endpoints of the default
+    app and AGENT1, so requests to any of them succeed.
+    """
+    apps = [
+        app_from_template("bench-app-{}".format(i), 16000)
+        for i in range(cluster_size['apps'])]
+    mocker.send_command(endpoint_id='http://127.0.0.1:8080',
+                        func_name='set_apps_response',
+                        aux_data={"apps": apps})
+
+    agents = [AGENT1_DICT]
+    for i in range(cluster_size['agents'] - 1):
+        agents.append(agent_from_template(
+            "bench-agent-S{}".format(i), "127.0.0.2", "15001"))
+    mocker.send_command(endpoint_id='http://127.0.0.2:5050',
+                        func_name='set_agents_response',
+                        aux_data=agents)
+
+    return cluster_size
+
+
+def percentile(values, pct):
+    """Return the `pct` percentile of `values` using the nearest-rank method"""
+    ordered = sorted(values)
+    rank = int(math.ceil(pct / 100.0 * len(ordered)))
+    return ordered[max(rank, 1) - 1]
+
+
+def wait_for_log_lines(ar, regexp, count, timeout=REFRESH_TIMEOUT):
+    """Wait until Admin Router logged `count` lines matching `regexp`
+
+    Returns:
+        A list with the match objects of the first `count` lines.
+    """
+    line_buffer = ar.stderr_line_buffer
+    deadline = time.time() + timeout
+    matches = []
+    offset = 0
+    while True:
+        lines, offset = line_buffer.lines_since(offset)
+        for line in lines:
+            m = regexp.search(line)
+            if m is not None:
+                matches.append(m)
+        if len(matches) >= count:
+            return matches[:count]
+        remaining = deadline - time.time()
+        assert remaining > 0 and line_buffer.wait_for_lines(offset, remaining), \
+            "Timed out waiting for {} `{}` log lines".format(count, regexp.pattern)
+
+
+def measure_latency(url, headers, count):
+    """Send `count` sequential requests to `url`, return their latencies
+
+    Requests are sent over a single keep-alive connection, so that the
+    latency is dominated by Admin Router's request processing.
+    """
+    latencies = []
+    with requests.Session() as session:
+        for _ in range(count):
+            start = time.perf_counter()
+            resp = session.get(url, allow_redirects=False, headers=headers)
+            latencies.append(time.perf_counter() - start)
+            assert resp.status_code == 200
+
+    return latencies
+
+
+def measure_throughput(url, headers, count, concurrency):
+    """Send `count` requests to `url` from `concurrency` clients
+
+    Every client uses its own keep-alive connection.
+
+    Returns:
+        Number of requests per second.
+    """
+    sessions = threading.local()
+
+    def get(_):
+        if not hasattr(sessions, 'session'):
+            sessions.session = requests.Session()
+        resp = sessions.session.get(url, allow_redirects=False, headers=headers)
+        assert resp.status_code == 200
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(get, range(count)))
+    return count / (time.perf_counter() - start)
+
+
+def report(msg):
+    log.info(msg)
+    print(msg)
+
+
+def report_latency(name, latencies):
+    report("{}: {} requests, p50 {:.2f}ms, p99 {:.2f}ms, max {:.2f}ms".format(
+        name,
+        len(latencies),
+        percentile(latencies, 50) * 1000,
+        percentile(latencies, 99) * 1000,
+        max(latencies) * 1000,
+        ))
+
+
+def benchmark_endpoint(name, ar, path, headers, cluster):
+    url = ar.make_url_from_path(path)
+
+    # Let the cache warm-up:
+    wait_for_log_lines(ar, REFRESH_LOG_REGEXP, 1)
+
+    latencies = measure_latency(url, headers, cluster['requests'])
+    report_latency(name, latencies)
+
+    rps = measure_throughput(
+        url, headers, cluster['requests'], cluster['concurrency'])
+    report("{}: {:.0f} requests/s with {} clients".format(
+        name, rps, cluster['concurrency']))
+
+
+@pytest.mark.benchmark
+class TestLargeCluster:
+    def test_cache_refresh(self, nginx_class, synthetic_cluster):
+        cache_poll_period = 30
+        ar = nginx_class(cache_first_poll_delay=1,
+                         cache_poll_period=cache_poll_period,
+                         cache_expiration=cache_poll_period - 5)
+
+        with GuardedSubprocess(ar):
+            # The first refresh stores all the data, the second one finds
+            # the same data in the backends:
+            refreshes = wait_for_log_lines(
+                ar, REFRESH_LOG_REGEXP, 2,
+                timeout=cache_poll_period + REFRESH_TIMEOUT)
+            stored = wait_for_log_lines(ar, STORED_LOG_REGEXP, 2)
+
+        size = "{} apps and {} agents".format(
+            synthetic_cluster['apps'], synthetic_cluster['agents'])
+        for i, refresh in zip(['First', 'Second'], refreshes):
+            report("{} cache refresh with {} took {}s".format(
+                i, size, refresh.group(2)))
+        for m in stored:
+            report("Cache entry `{}` with {}: {} records, {:.1f} MiB".format(
+                m.group(4), size, m.group(1), int(m.group(2)) / 2**20))
+
+    def test_agent_endpoint(
+            self, nginx_class, synthetic_cluster, valid_user_header):
+        ar = nginx_class()
+        with GuardedSubprocess(ar):
+            benchmark_endpoint(
+                "/agent/ with {} agents".format(synthetic_cluster['agents']),
+                ar,
+                '/agent/{}/blah/blah'.format(AGENT1_ID),
+                valid_user_header,
+                synthetic_cluster,
+                )
+
+    def test_service_endpoint(
+            self, nginx_class, synthetic_cluster, valid_user_header):
+        ar = nginx_class()
+        with GuardedSubprocess(ar):
+            benchmark_endpoint(
+                "/service/ with {} apps".format(synthetic_cluster['apps']),
+                ar,
+                '/service/bench-app-0/foo/bar',
+                valid_user_header,
+                synthetic_cluster,
+                )
@@ -18,6 +18,10 @@ from util import GuardedSubprocess, LineBufferFilter, SearchCriteria
 
 log = logging.getLogger(__name__)
 
+CACHE_STATUS_URL = 'http://127.0.0.1:61002/cache/status'
+CACHE_ENTRIES = {'mesosstate', 'svcapps', 'marathon_leader', 'mesos_leader'}
+CACHE_SHM_SIZE = 100 * 1024 * 1024
+
 
 class TestCache:
     def test_if_first_cache_refresh_occurs_earlier(
@@ -425,6 +429,34 @@ class TestCache:
             req_data = resp.json()
             assert req_data['endpoint_id'] == 'http://127.0.0.15:16001'
 
+    def test_if_unchanged_marathon_apps_are_not_processed_again(
+            self, nginx_class, valid_user_header):
+        filter_regexp = {
+            "Reading state for appId '/scheduler-alwaysthere'": SearchCriteria(1, True),
+            'Marathon apps did not change, skipping update': SearchCriteria(2, True),
+            r'\(2 refreshes skipped so far\)': SearchCriteria(1, True),
+            'Marathon apps cache has been successfully updated': SearchCriteria(3, True),
+            }
+        cache_poll_period = 4
+        ar = nginx_class(cache_poll_period=cache_poll_period, cache_expiration=3)
+        url = ar.make_url_from_path('/service/scheduler-alwaysthere/bar/baz')
+
+        with GuardedSubprocess(ar):
+            lbf = LineBufferFilter(filter_regexp,
+                                   timeout=cache_poll_period * 3 + 1,
+                                   line_buffer=ar.stderr_line_buffer)
+
+            lbf.scan_log_buffer()
+
+            # Apps from the first refresh are still served:
+            resp = requests.get(url,
+                                allow_redirects=False,
+                                headers=valid_user_header)
+            assert resp.status_code == 200
+            assert resp.json()['endpoint_id'] == 'http://127.0.0.1:16000'
+
+        assert lbf.extra_matches == {}
+
     def test_if_changing_mesos_state_is_reflected_in_cache(
             self, nginx_class, valid_user_header, mocker):
         cache_poll_period = 4
@@ -683,6 +715,71 @@ class TestCache:
                 time.sleep(backend_request_timeout * 0.3 + 1)  # let it warm-up!
                 ping_mesos_agent(ar, valid_user_header)
 
+    def test_if_backends_are_queried_concurrently(
+            self, nginx_class, mocker, valid_user_header):
+        filter_regexp = {
+            'Executing cache refresh triggered by request': SearchCriteria(1, True),
+            'Cache refresh of 4 entries took': SearchCriteria(1, True),
+            'Mesos state cache has been successfully updated': SearchCriteria(1, True),
+            'Marathon apps cache has been successfully updated': SearchCriteria(1, True),
+            'marathon leader cache has been successfully updated': SearchCriteria(1, True),
+            }
+        backend_delay = 3
+
+        # Make sure that timers will not interfere:
+        ar = nginx_class(cache_first_poll_delay=120,
+                         cache_poll_period=120,
+                         cache_expiration=115)
+
+        # Delay both Marathon requests and the Mesos request:
+        for endpoint_id in ['http://127.0.0.1:8080', 'http://127.0.0.2:5050']:
+            mocker.send_command(endpoint_id=endpoint_id,
+                                func_name='always_stall',
+                                aux_data=backend_delay)
+
+        with GuardedSubprocess(ar):
+            lbf = LineBufferFilter(filter_regexp,
+                                   timeout=5,
+                                   line_buffer=ar.stderr_line_buffer)
+
+            start = time.time()
+            ping_mesos_agent(ar, valid_user_header)
+            elapsed = time.time() - start
+
+            lbf.scan_log_buffer()
+
+        assert lbf.extra_matches == {}
+        # The refresh takes as long as the slowest backend instead of the sum
+        # of the three delays.
+        assert backend_delay <= elapsed < 2 * backend_delay
+
+    def test_if_slow_marathon_does_not_delay_mesos_cache(
+            self, nginx_class, mocker, valid_user_header):
+        backend_delay = 5
+
+        mocker.send_command(endpoint_id='http://127.0.0.1:8080',
+                            func_name='always_stall',
+                            aux_data=backend_delay)
+
+        ar = nginx_class(cache_first_poll_delay=1,
+                         cache_poll_period=120,
+                         cache_expiration=115)
+
+        with GuardedSubprocess(ar):
+            lbf = LineBufferFilter(
+                {'Mesos state cache has been successfully updated': SearchCriteria(1, True)},
+                timeout=3,
+                line_buffer=ar.stderr_line_buffer)
+            lbf.scan_log_buffer()
+
+            # Mesos state has been stored while Marathon requests are still
+            # in flight.
+            assert lbf.extra_matches == {}
+            marathon_updated = [
+                line for line in ar.stderr_line_buffer
+                if 'Marathon apps cache has been successfully updated' in line]
+            assert marathon_updated == []
+
     def test_if_temp_dns_borkage_does_not_disrupt_mesosleader_caching(
             self, nginx_class, dns_server_mock, valid_user_header):
         filter_regexp_pre = {
@@ -807,6 +904,103 @@ class TestCache:
         assert len(mesosmock_post_reqs) == 1
 
 
+class TestCacheStatus:
+    def test_if_cache_status_is_reported(
+            self, nginx_class, valid_user_header):
+        # Make sure that timers will not interfere:
+        ar = nginx_class(cache_first_poll_delay=120,
+                         cache_poll_period=120,
+                         cache_expiration=115)
+
+        with GuardedSubprocess(ar):
+            ping_mesos_agent(ar, valid_user_header)
+
+            resp = requests.get(CACHE_STATUS_URL)
+
+        assert resp.status_code == 200
+        status = resp.json()
+
+        assert set(status['entries']) == CACHE_ENTRIES
+        for entry in status['entries'].values():
+            assert entry['size'] > 0
+            assert entry['fetch_duration'] >= 0
+            assert 0 <= entry['age'] < 115
+            assert entry['stale_reads'] == 0
+            assert entry['too_old_reads'] == 0
+        for name in ['mesosstate', 'svcapps', 'marathon_leader']:
+            assert status['entries'][name]['decode_duration'] >= 0
+        for name in ['mesosstate', 'svcapps']:
+            assert status['entries'][name]['encode_duration'] >= 0
+
+        assert status['refresh']['count'] == 1
+        assert status['refresh']['last_duration'] >= 0
+        assert status['lock']['waits'] == 1
+        assert status['lock']['wait_last'] >= 0
+        assert status['lock']['timeouts'] == 0
+        assert 0 < status['shm']['free_space'] <= status['shm']['capacity']
+
+    def test_if_shm_usage_is_reported(self, nginx_class, valid_user_header):
+        # Make sure that timers will not interfere:
+        ar = nginx_class(cache_first_poll_delay=120,
+                         cache_poll_period=120,
+                         cache_expiration=115)
+
+        with GuardedSubprocess(ar):
+            resp = requests.get(CACHE_STATUS_URL)
+            assert resp.status_code == 200
+            empty_shm = resp.json()['shm']
+
+            ping_mesos_agent(ar, valid_user_header)
+
+            resp = requests.get(CACHE_STATUS_URL)
+            assert resp.status_code == 200
+            filled_shm = resp.json()['shm']
+
+        # `lua_shared_dict cache` in includes/http/master.conf
+        assert empty_shm['capacity'] == filled_shm['capacity'] == CACHE_SHM_SIZE
+        assert 0 < filled_shm['free_space'] < empty_shm['free_space'] <= CACHE_SHM_SIZE
+
+    def test_if_stale_and_too_old_reads_are_counted(
+            self, nginx_class, mocker, valid_user_header):
+        ar = nginx_class(cache_max_age_soft_limit=3,
+                         cache_max_age_hard_limit=4,
+                         cache_expiration=2,
+                         cache_poll_period=3,
+                         )
+        url = ar.make_url_from_path('/service/scheduler-alwaysthere/foo/bar/')
+
+        with GuardedSubprocess(ar):
+            resp = requests.get(url,
+                                allow_redirects=False,
+                                headers=valid_user_header)
+            assert resp.status_code == 200
+
+            mocker.send_command(endpoint_id='http://127.0.0.1:8080',
+                                func_name='always_bork',
+                                aux_data=True)
+
+            # cache_max_age_soft_limit + 0.5s, the entry is stale:
+            time.sleep(3 + 0.5)
+            resp = requests.get(url,
+                                allow_redirects=False,
+                                headers=valid_user_header)
+            assert resp.status_code == 200
+
+            # cache_max_age_hard_limit + 1s, the entry is too old:
+            time.sleep(1 + 1)
+            resp = requests.get(url,
+                                allow_redirects=False,
+                                headers=valid_user_header)
+            assert resp.status_code == 503
+
+            resp = requests.get(CACHE_STATUS_URL)
+
+        assert resp.status_code == 200
+        svcapps = resp.json()['entries']['svcapps']
+        assert svcapps['stale_reads'] == 1
+        assert svcapps['too_old_reads'] == 1
+
+
 class TestCacheMesosLeader:
     def test_if_unset_hostip_var_is_handled(self, nginx_class, valid_user_header):
         filter_regexp = {
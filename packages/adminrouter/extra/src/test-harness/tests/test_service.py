@@ -2,6 +2,7 @@
 # Copyright (C) Mesosphere, Inc. See LICENSE file for details.
 
 import time
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urljoin
 
 import pytest
@@ -392,6 +393,104 @@ class TestServiceStateful:
         assert len(r_reqs) == 1
         header_is_absent(r_reqs[0]['headers'], 'Authorization')
 
+    def _resolve_via_mesos_dns_only(self, mocker, srv_response):
+        mocker.send_command(endpoint_id='http://127.0.0.1:8080',
+                            func_name='set_apps_response',
+                            aux_data={"apps": []})
+        mocker.send_command(endpoint_id='http://127.0.0.2:5050',
+                            func_name='set_frameworks_response',
+                            aux_data=[SCHEDULER_FWRK_ALWAYSTHERE_NOWEBUI])
+        mocker.send_command(endpoint_id='http://127.0.0.1:8123',
+                            func_name='set_srv_response',
+                            aux_data=srv_response)
+        mocker.send_command(endpoint_id='http://127.0.0.1:8123',
+                            func_name='record_requests')
+
+    def test_if_mesos_dns_srv_entries_are_cached(
+            self, master_ar_process_pertest, mocker, valid_user_header):
+        self._resolve_via_mesos_dns_only(
+            mocker, SCHEDULER_SRV_ALWAYSTHERE_DIFFERENTPORT)
+
+        for _ in range(5):
+            generic_correct_upstream_dest_test(
+                master_ar_process_pertest,
+                valid_user_header,
+                '/service/scheduler-alwaysthere/foo/bar/',
+                "http://127.0.0.15:16001"
+                )
+
+        r_reqs = mocker.send_command(endpoint_id='http://127.0.0.1:8123',
+                                     func_name='get_recorded_requests')
+        assert len(r_reqs) == 1
+
+        # Wait for the cached entry to expire:
+        time.sleep(5 + 1)
+
+        generic_correct_upstream_dest_test(
+            master_ar_process_pertest,
+            valid_user_header,
+            '/service/scheduler-alwaysthere/foo/bar/',
+            "http://127.0.0.15:16001"
+            )
+
+        r_reqs = mocker.send_command(endpoint_id='http://127.0.0.1:8123',
+                                     func_name='get_recorded_requests')
+        assert len(r_reqs) == 2
+
+    def test_if_missing_mesos_dns_srv_entries_are_cached(
+            self, master_ar_process_pertest, mocker, valid_user_header):
+        self._resolve_via_mesos_dns_only(mocker, EMPTY_SRV)
+
+        url = master_ar_process_pertest.make_url_from_path(
+            '/service/scheduler-alwaysthere/foo/bar/')
+        for _ in range(5):
+            resp = requests.get(url,
+                                allow_redirects=False,
+                                headers=valid_user_header)
+            assert resp.status_code == 404
+
+        r_reqs = mocker.send_command(endpoint_id='http://127.0.0.1:8123',
+                                     func_name='get_recorded_requests')
+        assert len(r_reqs) == 1
+
+    def test_if_concurrent_mesos_dns_srv_queries_are_coalesced(
+            self, master_ar_process_pertest, mocker, valid_user_header):
+        self._resolve_via_mesos_dns_only(
+            mocker, SCHEDULER_SRV_ALWAYSTHERE_DIFFERENTPORT)
+        # Keep the first query in flight while the other requests arrive:
+        mocker.send_command(endpoint_id='http://127.0.0.1:8123',
+                            func_name='always_stall',
+                            aux_data=1)
+
+        url = master_ar_process_pertest.make_url_from_path(
+            '/service/scheduler-alwaysthere/foo/bar/')
+
+        def get(_):
+            return requests.get(url,
+                                allow_redirects=False,
+                                headers=valid_user_header)
+
+        # Only the number of the queries matters here:
+        mocker.send_command(endpoint_id='http://127.0.0.1:8123',
+                            func_name='record_requests',
+                            aux_data={'count_only': True})
+
+        with ThreadPoolExecutor(max_workers=5) as executor:
+            responses = list(executor.map(get, range(5)))
+
+        for resp in responses:
+            assert resp.status_code == 200
+            assert resp.json()['endpoint_id'] == "http://127.0.0.15:16001"
+
+        queries_cnt = mocker.send_command(
+            endpoint_id='http://127.0.0.1:8123',
+            func_name='get_recorded_requests_count',
+            aux_data={
+                'path': '/v1/services/_scheduler-alwaysthere._tcp.marathon.mesos',
+                'method': 'GET',
+                })
+        assert queries_cnt == 1
+
     def test_if_no_services_in_cluster_case_is_handled(
             self, master_ar_process_pertest, mocker, valid_user_header):
         # Remove the data from ALL backends:
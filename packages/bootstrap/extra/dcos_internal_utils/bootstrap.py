@@ -4,8 +4,6 @@ import sys
 import uuid
 
 import kazoo.exceptions
-from kazoo.client import KazooClient
-from kazoo.retry import KazooRetry
 from kazoo.security import ACL, ANYONE_ID_UNSAFE, Permissions
 
 from dcos_internal_utils import utils
@@ -23,20 +21,31 @@ ANYONE_ALL = [ACL(Permissions.ALL, ANYONE_ID_UNSAFE)]
 
 class Bootstrapper(object):
     def __init__(self, zk_hosts):
-        conn_retry_policy = KazooRetry(max_tries=-1, delay=0.1, max_delay=0.1)
-        cmd_retry_policy = KazooRetry(max_tries=3, delay=0.3, backoff=1, max_delay=1, ignore_expire=False)
-        self._zk = KazooClient(hosts=zk_hosts, connection_retry=conn_retry_policy, command_retry=cmd_retry_policy)
+        self._zk_hosts = zk_hosts
+        self._zk = None
+        # The cluster ID never changes once consensus about it was reached, so a long running bootstrapper only needs
+        # to ask ZooKeeper once per path.
+        self._cluster_ids = {}
 
     @property
     def zk(self):
         """Lazy initialize zk client"""
+        if self._zk is None:
+            # The kazoo client pulls in a lot of modules, services which never talk to ZooKeeper don't import it.
+            from kazoo.client import KazooClient
+            from kazoo.retry import KazooRetry
+
+            conn_retry_policy = KazooRetry(max_tries=-1, delay=0.1, max_delay=0.1)
+            cmd_retry_policy = KazooRetry(max_tries=3, delay=0.3, backoff=1, max_delay=1, ignore_expire=False)
+            self._zk = KazooClient(
+                hosts=self._zk_hosts, connection_retry=conn_retry_policy, command_retry=cmd_retry_policy)
         if self._zk.connected:
             return self._zk
         self._zk.start()
         return self._zk
 
     def close(self):
-        if self._zk.connected:
+        if self._zk is not None and self._zk.connected:
             self._zk.stop()
             self._zk.close()
 
@@ -52,6 +61,11 @@ class Bootstrapper(object):
         with utils.Directory(dirpath) as d:
             log.info('Taking exclusive lock on {}'.format(dirpath))
             with d.lock():
+                cached = self._cluster_ids.get(path)
+                if cached is not None and os.path.exists(path) and utils.read_file_line(path) == cached:
+                    log.info('Cluster ID in {} matches the one already agreed on: {}'.format(path, cached))
+                    return cached
+
                 if readonly:
                     zkid = None
                 else:
@@ -59,6 +73,7 @@ class Bootstrapper(object):
 
                 zkid = self._consensus('/cluster-id', zkid, ANYONE_READ)
                 zkid = zkid.decode('ascii')
+                self._cluster_ids[path] = zkid
 
                 if os.path.exists(path):
                     fileid = utils.read_file_line(path)
@@ -10,13 +10,7 @@ import stat
 import sys
 import tempfile
 
-import cryptography.hazmat.backends
-import requests
-from cryptography.hazmat.primitives import serialization
-from cryptography.hazmat.primitives.asymmetric import rsa
-from jwt.utils import base64url_decode, bytes_to_number
-
-from dcos_internal_utils import bootstrap, exhibitor
+from dcos_internal_utils import bootstrap, daemon, exhibitor
 from pkgpanda.actions import apply_service_configuration
 
 log = logging.getLogger(__name__)
@@ -33,6 +27,13 @@ def check_root(fun):
 
 @check_root
 def dcos_adminrouter(b, opts):
+    # bootstrap runs before every DC/OS service starts, only Admin Router needs these (slow to import) libraries.
+    import cryptography.hazmat.backends
+    import requests
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    from jwt.utils import base64url_decode, bytes_to_number
+
     b.cluster_id()
 
     # Require the IAM to already be up and running. The IAM contains logic for
@@ -142,6 +143,49 @@ def get_roles():
     return os.listdir('/opt/mesosphere/etc/roles')
 
 
+def bootstrap_services(b, opts):
+    for service in opts.services:
+        if service not in bootstrappers:
+            log.error('Unknown service: {}'.format(service))
+            sys.exit(1)
+        apply_service_configuration(service)
+        log.debug('bootstrapping {}'.format(service))
+        bootstrappers[service](b, opts)
+
+
+class WarmBootstrapper:
+    """
+    Handles the requests of `bootstrap --serve`, keeping one Bootstrapper (and with it the ZooKeeper session and the
+    cluster ID) per ZooKeeper address and remembering that exhibitor was ready until the local ZooKeeper restarts.
+    """
+    def __init__(self):
+        self._bootstrappers = {}
+        self._ready_zk_pid_mtime = None
+
+    def wait_exhibitor(self, master_count, timeout):
+        if self._ready_zk_pid_mtime is not None and self._ready_zk_pid_mtime == exhibitor.get_zk_pid_mtime():
+            log.info('ZooKeeper has not restarted since it was last found ready')
+            return
+        exhibitor.wait(master_count, timeout)
+        self._ready_zk_pid_mtime = exhibitor.get_zk_pid_mtime()
+
+    def __call__(self, message):
+        opts = argparse.Namespace(**message)
+
+        if 'master' in get_roles():
+            self.wait_exhibitor(opts.master_count, opts.exhibitor_timeout)
+
+        if opts.zk not in self._bootstrappers:
+            self._bootstrappers[opts.zk] = bootstrap.Bootstrapper(opts.zk)
+        bootstrap_services(self._bootstrappers[opts.zk], opts)
+
+
+def serve():
+    log.info('Serving bootstrap requests on {}'.format(daemon.BOOTSTRAP_SOCKET_PATH))
+    with daemon.BootstrapServer(WarmBootstrapper()) as server:
+        server.serve_forever()
+
+
 def main():
     opts = parse_args()
 
@@ -153,18 +197,24 @@ def main():
         os.environ.pop(name, None)
         os.environ.pop(name.lower(), None)
 
+    if opts.serve:
+        serve()
+        return
+
+    # The request carries the environment of the calling service, which the daemon bootstraps it with.
+    response = daemon.request(
+        opts.services, zk=opts.zk, master_count=opts.master_count, exhibitor_timeout=opts.exhibitor_timeout)
+    if response is not None:
+        for line in response['log']:
+            sys.stderr.write(line + '\n')
+        sys.exit(response['returncode'])
+    log.info('Bootstrap daemon on {} not available, bootstrapping in-process'.format(daemon.BOOTSTRAP_SOCKET_PATH))
+
     if 'master' in get_roles():
-        exhibitor.wait(opts.master_count)
+        exhibitor.wait(opts.master_count, opts.exhibitor_timeout)
 
     b = bootstrap.Bootstrapper(opts.zk)
-
-    for service in opts.services:
-        if service not in bootstrappers:
-            log.error('Unknown service: {}'.format(service))
-            sys.exit(1)
-        apply_service_configuration(service)
-        log.debug('bootstrapping {}'.format(service))
-        bootstrappers[service](b, opts)
+    bootstrap_services(b, opts)
 
 
 def get_zookeeper_address_agent():
@@ -198,7 +248,7 @@ def parse_args():
     zk_default = get_zookeeper_address()
 
     parser = argparse.ArgumentParser()
-    parser.add_argument('services', nargs='+')
+    parser.add_argument('services', nargs='*')
     parser.add_argument(
         '--zk',
         type=str,
@@ -209,7 +259,20 @@ def parse_args():
         type=str,
         default='/opt/mesosphere/etc/master_count',
         help='File with number of master servers')
-    return parser.parse_args()
+    parser.add_argument(
+        '--exhibitor_timeout',
+        type=float,
+        default=exhibitor.WAIT_TIMEOUT,
+        help='Seconds to wait for exhibitor to bring up the ZooKeeper quorum on masters')
+    parser.add_argument(
+        '--serve',
+        action='store_true',
+        help='Serve bootstrap requests on {} instead of bootstrapping services'.format(
+            daemon.BOOTSTRAP_SOCKET_PATH))
+    opts = parser.parse_args()
+    if not opts.services and not opts.serve:
+        parser.error('at least one service is required')
+    return opts
 
 
 def _write_file_bytes(path, data, mode):
@@ -0,0 +1,156 @@
+"""
+Serve bootstrap requests for all DC/OS services of a node from one long running process.
+
+Every service runs `bootstrap <service>` as an ExecStartPre. Without the daemon each of those invocations starts a new
+interpreter, imports the ZooKeeper and crypto libraries and opens its own ZooKeeper session. The daemon is started
+once per node (through socket activation of dcos-bootstrap.socket) and keeps all of that warm. `bootstrap` sends its
+request over BOOTSTRAP_SOCKET_PATH and falls back to doing the work in-process if nobody is listening.
+
+Requests are handled one at a time, in the order they arrive, so the file locks and ZooKeeper consensus work exactly
+as they do for separate processes. A request is handled with the environment of the requesting service, and requests
+of other users than the one running the daemon are rejected, so the outcome doesn't depend on whether the daemon or
+the service itself did the work. A service whose request is rejected or not answered within REQUEST_TIMEOUT (e.g.
+because the daemon is waiting for exhibitor on behalf of another one) bootstraps in-process.
+"""
+import json
+import logging
+import os
+import socket
+import socketserver
+import struct
+
+log = logging.getLogger(__name__)
+
+
+BOOTSTRAP_SOCKET_PATH = '/run/dcos/bootstrap.sock'
+
+# First file descriptor passed by systemd socket activation, see sd_listen_fds(3).
+SD_LISTEN_FDS_START = 3
+
+# Seconds to wait for the daemon to answer a request. A warm request takes well below a second, this leaves enough
+# of the start timeout of the requesting service for bootstrapping in-process.
+REQUEST_TIMEOUT = 5
+
+
+def request(services, zk=None, master_count=None, exhibitor_timeout=None, path=BOOTSTRAP_SOCKET_PATH,
+            timeout=REQUEST_TIMEOUT, environment=None):
+    """
+    Ask the daemon listening at `path` to bootstrap `services` with `environment` (the one of this process by
+    default).
+
+    Returns a dict with the `returncode` of the request and the `log` lines the daemon emitted while handling it, or
+    None if there is no daemon, it rejected the request or it didn't answer within `timeout` seconds.
+    """
+    message = {
+        'services': services,
+        'zk': zk,
+        'master_count': master_count,
+        'exhibitor_timeout': exhibitor_timeout,
+        'environment': dict(os.environ if environment is None else environment),
+    }
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    with sock:
+        sock.settimeout(timeout)
+        try:
+            sock.connect(path)
+        except (FileNotFoundError, ConnectionRefusedError, PermissionError):
+            return None
+
+        try:
+            sock.sendall(json.dumps(message).encode('utf-8') + b'\n')
+            response = sock.makefile('rb').readline()
+        except socket.timeout:
+            log.warning('Bootstrap daemon did not answer within {} seconds'.format(timeout))
+            return None
+
+    if not response:
+        log.warning('Bootstrap daemon closed the connection without answering')
+        return None
+    response = json.loads(response.decode('utf-8'))
+    if 'rejected' in response:
+        log.warning('Bootstrap daemon rejected the request: {}'.format(response['rejected']))
+        return None
+    return response
+
+
+def _peer_uid(sock):
+    """Return the uid of the process connected to the unix socket `sock`."""
+    _, uid, _ = struct.unpack('3i', sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize('3i')))
+    return uid
+
+
+class _LogCapture(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.setFormatter(logging.Formatter('[%(levelname)s] %(message)s'))
+        self.lines = []
+
+    def emit(self, record):
+        self.lines.append(self.format(record))
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        message = json.loads(self.rfile.readline().decode('utf-8'))
+
+        uid = _peer_uid(self.request)
+        if uid != os.getuid():
+            log.warning('Rejecting request of uid {} to bootstrap {}'.format(uid, ', '.join(message['services'])))
+            response = {'rejected': 'the daemon only bootstraps services running as uid {}'.format(os.getuid())}
+        else:
+            response = self.bootstrap(message)
+        try:
+            self.wfile.write(json.dumps(response).encode('utf-8') + b'\n')
+        except BrokenPipeError:
+            log.warning('Requester of {} stopped waiting for the answer'.format(', '.join(message['services'])))
+
+    def bootstrap(self, message):
+        log.info('Bootstrapping {}'.format(', '.join(message['services'])))
+        environment = message.pop('environment')
+
+        # Hand the log of this request back so it ends up in the journal of the requesting service as well.
+        capture = _LogCapture()
+        logging.getLogger().addHandler(capture)
+        daemon_environment = dict(os.environ)
+        os.environ.clear()
+        os.environ.update(environment)
+        try:
+            self.server.bootstrap(message)
+            returncode = 0
+        except SystemExit as ex:
+            returncode = ex.code if isinstance(ex.code, int) else 1
+        except Exception:
+            log.exception('Bootstrapping {} failed'.format(', '.join(message['services'])))
+            returncode = 1
+        finally:
+            os.environ.clear()
+            os.environ.update(daemon_environment)
+            logging.getLogger().removeHandler(capture)
+
+        return {'returncode': returncode, 'log': capture.lines}
+
+
+class BootstrapServer(socketserver.UnixStreamServer):
+    """
+    Unix socket server calling `bootstrap(message)` for every request, where message is the dict passed to `request`.
+    A request fails if `bootstrap` raises, including through sys.exit().
+    """
+    def __init__(self, bootstrap, path=BOOTSTRAP_SOCKET_PATH):
+        self.bootstrap = bootstrap
+        activated = os.environ.get('LISTEN_PID') == str(os.getpid()) and os.environ.get('LISTEN_FDS') == '1'
+        super().__init__(path, _RequestHandler, bind_and_activate=not activated)
+        if activated:
+            log.info('Using socket passed by systemd')
+            self.socket.close()
+            self.socket = socket.fromfd(SD_LISTEN_FDS_START, socket.AF_UNIX, socket.SOCK_STREAM)
+            os.close(SD_LISTEN_FDS_START)
+
+    def server_bind(self):
+        # Only reached when not socket activated, a socket left behind by a previous instance is stale.
+        try:
+            os.remove(self.server_address)
+        except FileNotFoundError:
+            pass
+        super().server_bind()
+        os.chmod(self.server_address, 0o600)
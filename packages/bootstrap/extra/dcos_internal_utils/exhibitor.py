@@ -1,8 +1,9 @@
 import logging
 import os
+import random
+import socket
 import sys
-
-import requests
+import time
 
 from dcos_internal_utils import utils
 from pkgpanda.util import load_string, write_string
@@ -11,6 +12,18 @@ log = logging.getLogger(__name__)
 
 
 EXHIBITOR_STATUS_URL = 'http://127.0.0.1:8181/exhibitor/v1/cluster/status'
+ZK_ADDRESS = ('127.0.0.1', 2181)
+
+# How long `wait` polls for the ZooKeeper quorum before hard failing, in seconds. This stays below the start timeout
+# of the units bootstrapping on masters (60s for dcos-cockroach, 90s by default) so they fail rather than get killed,
+# and so the bootstrap daemon, which handles one request at a time, isn't blocked for long. systemd restarts the
+# unit to wait some more.
+WAIT_TIMEOUT = 50
+# Exponential backoff between polls, each delay is jittered by +-50%.
+WAIT_INITIAL_DELAY = 0.2
+WAIT_MAX_DELAY = 5
+# Timeout of a single ZooKeeper probe or exhibitor status request.
+PROBE_TIMEOUT = 2
 
 zk_pid_path = "/var/lib/dcos/exhibitor/zk.pid"
 stash_zk_pid_stat_mtime_path = "/var/lib/dcos/bootstrap/exhibitor_pid_stat"
@@ -71,46 +84,115 @@ def try_shortcut():
     return True
 
 
-def wait(master_count_filename):
-    if try_shortcut():
-        log.info("Shortcut succeeeded, assuming local zk is in good config state, not waiting for quorum.")
-        return
-    log.info('Shortcut failed, waiting for exhibitor to bring up zookeeper and stabilize')
+def zk_four_letter_word(command, address=ZK_ADDRESS):
+    """
+    Send the four letter word `command` (e.g. `ruok`, `mntr`) to the ZooKeeper server at `address` and return its
+    answer, or None if the server can't be reached.
+    """
+    try:
+        with socket.create_connection(address, timeout=PROBE_TIMEOUT) as sock:
+            sock.sendall(command.encode('ascii'))
+            chunks = []
+            while True:
+                chunk = sock.recv(4096)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+    except OSError as ex:
+        log.debug('ZooKeeper `%s` failed: %s', command, ex)
+        return None
+    return b''.join(chunks).decode('ascii', 'replace')
 
-    if not os.path.exists(master_count_filename):
-        log.info("master_count file doesn't exist when it should. Hard failing.")
-        sys.exit(1)
 
-    cluster_size = int(utils.read_file_line(master_count_filename))
-    log.info('Expected cluster size: {}'.format(cluster_size))
+def get_zk_state(address=ZK_ADDRESS):
+    """
+    Return the `zk_server_state` of the local ZooKeeper (`leader`, `follower` or `standalone`), or None if it isn't
+    running or isn't serving requests yet, which is the case until it has joined a quorum.
+    """
+    if zk_four_letter_word('ruok', address) != 'imok':
+        log.info('ZooKeeper is not running yet')
+        return None
+
+    stats = {}
+    for line in (zk_four_letter_word('mntr', address) or '').splitlines():
+        key, _, value = line.partition('\t')
+        stats[key] = value
+    if 'zk_server_state' not in stats:
+        log.info('ZooKeeper is running but not serving requests yet')
+        return None
+    return stats['zk_server_state']
+
+
+def get_quorum_status(session):
+    """
+    Return the hostnames of the `(serving, leaders)` ZooKeeper servers according to exhibitor, or None if exhibitor
+    can't be reached.
+    """
+    import requests
 
-    log.info('Waiting for ZooKeeper cluster to stabilize')
     try:
-        response = requests.get(EXHIBITOR_STATUS_URL)
-    except requests.exceptions.ConnectionError as ex:
-        log.error('Could not connect to exhibitor: {}'.format(ex))
-        sys.exit(1)
+        response = session.get(EXHIBITOR_STATUS_URL, timeout=PROBE_TIMEOUT)
+    except requests.exceptions.RequestException as ex:
+        log.info('Could not connect to exhibitor: {}'.format(ex))
+        return None
     if response.status_code != 200:
-        log.error('Could not get exhibitor status: {}, Status code: {}'.format(
+        log.info('Could not get exhibitor status: {}, Status code: {}'.format(
             EXHIBITOR_STATUS_URL, response.status_code))
-        sys.exit(1)
-
-    data = response.json()
+        return None
 
     serving = []
     leaders = []
-    for node in data:
+    for node in response.json():
         if node['isLeader']:
             leaders.append(node['hostname'])
         if node['description'] == 'serving':
             serving.append(node['hostname'])
+    return serving, leaders
 
-    log.info(
-        "Serving hosts: `%s`, leader: `%s`", ','.join(serving), ','.join(leaders))
 
-    if len(serving) != cluster_size or len(leaders) != 1:
-        msg_fmt = 'Expected {} servers and 1 leader, got {} servers and {} leaders'
-        raise Exception(msg_fmt.format(cluster_size, len(serving), len(leaders)))
+def wait(master_count_filename, timeout=WAIT_TIMEOUT):
+    """
+    Wait until the local ZooKeeper is part of a quorum of all masters with exactly one leader, polling the local
+    ZooKeeper and exhibitor with a jittered exponential backoff for up to `timeout` seconds. Exits if that doesn't
+    happen in time, so the caller gets restarted.
+    """
+    start = time.monotonic()
+    if try_shortcut():
+        log.info("Shortcut succeeeded, assuming local zk is in good config state, not waiting for quorum.")
+        return
+    log.info('Shortcut failed, waiting for exhibitor to bring up zookeeper and stabilize')
+
+    if not os.path.exists(master_count_filename):
+        log.info("master_count file doesn't exist when it should. Hard failing.")
+        sys.exit(1)
+
+    cluster_size = int(utils.read_file_line(master_count_filename))
+    log.info('Expected cluster size: {}'.format(cluster_size))
+
+    # Only masters which can't take the shortcut need requests.
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    log.info('Waiting up to {}s for ZooKeeper cluster to stabilize'.format(timeout))
+    deadline = start + timeout
+    delay = WAIT_INITIAL_DELAY
+    attempts = 0
+    with requests.Session() as session:
+        # Reuse one keep-alive connection to exhibitor for all polls.
+        session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=1))
+        while True:
+            attempts += 1
+            if _quorum_ready(session, cluster_size):
+                break
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                log.error('ZooKeeper cluster did not stabilize within {}s ({} attempts)'.format(timeout, attempts))
+                sys.exit(1)
+            time.sleep(min(delay * random.uniform(0.5, 1.5), remaining))
+            delay = min(delay * 2, WAIT_MAX_DELAY)
+
+    log.info('ZooKeeper cluster stabilized after {:.1f}s ({} attempts)'.format(time.monotonic() - start, attempts))
 
     # Local Zookeeper is up. Config should be stable, local zookeeper happy. Stash the PID so if
     # there is a restart we can come up quickly without requiring a new zookeeper quorum.
@@ -118,3 +200,24 @@ def wait(master_count_filename):
     if zk_pid_mtime is not None:
         log.info('Stashing zk.pid mtime %s to %s', zk_pid_mtime, stash_zk_pid_stat_mtime_path)
         write_string(stash_zk_pid_stat_mtime_path, str(zk_pid_mtime))
+
+
+def _quorum_ready(session, cluster_size):
+    # Asking the local ZooKeeper first is much cheaper than an exhibitor status request, which exhibitor answers by
+    # querying every ZooKeeper server of the cluster.
+    zk_state = get_zk_state()
+    if zk_state is None:
+        return False
+
+    status = get_quorum_status(session)
+    if status is None:
+        return False
+    serving, leaders = status
+
+    log.info(
+        "ZooKeeper state: `%s`, serving hosts: `%s`, leader: `%s`", zk_state, ','.join(serving), ','.join(leaders))
+    if len(serving) != cluster_size or len(leaders) != 1:
+        log.info('Expected {} servers and 1 leader, got {} servers and {} leaders'.format(
+            cluster_size, len(serving), len(leaders)))
+        return False
+    return True
@@ -7,8 +7,6 @@ import os
 import subprocess
 import sys
 
-import gen
-
 from pkgpanda.util import is_windows
 
 
@@ -24,6 +22,8 @@ def read_file_line(filename):
 
 
 def detect_ip():
+    import gen.calc
+
     cmd = ['/opt/mesosphere/bin/detect_ip']
     machine_ip = subprocess.check_output(cmd, stderr=subprocess.DEVNULL).decode('ascii').strip()
     gen.calc.validate_ipv4_addresses([machine_ip])
@@ -0,0 +1,86 @@
+import logging
+import os
+import sys
+import threading
+
+import pytest
+
+from dcos_internal_utils import daemon
+
+
+@pytest.fixture
+def socket_path(tmpdir):
+    return str(tmpdir.join('bootstrap.sock'))
+
+
+@pytest.fixture
+def server(socket_path):
+    requests = []
+    release = threading.Event()
+    release.set()
+
+    def bootstrap(message):
+        requests.append(dict(message, environment=dict(os.environ)))
+        release.wait()
+        if 'fail' in message['services']:
+            daemon.log.error('failing on request')
+            sys.exit(3)
+        if 'crash' in message['services']:
+            raise Exception('crash')
+        daemon.log.info('bootstrapped {}'.format(message['services']))
+
+    server = daemon.BootstrapServer(bootstrap, path=socket_path)
+    server.requests = requests
+    server.release = release
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+def test_request_without_daemon(socket_path):
+    assert daemon.request(['dcos-net'], path=socket_path) is None
+
+
+def test_request(server, socket_path, caplog):
+    caplog.set_level(logging.INFO)
+    response = daemon.request(
+        ['dcos-net', 'dcos-signal'], zk='127.0.0.1:2181', path=socket_path, environment={'SERVICE': 'dcos-net'})
+    assert response['returncode'] == 0
+    assert "[INFO] bootstrapped ['dcos-net', 'dcos-signal']" in response['log']
+    assert server.requests == [{
+        'services': ['dcos-net', 'dcos-signal'],
+        'zk': '127.0.0.1:2181',
+        'master_count': None,
+        'exhibitor_timeout': None,
+        'environment': {'SERVICE': 'dcos-net'},
+    }]
+    # The environment of the daemon is restored after the request.
+    assert 'SERVICE' not in os.environ
+
+
+def test_request_failures(server, socket_path):
+    response = daemon.request(['fail'], path=socket_path)
+    assert response['returncode'] == 3
+    assert '[ERROR] failing on request' in response['log']
+
+    assert daemon.request(['crash'], path=socket_path)['returncode'] == 1
+
+    # The daemon keeps serving after failed requests.
+    assert daemon.request(['dcos-net'], path=socket_path)['returncode'] == 0
+
+
+def test_request_timeout(server, socket_path):
+    server.release.clear()
+    try:
+        assert daemon.request(['dcos-net'], path=socket_path, timeout=0.1) is None
+    finally:
+        server.release.set()
+
+
+def test_request_of_other_user(server, socket_path, monkeypatch):
+    monkeypatch.setattr(daemon, '_peer_uid', lambda sock: os.getuid() + 1)
+    assert daemon.request(['dcos-net'], path=socket_path) is None
+    assert server.requests == []
@@ -0,0 +1,87 @@
+import socket
+import threading
+
+import pytest
+
+from dcos_internal_utils import exhibitor
+
+
+@pytest.fixture
+def master_count(tmpdir):
+    path = tmpdir.join('master_count')
+    path.write('3')
+    return str(path)
+
+
+@pytest.fixture
+def waiter(monkeypatch, tmpdir):
+    """
+    Make `exhibitor.wait` poll through the returned object, which answers with one of its `states` and `statuses`
+    per poll and records the time slept in between.
+    """
+    class Waiter:
+        states = []
+        statuses = []
+        sleeps = []
+
+        def get_zk_state(self):
+            return self.states.pop(0)
+
+        def get_quorum_status(self, session):
+            return self.statuses.pop(0)
+
+    w = Waiter()
+    monkeypatch.setattr(exhibitor, 'try_shortcut', lambda: False)
+    monkeypatch.setattr(exhibitor, 'get_zk_pid_mtime', lambda: None)
+    monkeypatch.setattr(exhibitor, 'get_zk_state', w.get_zk_state)
+    monkeypatch.setattr(exhibitor, 'get_quorum_status', w.get_quorum_status)
+    monkeypatch.setattr(exhibitor.time, 'sleep', w.sleeps.append)
+    return w
+
+
+def test_wait_polls_until_quorum(waiter, master_count):
+    waiter.states = [None, 'follower', 'follower', 'follower']
+    waiter.statuses = [None, (['a', 'b'], ['a']), (['a', 'b', 'c'], ['a'])]
+    exhibitor.wait(master_count)
+    assert waiter.states == [] and waiter.statuses == []
+    assert len(waiter.sleeps) == 3
+    # Backoff doubles with a jitter of +-50%.
+    for attempt, sleep in enumerate(waiter.sleeps):
+        delay = exhibitor.WAIT_INITIAL_DELAY * 2 ** attempt
+        assert delay * 0.5 <= sleep <= delay * 1.5
+
+
+def test_wait_deadline(waiter, master_count):
+    waiter.states = [None] * 1000
+    with pytest.raises(SystemExit):
+        exhibitor.wait(master_count, timeout=0)
+    assert waiter.sleeps == []
+
+
+def test_get_zk_state():
+    answers = {
+        b'ruok': b'imok',
+        b'mntr': b'zk_version\t3.4.13\nzk_server_state\tleader\nzk_synced_followers\t2\n',
+    }
+
+    server = socket.socket()
+    server.bind(('127.0.0.1', 0))
+    server.listen(2)
+    address = server.getsockname()
+
+    def serve():
+        for _ in answers:
+            conn, _ = server.accept()
+            with conn:
+                conn.sendall(answers[conn.recv(4)])
+
+    thread = threading.Thread(target=serve)
+    thread.start()
+    try:
+        assert exhibitor.get_zk_state(address) == 'leader'
+    finally:
+        thread.join()
+        server.close()
+
+    # Nothing listens on that port anymore.
+    assert exhibitor.get_zk_state(address) is None
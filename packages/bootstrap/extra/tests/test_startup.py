@@ -0,0 +1,63 @@
+"""
+`bootstrap` runs as ExecStartPre of every DC/OS service and the node-side scripts of dcos-net and mesos run on every
+start of their service or on a timer, so their import time is part of the boot latency of every node. These tests fail
+when the entry points import more than they need up front.
+"""
+import json
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..', '..'))
+
+# Entry points, either a module name or a script path relative to REPO_ROOT, with their import time budget in
+# milliseconds on top of the interpreter startup and the modules which are only needed on some code paths and must be
+# imported where they are used. The budgets are generous enough to pass on a loaded CI machine but far below what
+# importing cryptography, requests, kazoo or gen costs.
+ENTRY_POINTS = {
+    'dcos_internal_utils.cli': (250, ['cryptography', 'gen', 'jwt', 'kazoo.client', 'requests', 'yaml']),
+    'pkgpanda.actions': (200, ['cryptography', 'gen', 'jwt', 'kazoo.client', 'requests', 'yaml']),
+    'packages/dcos-net/extra/gen_resolvconf.py': (150, ['dns.resolver', 'subprocess']),
+    'packages/dcos-net/extra/dcos-net-watchdog.py': (150, ['dns.resolver', 'subprocess']),
+    'packages/mesos/extra/make_disk_resources.py': (100, ['concurrent.futures', 'subprocess']),
+}
+
+# Prints the names of all the modules imported by the code preceding it.
+PRINT_MODULES = 'import json, sys; print(json.dumps(sorted(sys.modules)))'
+
+
+def import_code(entry_point):
+    """Return Python code importing `entry_point` without running its main function."""
+    if not entry_point.endswith('.py'):
+        return 'import {}'.format(entry_point)
+    path = os.path.join(REPO_ROOT, entry_point)
+    # Scripts are run from their directory, which holds the modules they share.
+    return 'import runpy, sys; sys.path.insert(0, {!r}); runpy.run_path({!r})'.format(os.path.dirname(path), path)
+
+
+def run_python(code):
+    """Run `code` in a new interpreter, return its output and how long it took in milliseconds."""
+    start = time.perf_counter()
+    output = subprocess.check_output([sys.executable, '-c', code], universal_newlines=True)
+    return output, (time.perf_counter() - start) * 1000
+
+
+@pytest.mark.parametrize('entry_point', sorted(ENTRY_POINTS))
+def test_deferred_imports(entry_point):
+    output, _ = run_python('{}; {}'.format(import_code(entry_point), PRINT_MODULES))
+    modules = json.loads(output)
+    _, deferred = ENTRY_POINTS[entry_point]
+    assert [m for m in deferred if m in modules] == []
+
+
+@pytest.mark.parametrize('entry_point', sorted(ENTRY_POINTS))
+def test_import_time_budget(entry_point):
+    # The best of a few runs, the first one also pays for a cold page cache. The interpreter startup is measured the
+    # same way and subtracted.
+    baseline = min(run_python('import runpy')[1] for _ in range(5))
+    elapsed = min(run_python(import_code(entry_point))[1] for _ in range(5)) - baseline
+    budget, _ = ENTRY_POINTS[entry_point]
+    assert elapsed <= budget, 'Importing {} took {:.0f}ms, the budget is {}ms'.format(entry_point, elapsed, budget)
@@ -8,6 +8,12 @@ The migration scripts creates an IAM user for each legacy user and deletes
 the legacy user from ZK. After the migration is completed the /dcos/users
 path is deleted completely.
 
+Users are migrated in batches. The IAM users of a batch are created
+concurrently and the migrated legacy users are then deleted from ZK in a
+single transaction. The legacy users left in ZK are the progress of the
+migration: if the script stops it picks up with the remaining users when it
+is restarted, and users whose IAM account was already created are skipped.
+
 Notes:
 This script should be removed from future versions of DC/OS Open.
 When removing this script also remove `python-kazoo` dependency from the
@@ -15,6 +21,7 @@ When removing this script also remove `python-kazoo` dependency from the
 """
 
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from typing import List
 
 
@@ -22,6 +29,8 @@ import kazoo.exceptions
 import requests
 from kazoo.client import KazooClient
 from kazoo.retry import KazooRetry
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.util.retry import Retry
 
 
 log = logging.getLogger(__name__)
@@ -34,6 +43,10 @@ ZK_USERS_PATH = '/dcos/users'
 # To keep this script simple and avoid authentication and authorization this
 # script uses local IAM address instead of going through Admin Router
 IAM_BASE_URL = 'http://127.0.0.1:8101'
+# Number of users created in the IAM at the same time.
+MAX_CONCURRENT_REQUESTS = 16
+# Number of users deleted from ZK in one transaction.
+BATCH_SIZE = 100
 
 
 def create_zk_client(zk_hosts: str) -> KazooClient:
@@ -47,6 +60,21 @@ def create_zk_client(zk_hosts: str) -> KazooClient:
     )
 
 
+def create_iam_session() -> requests.Session:
+    """
+    Return a session keeping a connection to the IAM for each concurrent
+    request, retrying requests which failed to connect.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=1,
+        pool_maxsize=MAX_CONCURRENT_REQUESTS,
+        max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=[502, 503, 504]),
+    )
+    session.mount('http://', adapter)
+    return session
+
+
 def get_legacy_uids_from_zk(zk: KazooClient) -> List:
     """
     Loads users from legacy datastore
@@ -56,7 +84,7 @@ def get_legacy_uids_from_zk(zk: KazooClient) -> List:
     return zk.get_children(ZK_USERS_PATH)
 
 
-def migrate_user(uid: str) -> None:
+def migrate_user(session: requests.Session, uid: str) -> None:
     """
     Create a user in IAM service:
 
@@ -66,7 +94,7 @@ def migrate_user(uid: str) -> None:
         iam=IAM_BASE_URL,
         uid=uid,
     )
-    r = requests.put(url, json={})
+    r = session.put(url, json={})
 
     # The 409 response code means that user already exists in the DC/OS IAM
     # service
@@ -79,6 +107,61 @@ def migrate_user(uid: str) -> None:
     log.info('Created IAM user `%s`', uid)
 
 
+def get_zk_uid_path(uid: str) -> str:
+    return '{base_path}/{uid}'.format(
+        base_path=ZK_USERS_PATH,
+        uid=uid
+    )
+
+
+def delete_legacy_users_from_zk(zk: KazooClient, uids: List) -> None:
+    """
+    Delete the legacy users `uids` from ZK in a single transaction.
+    """
+    if not uids:
+        return
+
+    log.info('Deleting `%d` users from ZK path `%s`', len(uids), ZK_USERS_PATH)
+    transaction = zk.transaction()
+    for uid in uids:
+        transaction.delete(get_zk_uid_path(uid))
+    results = transaction.commit()
+    if not any(isinstance(result, Exception) for result in results):
+        return
+
+    # It is possible that some of the users were removed by another master
+    # running this script, which rolls back the whole transaction. Delete the
+    # remaining users one by one.
+    for uid in uids:
+        zk_uid_path = get_zk_uid_path(uid)
+        try:
+            zk.delete(zk_uid_path)
+        except kazoo.exceptions.NoNodeError:
+            log.warn('ZK node `%s` no longer exists.', zk_uid_path)
+
+
+def migrate_batch(zk: KazooClient, session: requests.Session, executor: ThreadPoolExecutor, uids: List) -> List:
+    """
+    Create IAM users for `uids` concurrently and delete the legacy users
+    which were migrated from ZK. Returns the uids which failed to migrate.
+    """
+    futures = [(uid, executor.submit(migrate_user, session, uid)) for uid in uids]
+
+    migrated = []
+    failed = []
+    for uid, future in futures:
+        try:
+            future.result()
+        except Exception as ex:
+            log.error('Migrating uid `%s` failed: %s', uid, ex)
+            failed.append(uid)
+        else:
+            migrated.append(uid)
+
+    delete_legacy_users_from_zk(zk=zk, uids=migrated)
+    return failed
+
+
 def main() -> None:
     log.info('Initialize ZK client')
     zk = create_zk_client(zk_hosts=ZK_HOSTS)
@@ -91,8 +174,10 @@ def main() -> None:
             'Path `%s` does not exits in ZK. Nothing to migrate.', ZK_USERS_PATH)
         return
 
+    session = create_iam_session()
+
     # Check that the IAM service is up and running with a simple health check
-    r = requests.get('{iam}/acs/api/v1/auth/jwks'.format(
+    r = session.get('{iam}/acs/api/v1/auth/jwks'.format(
         iam=IAM_BASE_URL,
     ))
     assert r.status_code == 200
@@ -100,21 +185,16 @@ def main() -> None:
     uids = get_legacy_uids_from_zk(zk=zk)
     log.info('Found `%d` users for migration.', len(uids))
 
-    for uid in uids:
-        log.info('Migrating uid `%s`', uid)
-        migrate_user(uid=uid)
+    failed = []
+    with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_REQUESTS) as executor:
+        for start in range(0, len(uids), BATCH_SIZE):
+            batch = uids[start:start + BATCH_SIZE]
+            log.info('Migrating users `%d` to `%d` of `%d`', start + 1, start + len(batch), len(uids))
+            failed += migrate_batch(zk=zk, session=session, executor=executor, uids=batch)
 
-        zk_uid_path = '{base_path}/{uid}'.format(
-            base_path=ZK_USERS_PATH,
-            uid=uid
-        )
-        try:
-            log.info('Deleting ZK path `%s`', zk_uid_path)
-            zk.delete(zk_uid_path)
-        except kazoo.exceptions.NoNodeError:
-            # It is possible that the user was removed by another master running
-            # this script.
-            log.warn('ZK node `%s` no longer exists.', zk_uid_path)
+    # Fail so that systemd restarts the migration for the remaining users.
+    if failed:
+        raise Exception('Failed to migrate `{}` users: {}'.format(len(failed), ', '.join(failed)))
 
     # Finally we can remove /dcos/users which should be empty at this point
     try:
@@ -0,0 +1,145 @@
+"""Shared access to the CockroachDB cluster membership stored in ZooKeeper.
+
+The ZNode at `ZK_NODES_PATH` holds the JSON encoded list of the internal IPs
+of all masters which ever joined the CockroachDB cluster. Nodes are only ever
+added to that list, never removed.
+
+`load_nodes()` reads that list and writes it to `NODES_FILE_PATH` (which
+cockroach.sh passes as --join parameter). This module is used by register.py
+and cockroachdb-change-config.py.
+
+Both of them run to completion on every start of dcos-cockroach or tick of
+the config change timer and exit right after reading the list, so they read
+it once rather than keeping a watch-driven view of it: a ZooKeeper watch would
+never fire before their session is closed and only add a round trip and
+kazoo's event thread. Following membership changes with a watch needs a
+long-running process, which neither of them is.
+"""
+
+import json
+import logging
+import os
+import tempfile
+from typing import List, Optional
+
+from kazoo.client import KazooClient
+from kazoo.retry import KazooRetry
+from kazoo.security import make_digest_acl
+
+
+log = logging.getLogger(__name__)
+
+
+# The prefix used for cockroachdb in ZK.
+ZK_PATH = "/cockroach"
+# The path of the ZNode containing the list of cluster members.
+ZK_NODES_PATH = ZK_PATH + "/nodes"
+# The path to the file containing the list of nodes in the cluster as a
+# comma-separated list of IPs.
+NODES_FILE_PATH = '/run/dcos/cockroach/nodes'
+
+
+def zk_connect(zk_user: Optional[str] = None, zk_secret: Optional[str] = None) -> KazooClient:
+    """Connect to ZooKeeper.
+
+    On connection failure, the function attempts to reconnect indefinitely with exponential backoff
+    up to 3 seconds. If a command fails, that command is retried every 300ms for 3 attempts before failing.
+
+    These values are chosen to suit a human-interactive time.
+
+    Args:
+        zk_user:
+            The username to use when connecting to ZooKeeper or `None` if no authentication is necessary.
+        zk_secret:
+            The secret to use when connecting to ZooKeeper or `None` if no authentication is necessary.
+
+    Returns:
+        A ZooKeeper client connection in the form of a `kazoo.client.KazooClient`.
+    """
+    # Try to reconnect indefinitely, with time between updates going
+    # exponentially to ~3s. Then every retry occurs every ~3 seconds.
+    conn_retry_policy = KazooRetry(
+        max_tries=-1,
+        delay=0.3,
+        backoff=1.3,
+        max_jitter=1,
+        max_delay=3,
+        ignore_expire=True,
+        )
+    # Retry commands every 0.3 seconds, for a total of <1s (usually 0.9)
+    cmd_retry_policy = KazooRetry(
+        max_tries=3,
+        delay=0.3,
+        backoff=1,
+        max_jitter=0.1,
+        max_delay=1,
+        ignore_expire=False,
+        )
+    default_acl = None
+    auth_data = None
+    if zk_user and zk_secret:
+        default_acl = [make_digest_acl(zk_user, zk_secret, all=True)]
+        scheme = 'digest'
+        credential = "{}:{}".format(zk_user, zk_secret)
+        auth_data = [(scheme, credential)]
+    zk = KazooClient(
+        hosts="127.0.0.1:2181",
+        timeout=30,
+        connection_retry=conn_retry_policy,
+        command_retry=cmd_retry_policy,
+        default_acl=default_acl,
+        auth_data=auth_data,
+        )
+    zk.start()
+    return zk
+
+
+def parse_nodes(data: Optional[bytes]) -> List[str]:
+    """
+    Return the list of node IPs stored in the `ZK_NODES_PATH` ZNode `data`.
+    The ZNode is empty until the cluster has been bootstrapped.
+    """
+    if not data:
+        return []
+    return json.loads(data.decode('ascii'))['nodes']
+
+
+def write_nodes_file(nodes: List[str], file_path: str = NODES_FILE_PATH) -> None:
+    """
+    Atomically write `nodes` to `file_path` as a comma-separated list,
+    leaving the file alone if it already has that content.
+    """
+    contents = ','.join(nodes)
+    try:
+        with open(file_path) as f:
+            if f.read() == contents:
+                return
+    except FileNotFoundError:
+        pass
+
+    log.info("Writing nodes {} to file {}".format(contents, file_path))
+    fd, tmp_path = tempfile.mkstemp(prefix='.nodes.', dir=os.path.dirname(file_path))
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(contents)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, file_path)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+
+
+def load_nodes(zk: KazooClient, zk_path: str = ZK_NODES_PATH, nodes_file: str = NODES_FILE_PATH) -> List[str]:
+    """
+    Return the cluster members registered at `zk_path` and write them to
+    `nodes_file` unless none are registered yet.
+
+    The ZNode is read without `sync()`, so the result may lag behind the
+    ZooKeeper leader. Since nodes are never removed, every node it lists is
+    registered.
+    """
+    data, _ = zk.get(zk_path)
+    nodes = parse_nodes(data)
+    if nodes:
+        write_nodes_file(nodes, nodes_file)
+    return nodes
@@ -1,8 +1,10 @@
 #!/usr/bin/env python
 import json
 import logging
+import os
 import subprocess
 
+import cockroach_membership
 from dcos_internal_utils import utils
 
 
@@ -97,6 +99,24 @@ def get_expected_master_node_count() -> int:
     return int(dcos_config['num_masters'])
 
 
+def update_nodes_file() -> None:
+    """
+    Write the cluster members registered in ZooKeeper to the nodes file so
+    that the next start of CockroachDB joins the current membership rather
+    than the one seen by register.py when this node last started.
+    """
+    zk = cockroach_membership.zk_connect(
+        zk_user=os.environ.get('DATASTORE_ZK_USER'),
+        zk_secret=os.environ.get('DATASTORE_ZK_SECRET'),
+        )
+    try:
+        nodes = cockroach_membership.load_nodes(zk=zk)
+        log.info('Registered cluster members: %s', nodes)
+    finally:
+        zk.stop()
+        zk.close()
+
+
 def main() -> None:
     # Determine the internal IP address of this node.
     my_internal_ip = utils.detect_ip()
@@ -110,6 +130,8 @@ def main() -> None:
     # We are running CockroachDB v2.0.x so pass '2.0'.
     set_cluster_version(my_internal_ip, '2.0')
 
+    update_nodes_file()
+
 
 if __name__ == '__main__':
     main()
@@ -46,7 +46,12 @@ The bootstrap and discovery strategy we designed is as follows:
 
 1. Connect to ZooKeeper.
 
-2. Determine whether the cluster has already been initialized by
+2. Load the list of IPs at `ZK_NODES_PATH` and write it to
+  `NODES_FILE_PATH` (see cockroach_membership.py). If our IP is in that list we are registered already and exit 0. This
+  needs neither the lock nor a `sync()` as nodes can only ever be added,
+  never removed.
+
+2.1 Otherwise determine whether the cluster has already been initialized by
   checking whether the list of IPs at `ZK_NODES_PATH` exists. This
   does not require the lock to be held as nodes can only ever be
   added, never removed: if the list of IPs at `ZK_NODES_PATH` is
@@ -102,7 +107,7 @@ import pwd
 import socket
 import subprocess
 from contextlib import contextmanager
-from typing import Any, Generator, List, Optional
+from typing import Any, Generator, List
 
 import retrying
 
@@ -112,76 +117,24 @@ from kazoo.exceptions import (
     LockTimeout,
     SessionExpiredError,
 )
-from kazoo.retry import KazooRetry
-from kazoo.security import make_digest_acl
 
+from cockroach_membership import (
+    load_nodes,
+    NODES_FILE_PATH,
+    parse_nodes,
+    write_nodes_file,
+    ZK_NODES_PATH,
+    ZK_PATH,
+    zk_connect,
+)
 from dcos_internal_utils import utils
 
 
 log = logging.getLogger(__name__)
 
 
-def zk_connect(zk_user: Optional[str] = None, zk_secret: Optional[str] = None) -> KazooClient:
-    """Connect to ZooKeeper.
-
-    On connection failure, the function attempts to reconnect indefinitely with exponential backoff
-    up to 3 seconds. If a command fails, that command is retried every 300ms for 3 attempts before failing.
-
-    These values are chosen to suit a human-interactive time.
-
-    Args:
-        zk_user:
-            The username to use when connecting to ZooKeeper or `None` if no authentication is necessary.
-        zk_secret:
-            The secret to use when connecting to ZooKeeper or `None` if no authentication is necessary.
-
-    Returns:
-        A ZooKeeper client connection in the form of a `kazoo.client.KazooClient`.
-    """
-    # Try to reconnect indefinitely, with time between updates going
-    # exponentially to ~3s. Then every retry occurs every ~3 seconds.
-    conn_retry_policy = KazooRetry(
-        max_tries=-1,
-        delay=0.3,
-        backoff=1.3,
-        max_jitter=1,
-        max_delay=3,
-        ignore_expire=True,
-        )
-    # Retry commands every 0.3 seconds, for a total of <1s (usually 0.9)
-    cmd_retry_policy = KazooRetry(
-        max_tries=3,
-        delay=0.3,
-        backoff=1,
-        max_jitter=0.1,
-        max_delay=1,
-        ignore_expire=False,
-        )
-    default_acl = None
-    auth_data = None
-    if zk_user and zk_secret:
-        default_acl = [make_digest_acl(zk_user, zk_secret, all=True)]
-        scheme = 'digest'
-        credential = "{}:{}".format(zk_user, zk_secret)
-        auth_data = [(scheme, credential)]
-    zk = KazooClient(
-        hosts="127.0.0.1:2181",
-        timeout=30,
-        connection_retry=conn_retry_policy,
-        command_retry=cmd_retry_policy,
-        default_acl=default_acl,
-        auth_data=auth_data,
-        )
-    zk.start()
-    return zk
-
-
-# The prefix used for cockroachdb in ZK.
-ZK_PATH = "/cockroach"
 # The path of the ZNode used for locking.
 ZK_LOCK_PATH = ZK_PATH + "/lock"
-# The path of the ZNode containing the list of cluster members.
-ZK_NODES_PATH = ZK_PATH + "/nodes"
 # The id to use when contending for the ZK lock.
 LOCK_CONTENDER_ID = "{hostname}:{pid}".format(
     hostname=socket.gethostname(),
@@ -189,9 +142,6 @@ LOCK_CONTENDER_ID = "{hostname}:{pid}".format(
     )
 # The path to the CockroachDB PID file.
 PID_FILE_PATH = '/run/dcos/cockroach/cockroach.pid'
-# The path to the file containing the list of nodes in the cluster as a
-# comma-separated list of IPs.
-NODES_FILE_PATH = '/run/dcos/cockroach/nodes'
 # The time in seconds to wait when attempting to acquire a lock.  Lock
 # acquisition between 5 ZooKeeper nodes is an operation on the order
 # of milliseconds.
@@ -376,7 +326,7 @@ def _get_registered_nodes(zk: KazooClient, zk_path: str) -> List[str]:
     data, _ = zk.get(zk_path)
     if data:
         log.info("Cluster was previously initialized.")
-        nodes = json.loads(data.decode('ascii'))['nodes']  # type: List[str]
+        nodes = parse_nodes(data)
         log.info("Found registered nodes: {}".format(nodes))
         return nodes
     log.info("Found no registered nodes.")
@@ -412,12 +362,6 @@ def _register_cluster_membership(zk: KazooClient, zk_path: str, ip: str) -> List
     return nodes
 
 
-def _dump_nodes_to_file(nodes: List[str], file_path: str) -> None:
-    with open(file_path, 'w') as f:
-        log.info("Writing nodes {} to file {}".format(','.join(nodes), file_path))
-        f.write(','.join(nodes))
-
-
 def main() -> None:
     logging.basicConfig(format='[%(levelname)s] %(message)s', level='INFO')
 
@@ -437,6 +381,14 @@ def main() -> None:
     zk.ensure_path("/cockroach/nodes")
     zk.ensure_path("/cockroach/locking")
 
+    # Write the registered nodes to `NODES_FILE_PATH`. If our IP is among
+    # them we are done, no matter how stale the read is.
+    nodes = load_nodes(zk=zk, zk_path=ZK_NODES_PATH, nodes_file=NODES_FILE_PATH)
+    if my_ip in nodes:
+        log.info("Cluster member `{}` already registered in ZooKeeper: {}".format(my_ip, nodes))
+        log.info("Registration complete. ")
+        return
+
     # Determine whether the cluster has been bootstrapped already by
     # checking whether the `ZK_NODES_PATH` ZNode has children. This is
     # best-effort as we aren't holding the lock, but we do call
@@ -451,7 +403,7 @@ def main() -> None:
             log.info("IP not found in list of nodes. Registering cluster membership.")
             with _zk_lock(zk=zk, lock_path=ZK_LOCK_PATH, contender_id=LOCK_CONTENDER_ID, timeout=ZK_LOCK_TIMEOUT):
                 nodes = _register_cluster_membership(zk=zk, zk_path=ZK_NODES_PATH, ip=my_ip)
-        _dump_nodes_to_file(nodes, NODES_FILE_PATH)
+        write_nodes_file(nodes, NODES_FILE_PATH)
         log.info("Registration complete. ")
         return
 
@@ -481,7 +433,7 @@ def main() -> None:
             # existing cluster and dump the node IPs.
             log.info("Cluster has already been initialized: {}".format(nodes))
             nodes = _register_cluster_membership(zk=zk, zk_path=ZK_NODES_PATH, ip=my_ip)
-            _dump_nodes_to_file(nodes, NODES_FILE_PATH)
+            write_nodes_file(nodes, NODES_FILE_PATH)
             return
         else:
             log.info("Cluster has not been initialized yet.")
@@ -496,7 +448,7 @@ def main() -> None:
             # If this fails the fact that a cluster was initialized will be
             # ignored by subsequent runs as our IP won't be present in ZK.
             nodes = _register_cluster_membership(zk=zk, zk_path=ZK_NODES_PATH, ip=my_ip)
-            _dump_nodes_to_file(nodes, NODES_FILE_PATH)
+            write_nodes_file(nodes, NODES_FILE_PATH)
             log.info("Successfully initialized cluster.")
             return
 
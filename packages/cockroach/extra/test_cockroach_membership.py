@@ -0,0 +1,53 @@
+import json
+import os
+
+import cockroach_membership
+
+
+class FakeZooKeeper:
+    """Serves `data` for every ZNode and fails on everything else."""
+
+    def __init__(self, data=b''):
+        self.data = data
+
+    def get(self, path):
+        return self.data, None
+
+
+def _nodes_data(nodes):
+    return json.dumps({'nodes': nodes}).encode('ascii')
+
+
+def test_parse_nodes():
+    assert cockroach_membership.parse_nodes(None) == []
+    assert cockroach_membership.parse_nodes(b'') == []
+    assert cockroach_membership.parse_nodes(_nodes_data(['10.0.0.1', '10.0.0.2'])) == ['10.0.0.1', '10.0.0.2']
+
+
+def test_write_nodes_file(tmpdir):
+    nodes_file = tmpdir.join('nodes')
+    cockroach_membership.write_nodes_file(['10.0.0.1', '10.0.0.2'], str(nodes_file))
+    assert nodes_file.read() == '10.0.0.1,10.0.0.2'
+    assert oct(nodes_file.stat().mode & 0o777) == oct(0o644)
+    inode = nodes_file.stat().ino
+
+    # An unchanged list leaves the file alone.
+    cockroach_membership.write_nodes_file(['10.0.0.1', '10.0.0.2'], str(nodes_file))
+    assert nodes_file.stat().ino == inode
+
+    # A changed list replaces the file, without leaving temporary files behind.
+    cockroach_membership.write_nodes_file(['10.0.0.1', '10.0.0.2', '10.0.0.3'], str(nodes_file))
+    assert nodes_file.read() == '10.0.0.1,10.0.0.2,10.0.0.3'
+    assert os.listdir(str(tmpdir)) == ['nodes']
+
+
+def test_load_nodes(tmpdir):
+    nodes_file = tmpdir.join('nodes')
+
+    # Nothing is written before the cluster has been bootstrapped.
+    assert cockroach_membership.load_nodes(FakeZooKeeper(), nodes_file=str(nodes_file)) == []
+    assert not nodes_file.check()
+
+    zk = FakeZooKeeper(_nodes_data(['10.0.0.1']))
+    assert cockroach_membership.load_nodes(zk, nodes_file=str(nodes_file)) == ['10.0.0.1']
+    assert nodes_file.read() == '10.0.0.1'
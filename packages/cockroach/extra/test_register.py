@@ -0,0 +1,35 @@
+import json
+
+import register
+
+
+class FakeZooKeeper:
+    """Knows the registered `nodes` and fails on anything but reading them without `sync()`."""
+
+    def __init__(self, nodes):
+        self.nodes = nodes
+
+    def ensure_path(self, path):
+        pass
+
+    def get(self, path):
+        assert path == register.ZK_NODES_PATH
+        return json.dumps({'nodes': self.nodes}).encode('ascii'), None
+
+    def sync(self, path):
+        raise AssertionError('sync() of {} not expected'.format(path))
+
+    def Lock(self, path, identifier):
+        raise AssertionError('Lock() of {} not expected'.format(path))
+
+
+def test_registered_node_returns_early(monkeypatch, tmpdir):
+    nodes_file = tmpdir.join('nodes')
+    zk = FakeZooKeeper(['10.0.0.1', '10.0.0.2'])
+    monkeypatch.setattr(register.utils, 'detect_ip', lambda: '10.0.0.2')
+    monkeypatch.setattr(register, 'zk_connect', lambda zk_user, zk_secret: zk)
+    monkeypatch.setattr(register, 'NODES_FILE_PATH', str(nodes_file))
+
+    register.main()
+
+    assert nodes_file.read() == '10.0.0.1,10.0.0.2'
@@ -2,37 +2,29 @@
 
 import logging
 import os
-import subprocess
 import sys
 import time
 
-import dns.query
+# Installed next to this script, see the dcos-net build script.
+from gen_resolvconf import check_servers
 
 
 WATCHDOG_TIMEOUT = 60
 NAME_SERVERS = ['198.51.100.1', '198.51.100.2', '198.51.100.3']
-DNS_QUERY = 'ready.spartan'
-DNS_TIMEOUT = 5
 SERVICE = 'dcos-net.service'
 
 
-def watchdog(ns):
-    try:
-        logging.info('Sending DNS query: %s', ns)
-        query = dns.message.make_query(DNS_QUERY, dns.rdatatype.ANY)
-        result = dns.query.udp(query, ns, DNS_TIMEOUT)
-        for rr in result.answer:
-            logging.info('%s', rr)
-        if not result.answer:
-            logging.error('Host not found')
-        else:
-            logging.info('%s is healthy', SERVICE)
-        return result.answer != []
-    except dns.exception.Timeout:
-        logging.error('DNS Server Timeout')
-    except:
-        logging.erorr('Exception: {}'.sys.exc_info()[1])
-    return False
+def watchdog(name_servers):
+    """
+    Probe all `name_servers` at once and return whether any of them answered
+    the DNS query.
+    """
+    healthy = check_servers(name_servers)
+    if not healthy:
+        logging.error('None of %s answered the DNS query', ', '.join(name_servers))
+        return False
+    logging.info('%s is healthy, %s answered', SERVICE, ', '.join(healthy))
+    return True
 
 
 def kill(name):
@@ -40,6 +32,8 @@ def kill(name):
         logging.info('Killing is disabled')
         return 0
     logging.info('Killing %s', name)
+    # Only needed once dcos-net became unhealthy.
+    import subprocess
     r = subprocess.run(['/usr/bin/env',
                         'systemctl', 'kill',
                         '--signal', 'SIGKILL',
@@ -56,13 +50,11 @@ def sleep(secs):
 
 
 def loop():
-    for ns in NAME_SERVERS:
-        if watchdog(ns):
-            return 0
+    if watchdog(NAME_SERVERS):
+        return 0
     sleep(WATCHDOG_TIMEOUT)
-    for ns in NAME_SERVERS:
-        if watchdog(ns):
-            return 0
+    if watchdog(NAME_SERVERS):
+        return 0
     return kill(SERVICE)
 
 
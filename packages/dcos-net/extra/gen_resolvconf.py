@@ -1,74 +1,99 @@
 #!/opt/mesosphere/bin/python
 
+import argparse
 import errno
 import os
 import random
+import select
 import socket
 import sys
+import time
 
-import dns.query
+import dns.exception
+import dns.message
+import dns.rdatatype
 
 
 # Constants
 MAX_SERVER_COUNT = 3
 NAME_SERVERS = ['198.51.100.1', '198.51.100.2', '198.51.100.3']
 
+# Bounds of the interval between two checks in --daemon mode. The interval
+# doubles while dcos-net is healthy and resolv.conf stays the same, and drops
+# back to the minimum as soon as either changes.
+MIN_CHECK_INTERVAL = 5
+MAX_CHECK_INTERVAL = 60
 
-if len(sys.argv) != 2:
-    print('Usage: gen_resolvconf.py RESOLV_CONF_PATH', file=sys.stderr)
-    print('Received: {}'.format(sys.argv), file=sys.stderr)
-    sys.exit(-1)
-resolvconf_path = sys.argv[1]
 dns_test_query = 'ready.spartan'
 dns_timeout = 5
 
-
-def check_server(addr):
-    try:
-        query = dns.message.make_query(dns_test_query, dns.rdatatype.ANY)
-        result = dns.query.udp(query, addr, dns_timeout)
-        if len(result.answer) == 0:
-            print('Skipping DNS server {}: no records for {}'.format(
-                addr, dns_test_query), file=sys.stderr)
-        else:
-            return True
-    except socket.gaierror as ex:
-        print(ex, file=sys.stderr)
-    except dns.exception.Timeout:
-        print('Skipping DNS server {}: no response'.format(
-            addr), file=sys.stderr)
-    except:
-        print("Unexpected error querying DNS for server \"{}\" exception: {}".format(
-            addr, sys.exc_info()[1]))
-
-    return False
-
-
-contents = """# Generated by gen_resolvconf.py. Do not edit.
+RESOLVCONF_HEADER = """# Generated by gen_resolvconf.py. Do not edit.
 # Change configuration options by changing DC/OS cluster configuration.
-# This file must be overwritten regularly for proper cluster operation around
-# master failure.
+# gen_resolvconf.py keeps checking the name servers and rewrites this file
+# whenever they change, for proper cluster operation around master failure.
 
 options timeout:1
 options attempts:3
 
 """
 
-if 'SEARCH' in os.environ:
-    contents += "search {}\n".format(os.environ['SEARCH'])
-
-# Check if dcos-net is up
-dcos_nets_up = []
-for ns in NAME_SERVERS:
-    if check_server(ns):
-        dcos_nets_up.append(ns)
-
-if len(dcos_nets_up) > 0:
-    for ns in dcos_nets_up:
-        contents += "nameserver {}\n".format(ns)
 
-# If dcos-net is not up, fall back, and insert the upstreams
-else:
+def check_servers(addrs, port=53):
+    """
+    Send the test query to all `addrs` at once from a single socket and return
+    the ones which answered it within `dns_timeout`, in the order of `addrs`.
+    """
+    query = dns.message.make_query(dns_test_query, dns.rdatatype.ANY)
+    wire = query.to_wire()
+    start = time.monotonic()
+    deadline = start + dns_timeout
+    pending = set()
+    healthy = set()
+
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.setblocking(False)
+        for addr in addrs:
+            try:
+                sock.sendto(wire, (addr, port))
+                pending.add(addr)
+            except OSError as ex:
+                print('Skipping DNS server {}: {}'.format(addr, ex), file=sys.stderr)
+
+        while pending:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0 or not select.select([sock], [], [], timeout)[0]:
+                break
+            try:
+                data, (addr, _) = sock.recvfrom(65535)
+                response = dns.message.from_wire(data)
+            except (OSError, dns.exception.DNSException) as ex:
+                print('Ignoring invalid DNS response: {}'.format(ex), file=sys.stderr)
+                continue
+            if addr not in pending or not query.is_response(response):
+                continue
+
+            pending.remove(addr)
+            latency = time.monotonic() - start
+            if len(response.answer) == 0:
+                print('Skipping DNS server {}: no records for {} ({:.3f}s)'.format(
+                    addr, dns_test_query, latency), file=sys.stderr)
+            else:
+                print('DNS server {} answered in {:.3f}s'.format(addr, latency), file=sys.stderr)
+                healthy.add(addr)
+
+    for addr in sorted(pending):
+        print('Skipping DNS server {}: no response within {}s'.format(
+            addr, dns_timeout), file=sys.stderr)
+
+    return [addr for addr in addrs if addr in healthy]
+
+
+def get_fallback_servers(current):
+    """
+    Return up to MAX_SERVER_COUNT of the upstream RESOLVERS. The upstreams
+    already listed in `current` are kept if they still make a valid choice, so
+    that resolv.conf doesn't change on every run while dcos-net is down.
+    """
     fallback_servers = []
 
     # Resolvconf does not support custom ports, skip if not default
@@ -83,34 +108,119 @@ else:
         print('Skipping DNS server {}: non-default ports are not supported in /etc/resolv.conf'.format(
             ns), file=sys.stderr)
 
+    count = min(len(fallback_servers), MAX_SERVER_COUNT)
+    if len(current) == count and set(current) <= set(fallback_servers):
+        return current
+
     random.shuffle(fallback_servers)
-    for ns in fallback_servers[:MAX_SERVER_COUNT]:
-        contents += "nameserver {}\n".format(ns)
+    return fallback_servers[:count]
+
+
+def read_resolvconf(resolvconf_path):
+    try:
+        with open(resolvconf_path) as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def get_nameservers(contents):
+    nameservers = []
+    for line in (contents or '').splitlines():
+        fields = line.split()
+        if len(fields) == 2 and fields[0] == 'nameserver':
+            nameservers.append(fields[1])
+    return nameservers
+
+
+def write_resolvconf(resolvconf_path, contents):
+    print('Updating {}'.format(resolvconf_path))
+    with open(resolvconf_path + ".tmp", 'w') as f:
+        print(contents, file=sys.stderr)
+        f.write(contents)
+
+    # Move the temp file into place. This also takes care of
+    # making the file at resolvconf_path not a symlink if it
+    # was one (writing directly we would just update the
+    # target of the symlink). systemd-resolved updates the
+    # target of the symlink itself though, which results in fun
+    # conflicting things like https://dcosjira.atlassian.net/browse/DCOS-305
+
+    try:
+        os.rename(resolvconf_path + ".tmp", resolvconf_path)
+    except OSError as e:
+        # fall back to old behavior because resolv.conf in dcos-docker
+        # is a mount point that doesn't like getting renamed
+        if e.errno == errno.EBUSY:
+            print('Falling back to writing directly due to EBUSY on rename')
+            with open(resolvconf_path, 'w') as f:
+                f.write(contents)
+        else:
+            raise
+
+
+def update(resolvconf_path):
+    """
+    Generate the resolv.conf config and write it to `resolvconf_path` unless
+    the file already has exactly that content.
+
+    Returns a tuple of whether the file was written and whether all dcos-net
+    name servers are healthy.
+    """
+    contents = RESOLVCONF_HEADER
 
+    if 'SEARCH' in os.environ:
+        contents += "search {}\n".format(os.environ['SEARCH'])
 
-# Generate the resolv.conf config
-print('Updating {}'.format(resolvconf_path))
-with open(resolvconf_path + ".tmp", 'w') as f:
-    print(contents, file=sys.stderr)
-    f.write(contents)
-
-# Move the temp file into place. This also takes care of
-# making the file at resolvconf_path not a symlink if it
-# was one (writing directly we would just update the
-# target of the symlink). systemd-resolved updates the
-# target of the symlink itself though, which results in fun
-# conflicting things like https://dcosjira.atlassian.net/browse/DCOS-305
-
-try:
-    os.rename(resolvconf_path + ".tmp", resolvconf_path)
-except OSError as e:
-    # fall back to old behavior because resolv.conf in dcos-docker
-    # is a mount point that doesn't like getting renamed
-    if e.errno == errno.EBUSY:
-        print('Falling back to writing directly due to EBUSY on rename')
-        with open(resolvconf_path, 'w') as f:
-            f.write(contents)
+    # Check if dcos-net is up, all servers are probed concurrently
+    dcos_nets_up = check_servers(NAME_SERVERS)
+
+    current = read_resolvconf(resolvconf_path)
+    if len(dcos_nets_up) > 0:
+        nameservers = dcos_nets_up
+    # If dcos-net is not up, fall back, and insert the upstreams
     else:
-        raise
+        nameservers = get_fallback_servers(get_nameservers(current))
+
+    for ns in nameservers:
+        contents += "nameserver {}\n".format(ns)
+
+    healthy = len(dcos_nets_up) == len(NAME_SERVERS)
+    # Rewriting an unchanged file would only churn the inode and invalidate
+    # the caches of everything watching it.
+    if contents == current and not os.path.islink(resolvconf_path):
+        print('{} is up to date'.format(resolvconf_path))
+        return False, healthy
+
+    write_resolvconf(resolvconf_path, contents)
+    return True, healthy
+
+
+def run(resolvconf_path):
+    interval = MIN_CHECK_INTERVAL
+    while True:
+        changed, healthy = update(resolvconf_path)
+        if changed or not healthy:
+            interval = MIN_CHECK_INTERVAL
+        else:
+            interval = min(interval * 2, MAX_CHECK_INTERVAL)
+        print('Checking again in {} seconds'.format(interval))
+        time.sleep(interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate resolv.conf pointing at dcos-net or the upstream resolvers')
+    parser.add_argument('resolvconf_path', metavar='RESOLV_CONF_PATH')
+    parser.add_argument(
+        '--daemon',
+        action='store_true',
+        help='Keep running and update RESOLV_CONF_PATH whenever the set of name servers changes')
+    args = parser.parse_args()
+
+    if args.daemon:
+        run(args.resolvconf_path)
+    update(args.resolvconf_path)
+
 
-sys.exit(0)
+if __name__ == '__main__':
+    main()
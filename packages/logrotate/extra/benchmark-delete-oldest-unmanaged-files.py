@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Benchmark delete-oldest-unmanaged-files.py on a synthetic log directory.
+
+Creates FILES empty files with random modification times in directories of
+--files-per-dir files each (like the sandboxes of many small containers),
+then times how long it takes to find the files to delete with the previous
+implementation (os.walk, sorting by os.stat()) and with scan_files() and a
+heap, and finally how long the actual cleanup down to --keep files takes.
+
+    ./benchmark-delete-oldest-unmanaged-files.py 500000
+"""
+import argparse
+import heapq
+import importlib.util
+import logging
+import os
+import random
+import shutil
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def load_script():
+    spec = importlib.util.spec_from_file_location(
+        'delete_oldest_unmanaged_files', os.path.join(HERE, 'delete-oldest-unmanaged-files.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def make_tree(directory, files, files_per_dir):
+    now = time.time()
+    for i in range(files):
+        subdirectory = os.path.join(directory, 'container-{}'.format(i // files_per_dir))
+        if i % files_per_dir == 0:
+            os.makedirs(subdirectory)
+        path = os.path.join(subdirectory, 'stdout.{}'.format(i % files_per_dir))
+        with open(path, 'w'):
+            pass
+        mtime = now - random.uniform(0, 30 * 24 * 3600)
+        os.utime(path, (mtime, mtime))
+    managed_file = os.path.join(directory, 'mesos-agent.log')
+    with open(managed_file, 'w'):
+        pass
+    return managed_file
+
+
+def select_sorted(directory, managed_file, max_files):
+    all_files = []
+    for root, subdirectories, files in os.walk(directory):
+        all_files += [os.path.join(root, name) for name in files]
+    all_files.remove(managed_file)
+    oldest_first = sorted(all_files, key=lambda x: os.stat(x).st_mtime_ns)
+    return oldest_first[0:len(all_files) - max_files]
+
+
+def select_heap(script, directory, managed_file, max_files):
+    all_files = [f for f in script.scan_files(directory) if f[1] != managed_file]
+    heapq.heapify(all_files)
+    return [heapq.heappop(all_files)[1] for _ in range(len(all_files) - max_files)]
+
+
+def timed(name, fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    print('{:<28} {:8.2f}s'.format(name, time.perf_counter() - start))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('files', type=int, nargs='?', default=500000)
+    parser.add_argument('--files-per-dir', type=int, default=50)
+    parser.add_argument('--keep', type=int, default=None, help='Files to keep, defaults to 90%% of FILES')
+    parser.add_argument('--dir', default=None, help='Where to create the tree, defaults to a temporary directory')
+    args = parser.parse_args()
+    keep = int(args.files * 0.9) if args.keep is None else args.keep
+
+    script = load_script()
+    directory = tempfile.mkdtemp(prefix='log-pruning-', dir=args.dir)
+    try:
+        managed_file = timed('create {} files'.format(args.files), make_tree, directory, args.files, args.files_per_dir)
+
+        expected = timed('select with os.walk + sort', select_sorted, directory, managed_file, keep)
+        selected = timed('select with scandir + heap', select_heap, script, directory, managed_file, keep)
+        assert len(selected) == len(expected)
+
+        logging.disable(logging.INFO)
+        timed('delete {} files'.format(args.files - keep), script.main, directory, keep, managed_file)
+        remaining = sum(1 for _ in script.scan_files(directory))
+        assert remaining == keep + 1, remaining
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
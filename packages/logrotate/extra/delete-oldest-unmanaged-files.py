@@ -1,21 +1,54 @@
 #!/opt/mesosphere/bin/python3
 
+import argparse
+import heapq
 import logging
 import os
-import sys
 import time
 
 
-def main(directory, max_files, managed_file):
+def scan_files(directory):
     '''
-    Finds all files under the given `directory` and checks if the number
-    of files exceeds the `max_files`.  If so, deletes files starting from
-    the oldest (except for the `managed_file`) until the `max_files` is
-    no longer exceeded.
+    Yields a `(st_mtime_ns, path, st_size)` tuple for every file under the
+    given `directory`, using the stat result of the directory scan instead of
+    stating every path separately. Symlinks are not followed into directories,
+    just like `os.walk`.
+
+    @type directory: str, absolute path of the directory to scan
+    '''
+    pending = [directory]
+    while pending:
+        try:
+            entries = os.scandir(pending.pop())
+        except FileNotFoundError:
+            continue
+        with entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir():
+                        if not entry.is_symlink():
+                            pending.append(entry.path)
+                        continue
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    # Removed (or rotated) while scanning, or a dangling symlink.
+                    continue
+                yield stat.st_mtime_ns, entry.path, stat.st_size
+
+
+def main(directory, max_files, managed_file, max_age=None, max_size=None):
+    '''
+    Finds all files under the given `directory` and deletes files starting
+    from the oldest (except for the `managed_file`) until the `max_files` is
+    no longer exceeded. When given, files older than `max_age` seconds are
+    deleted as well, and old files are deleted until the remaining files take
+    up at most `max_size` bytes.
 
     @type directory: str, absolute path of the directory to clean up
     @type max_files: int, maximum number of files to keep
     @type managed_file: str, one file (i.e. leading log) to excempt from cleanup
+    @type max_age: int, maximum age of the files to keep in seconds
+    @type max_size: int, maximum total size of the files to keep in bytes
     '''
     logging.basicConfig(format='[%(levelname)s] %(message)s',
                         level=logging.INFO)
@@ -24,35 +57,57 @@ def main(directory, max_files, managed_file):
     directory = os.path.abspath(directory)
     managed_file = os.path.abspath(managed_file)
 
-    # Build a list of all files.
+    # Build a list of all files, exempting the one managed file.  This is
+    # presumably the leading log file.
     # TODO(josephw): Do we want to delete directories too?
-    all_files = []
-    for root, subdirectories, files in os.walk(directory):
-        all_files += [os.path.join(root, name) for name in files]
-
-    # Exempt the one managed file.  This is presumably the leading log file.
-    all_files.remove(managed_file)
+    all_files = [f for f in scan_files(directory) if f[1] != managed_file]
+    total_size = sum(size for _, _, size in all_files)
+    min_mtime_ns = None if max_age is None else int((time.time() - max_age) * 10**9)
 
-    logging.info("Found {0} files in log directory (max {1})".format(len(all_files), max_files))
-    if len(all_files) <= max_files:
-        return
+    logging.info("Found {0} files with {1} bytes in log directory (max {2} files, {3} bytes, {4} seconds old)".format(
+        len(all_files), total_size, max_files,
+        'unlimited' if max_size is None else max_size,
+        'unlimited' if max_age is None else max_age))
 
-    oldest_first = sorted(all_files, key=lambda x: os.stat(x).st_mtime_ns)
-    to_delete = oldest_first[0:len(all_files) - max_files]
+    def over_budget(mtime_ns):
+        return (len(all_files) > max_files or
+                (max_size is not None and total_size > max_size) or
+                (min_mtime_ns is not None and mtime_ns < min_mtime_ns))
 
-    delete_mtime_threshold = time.strftime(
-        "%a, %d %b %Y %H:%M:%S +0000",
-        time.gmtime(os.path.getmtime(to_delete[-1])))
+    # Only the files which actually get deleted are ordered, by popping them
+    # off a heap of all files oldest first.
+    heapq.heapify(all_files)
+    deleted = 0
+    deleted_size = 0
+    last_mtime_ns = None
+    while all_files and over_budget(all_files[0][0]):
+        mtime_ns, path, size = heapq.heappop(all_files)
+        total_size -= size
+        logging.debug("Deleting old file inside log directory: {0}".format(path))
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            continue
+        deleted += 1
+        deleted_size += size
+        last_mtime_ns = mtime_ns
 
-    logging.info("Deleting all files modified after: {0}", delete_mtime_threshold)
-    for path in to_delete:
-        logging.info("Deleting old file inside log directory: {0}".format(path))
-        os.remove(path)
+    if deleted:
+        delete_mtime_threshold = time.strftime(
+            "%a, %d %b %Y %H:%M:%S +0000",
+            time.gmtime(last_mtime_ns / 10**9))
+        logging.info("Deleted {0} files with {1} bytes modified at or before {2}".format(
+            deleted, deleted_size, delete_mtime_threshold))
 
 
 if __name__ == '__main__':
-    if len(sys.argv) != 4:
-        print("Usage: delete-oldest-unmanaged-files.py <directory> <max-files> <managed-file>")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(
+        description='Delete the oldest files in a log directory, except the file currently logged to')
+    parser.add_argument('directory')
+    parser.add_argument('max_files', type=int)
+    parser.add_argument('managed_file')
+    parser.add_argument('--max-age', type=int, help='Also delete files older than this many seconds')
+    parser.add_argument('--max-size', type=int, help='Also delete old files until the rest takes up this many bytes')
+    args = parser.parse_args()
 
-    main(sys.argv[1], int(sys.argv[2]), sys.argv[3])
+    main(args.directory, args.max_files, args.managed_file, max_age=args.max_age, max_size=args.max_size)
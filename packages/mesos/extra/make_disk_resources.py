@@ -5,7 +5,6 @@ import json
 import os
 import re
 import shutil
-import subprocess
 import sys
 
 from datetime import datetime
@@ -40,7 +39,12 @@ JSON_DISK_TEMPLATE = Template('''
 }
 ''')
 
-MOUNT_PATTERN = re.compile('on\s+(/dcos/volume\d+)\s+', re.M | re.I)
+MOUNT_PATTERN = re.compile('^/dcos/volume\d+$', re.I)
+
+MOUNTINFO_PATH = '/proc/self/mountinfo'
+
+# Upper bound for the number of volumes whose free space is read concurrently.
+MAX_STATVFS_WORKERS = 32
 
 # Conversion factor for Bytes -> MB calculation
 MB = float(1 << 20)
@@ -60,13 +64,22 @@ class VolumeDiscoveryException(Exception):
     pass
 
 
-def find_mounts_matching(pattern):
+def unescape_mount_point(path):
     '''
-    Find all matching mounts from the output of the mount command
+    Undo the octal escaping of whitespace and backslashes in mountinfo paths.
+    '''
+    return re.sub(r'\\([0-7]{3})', lambda m: chr(int(m.group(1), 8)), path)
+
+
+def find_mounts_matching(pattern, mountinfo_path=MOUNTINFO_PATH):
+    '''
+    Find all mount points matching `pattern` in the order the kernel lists
+    them in `mountinfo_path`, see proc(5).
     '''
     print('Looking for mounts matching pattern "{}"'.format(pattern.pattern))
-    mounts = subprocess.check_output(['mount'], universal_newlines=True)
-    return pattern.findall(mounts)
+    with open(mountinfo_path) as f:
+        mount_points = [unescape_mount_point(line.split()[4]) for line in f]
+    return [mp for mp in mount_points if pattern.match(mp)]
 
 
 def make_disk_resources_json(mounts, role):
@@ -103,7 +116,13 @@ def get_mounts_and_freespace(matching_mounts, cache_mounts):
     start due to incompatible agent resources (DCOS_OSS-3921).
     This is why we keep a cache and use the previous amount of free space.
     '''
-    for mount, free_space in map(get_disk_free, matching_mounts):
+    # Like subprocess before, only needed on the first start of an agent.
+    from concurrent.futures import ThreadPoolExecutor
+
+    with ThreadPoolExecutor(max_workers=max(1, min(len(matching_mounts), MAX_STATVFS_WORKERS))) as executor:
+        disks_free = list(executor.map(get_disk_free, matching_mounts))
+
+    for mount, free_space in disks_free:
 
         if mount in cache_mounts:
             net_free_space = cache_mounts[mount]
@@ -131,6 +150,57 @@ def stitch(parts):
     return common
 
 
+def load_cache(cache_file):
+    '''
+    Return the free space in MB per mount volume recorded in `cache_file`.
+
+    The cache is either the structured JSON copy of a previous run
+    (`<output>.json`) or, for compatibility, a previous output env file.
+
+    @type cache_file: str, path of the Mesos resources cache
+    @rtype: dict
+    '''
+    with open(cache_file) as f:
+        contents = f.read()
+
+    try:
+        data = json.loads(contents)['resources']
+    except ValueError:
+        data = None
+        # The Mesos resources env file is not a clean JSON file, it has comments
+        # and quotation marks that need to be filtered.
+        #
+        # Changing the formatting of the file could break the caching logic
+        # but test_make_disk_resources in DC/OS EE should detect such a bug.
+        for line in contents.splitlines():
+            if line.startswith('MESOS_RESOURCES'):
+                data = json.loads(line[len('MESOS_RESOURCES=\''):-1])
+
+    cache_mounts = {}
+    for item in data:
+        if item["name"] == "disk" and "disk" in item and "source" in item["disk"]:
+            mount_volume = item["disk"]["source"]["mount"]["root"]
+            cache_mounts[mount_volume] = item["scalar"]["value"]
+    return cache_mounts
+
+
+def json_cache_path(output_env_file):
+    return '{}.json'.format(output_env_file)
+
+
+def write_json_cache(output_env_file, resources):
+    '''
+    Store the resources written to `output_env_file` as structured JSON in
+    `<output_env_file>.json`, which can be passed as --cache later on. The
+    copy is only valid as long as `output_env_file` exists, see `main`.
+    '''
+    json_file = json_cache_path(output_env_file)
+    tmp_file = '{}.tmp'.format(json_file)
+    with open(tmp_file, 'w') as f:
+        json.dump({'resources': resources}, f, indent=2, sort_keys=True)
+    os.rename(tmp_file, json_file)
+
+
 def main(output_env_file, cache_env_file):
     '''
     Find mounts and freespace matching MOUNT_PATTERN, create RESOURCES for the
@@ -146,21 +216,14 @@ def main(output_env_file, cache_env_file):
     cache_mounts = {}
     if os.path.exists(cache_env_file):
         print('Mesos resources cache used for mount volumes because {} exists'.format(cache_env_file))
-        with open(cache_env_file) as f:
-            data = None
-            # The Mesos resources file is not a clean JSON file, it has comments
-            # and quotation marks that need to be filtered. This is why we
-            # enumerate the file instead of loading it entirely as a JSON file.
-            #
-            # Changing the formatting of the file could break the caching logic
-            # but test_make_disk_resources in DC/OS EE should detect such a bug.
-            for _, line in enumerate(f):
-                if line.startswith('MESOS_RESOURCES'):
-                    data = json.loads(line[len('MESOS_RESOURCES=\''):-2])
-            for item in data:
-                if item["name"] == "disk" and "disk" in item and "source" in item["disk"]:
-                    mount_volume = item["disk"]["source"]["mount"]["root"]
-                    cache_mounts[mount_volume] = item["scalar"]["value"]
+        cache_mounts = load_cache(cache_env_file)
+
+    # The output env file has been removed in order to discover the volumes
+    # again, so its JSON copy is stale unless it is explicitly used as cache.
+    json_file = json_cache_path(output_env_file)
+    if os.path.exists(json_file) and os.path.abspath(json_file) != os.path.abspath(cache_env_file):
+        print('Removing stale copy {} of the previous resources'.format(json_file))
+        os.remove(json_file)
 
     current_mounts = find_mounts_matching(MOUNT_PATTERN)
     mounts_dfree = list(get_mounts_and_freespace(current_mounts, cache_mounts))
@@ -192,6 +255,7 @@ def main(output_env_file, cache_env_file):
                 sys.exit(1)
             resources.extend(disk_resources)
             env_file.write(RESOURCES_TEMPLATE.format(res=json.dumps(resources)))
+            write_json_cache(output_env_file, resources)
         else:
             msg = 'No additional volumes. Empty artifact file {} created'
 
@@ -206,7 +270,9 @@ def main(output_env_file, cache_env_file):
 if __name__ == '__main__':
     PARSER = argparse.ArgumentParser()
     PARSER.add_argument("output", help="file where to write resources")
-    PARSER.add_argument("--cache", help="file containing the Mesos resources cache")
+    PARSER.add_argument(
+        "--cache",
+        help="file containing the Mesos resources cache, either a previous output file or its <output>.json copy")
     ARGS = PARSER.parse_args()
 
     if not ARGS.cache:
@@ -0,0 +1,95 @@
+import json
+
+import make_disk_resources
+import pytest
+
+RESOURCES = [
+    {'name': 'cpus', 'type': 'SCALAR', 'scalar': {'value': 4}},
+    {
+        'name': 'disk',
+        'role': '*',
+        'type': 'SCALAR',
+        'scalar': {'value': 1000},
+        'disk': {'source': {'type': 'MOUNT', 'mount': {'root': '/dcos/volume0'}}}
+    },
+    {'name': 'disk', 'role': '*', 'type': 'SCALAR', 'scalar': {'value': 2000}},
+]
+
+
+def test_unescape_mount_point():
+    assert make_disk_resources.unescape_mount_point('/dcos/volume0') == '/dcos/volume0'
+    assert make_disk_resources.unescape_mount_point('/mnt/my\\040disk') == '/mnt/my disk'
+    assert make_disk_resources.unescape_mount_point('/mnt/a\\011b\\012c') == '/mnt/a\tb\nc'
+    assert make_disk_resources.unescape_mount_point('/mnt/back\\134slash') == '/mnt/back\\slash'
+
+
+def test_load_cache_env_file(tmpdir):
+    cache_file = tmpdir.join('mesos-resources.cache')
+    header = make_disk_resources.RESOURCES_TEMPLATE_HEADER.format(prog='make_disk_resources.py', dt='now')
+    cache_file.write(header + make_disk_resources.RESOURCES_TEMPLATE.format(res=json.dumps(RESOURCES)))
+    assert make_disk_resources.load_cache(str(cache_file)) == {'/dcos/volume0': 1000}
+
+
+def test_load_cache_json(tmpdir):
+    output_file = str(tmpdir.join('mesos-resources'))
+    make_disk_resources.write_json_cache(output_file, RESOURCES)
+    assert tmpdir.listdir(sort=True) == [tmpdir.join('mesos-resources.json')]
+    assert make_disk_resources.load_cache(output_file + '.json') == {'/dcos/volume0': 1000}
+
+
+def _disk_resources(volume, free_space):
+    return [{
+        'name': 'disk',
+        'role': '*',
+        'type': 'SCALAR',
+        'scalar': {'value': free_space},
+        'disk': {'source': {'type': 'MOUNT', 'mount': {'root': volume}}}
+    }]
+
+
+def _write_env_file(path, resources):
+    header = make_disk_resources.RESOURCES_TEMPLATE_HEADER.format(prog='make_disk_resources.py', dt='now')
+    with open(path, 'w') as f:
+        f.write(header + make_disk_resources.RESOURCES_TEMPLATE.format(res=json.dumps(resources)))
+
+
+@pytest.fixture
+def volume(monkeypatch, tmpdir):
+    """Make volume discovery find a single volume"""
+    volume = str(tmpdir.mkdir('volume0'))
+    monkeypatch.setenv('MESOS_WORK_DIR', str(tmpdir.mkdir('work')))
+    monkeypatch.setattr(make_disk_resources, 'find_mounts_matching', lambda pattern: [volume])
+    return volume
+
+
+def test_stale_json_copy_is_not_used(tmpdir, volume):
+    output_file = str(tmpdir.join('mesos-resources'))
+    # The env file was removed in order to discover the volumes again, but its JSON copy was left behind.
+    make_disk_resources.write_json_cache(output_file, _disk_resources(volume, 1234))
+
+    make_disk_resources.main(output_file, output_file + '.cache')
+
+    free_space = make_disk_resources.load_cache(output_file)[volume]
+    assert free_space != 1234
+    assert make_disk_resources.load_cache(output_file + '.json') == {volume: free_space}
+
+
+def test_cache_env_file(tmpdir, volume):
+    output_file = str(tmpdir.join('mesos-resources'))
+    make_disk_resources.write_json_cache(output_file, _disk_resources(volume, 1))
+    _write_env_file(output_file + '.cache', _disk_resources(volume, 1234))
+
+    make_disk_resources.main(output_file, output_file + '.cache')
+
+    assert make_disk_resources.load_cache(output_file) == {volume: 1234}
+    assert make_disk_resources.load_cache(output_file + '.json') == {volume: 1234}
+
+
+def test_json_copy_as_cache(tmpdir, volume):
+    output_file = str(tmpdir.join('mesos-resources'))
+    make_disk_resources.write_json_cache(output_file, _disk_resources(volume, 1234))
+
+    make_disk_resources.main(output_file, output_file + '.json')
+
+    assert make_disk_resources.load_cache(output_file) == {volume: 1234}
+    assert make_disk_resources.load_cache(output_file + '.json') == {volume: 1234}
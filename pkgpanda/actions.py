@@ -5,7 +5,6 @@ import tempfile
 from subprocess import CalledProcessError, check_call
 from typing import List
 
-from gen import do_gen_package, resolve_late_package
 from pkgpanda import PackageId, requests_fetcher
 from pkgpanda.constants import (DCOS_SERVICE_CONFIGURATION_PATH,
                                 install_root,
@@ -228,6 +227,10 @@ def _do_bootstrap(install, repository):
     # If the host has late config values, build the late config package from them.
     late_config = if_exists(load_yaml, install.get_config_filename("setup-flags/late-config.yaml"))
     if late_config:
+        # gen is expensive to import and only needed for late binding. apply_service_configuration() runs on every
+        # service start and shouldn't pay for it.
+        from gen import do_gen_package, resolve_late_package
+
         pkg_id_str = late_config['late_bound_package_id']
         late_values = late_config['bound_values']
         print("Binding late config to late package {}".format(pkg_id_str))
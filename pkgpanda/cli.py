@@ -10,7 +10,7 @@ Usage:
   pkgpanda remove <id>... [options]
   pkgpanda setup [options]
   pkgpanda uninstall [options]
-  pkgpanda check [--list] [options]
+  pkgpanda check [--list | --json] [options]
 
 Options:
     --config-dir=<conf-dir>     Use an alternate directory for finding machine
@@ -24,19 +24,28 @@ Options:
                                 repository directory [default: {default_repository}]
     --rooted-systemd            Use $ROOT/dcos.target.wants for systemd management
                                 rather than /etc/systemd/system/dcos.target.wants
+    --json                      Print the results and timings of all checks as
+                                JSON instead of their output.
+    --timeout=<seconds>         Kill and fail checks which take longer than this.
+                                [default: 300]
+    --jobs=<n>                  Number of checks to run concurrently. [default: 8]
 """
 
+import json
 import os
+import signal
+import subprocess
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 from itertools import groupby
 from os import umask
-from subprocess import CalledProcessError, check_call
 
 from docopt import docopt
 
 from pkgpanda import actions, constants, Install, PackageId, Repository
 from pkgpanda.exceptions import PackageError, PackageNotFound, ValidationError
-from pkgpanda.util import remove_directory, remove_file
+from pkgpanda.util import is_windows, remove_directory, remove_file
 
 
 def print_repo_list(packages):
@@ -90,40 +99,103 @@ def uninstall(install, repository):
 
 
 def find_checks(install, repository):
+    """Return the absolute paths of the executable checks of every active package, by package id."""
     checks = {}
     for active_package in install.get_active():
-        tmp_checks = {}
-        tmp_checks[active_package] = []
-        package_check_dir = repository.load(active_package).check_dir
+        # Only the check directory is needed, so don't load (and parse the pkginfo.json of) the package.
+        package_path = repository.package_path(active_package)
+        if not os.path.exists(package_path):
+            raise PackageNotFound(active_package)
+        package_check_dir = os.path.join(package_path, 'check')
         if not os.path.isdir(package_check_dir):
             continue
+        package_checks = []
         for check_file in sorted(os.listdir(package_check_dir)):
-            if not os.access(os.path.join(package_check_dir, check_file), os.X_OK):
+            check_path = os.path.join(package_check_dir, check_file)
+            if not os.access(check_path, os.X_OK):
                 print('WARNING: `{}` is not executable'.format(check_file), file=sys.stderr)
                 continue
-            tmp_checks[active_package].append(check_file)
-        if tmp_checks[active_package]:
-            checks.update(tmp_checks)
+            package_checks.append(check_path)
+        if package_checks:
+            checks[active_package] = package_checks
     return checks
 
 
 def list_checks(checks):
-    for check_dir, check_files in sorted(checks.items()):
+    for check_dir, check_paths in sorted(checks.items()):
         print('{}'.format(check_dir))
-        for check_file in check_files:
-            print(' - {}'.format(check_file))
+        for check_path in check_paths:
+            print(' - {}'.format(os.path.basename(check_path)))
 
 
-def run_checks(checks, install, repository):
+def run_check(pkg_id, check_path, timeout):
+    """Run a single check, returning its result, captured output and duration as a dict."""
+    start = time.monotonic()
+    # Run every check in its own process group, so a timeout kills whatever it started as well.
+    process = subprocess.Popen(
+        [check_path], stdout=subprocess.PIPE, stderr=subprocess.PIPE, start_new_session=not is_windows)
+    try:
+        stdout, stderr = process.communicate(timeout=timeout)
+        timed_out = False
+    except subprocess.TimeoutExpired:
+        if is_windows:
+            process.kill()
+        else:
+            os.killpg(process.pid, signal.SIGKILL)
+        stdout, stderr = process.communicate()
+        timed_out = True
+
+    return {
+        'package': pkg_id,
+        'check': os.path.basename(check_path),
+        'returncode': process.returncode,
+        'timed_out': timed_out,
+        'duration': round(time.monotonic() - start, 3),
+        'stdout': stdout.decode('utf-8', 'replace'),
+        'stderr': stderr.decode('utf-8', 'replace'),
+    }
+
+
+def run_checks(checks, timeout=None, jobs=8, as_json=False):
+    """
+    Run all `checks` (as returned by `find_checks`) with up to `jobs` at a time and return 1 if any of them failed or
+    took longer than `timeout` seconds, 0 otherwise.
+
+    The output of the checks is printed in the order they are listed, or replaced by a JSON document with the result
+    of every check if `as_json` is set.
+    """
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=max(jobs, 1)) as executor:
+        futures = [
+            executor.submit(run_check, pkg_id, check_path, timeout)
+            for pkg_id, check_paths in sorted(checks.items())
+            for check_path in check_paths]
+        results = [future.result() for future in futures]
+
     exit_code = 0
-    for pkg_id, check_files in sorted(checks.items()):
-        check_dir = repository.load(pkg_id).check_dir
-        for check_file in check_files:
-            try:
-                check_call([os.path.join(check_dir, check_file)])
-            except CalledProcessError:
-                print('Check failed: {}'.format(check_file), file=sys.stderr)
-                exit_code = 1
+    for result in results:
+        result['failed'] = result['timed_out'] or result['returncode'] != 0
+        if result['failed']:
+            exit_code = 1
+
+    if as_json:
+        json.dump({
+            'checks': results,
+            'duration': round(time.monotonic() - start, 3),
+            'exit_code': exit_code,
+        }, sys.stdout, indent=2, sort_keys=True)
+        print()
+        return exit_code
+
+    for result in results:
+        sys.stdout.write(result['stdout'])
+        sys.stdout.flush()
+        sys.stderr.write(result['stderr'])
+        if result['timed_out']:
+            print('Check timed out after {}s: {}'.format(timeout, result['check']), file=sys.stderr)
+        elif result['failed']:
+            print('Check failed: {}'.format(result['check']), file=sys.stderr)
+        sys.stderr.flush()
     return exit_code
 
 
@@ -215,7 +287,11 @@ def main():
                 list_checks(checks)
                 sys.exit(0)
             # Run all checks
-            sys.exit(run_checks(checks, install, repository))
+            sys.exit(run_checks(
+                checks,
+                timeout=float(arguments['--timeout']),
+                jobs=int(arguments['--jobs']),
+                as_json=arguments['--json']))
     except ValidationError as ex:
         print("Validation Error: {0}".format(ex), file=sys.stderr)
         sys.exit(1)
@@ -1,7 +1,10 @@
+import json
+import time
 from subprocess import check_output, PIPE, Popen, STDOUT
 
 import pytest
 
+from pkgpanda.cli import run_checks
 from pkgpanda.util import is_windows, resources_test_dir
 
 list_output = """WARNING: `not_executable.py` is not executable
@@ -46,3 +49,47 @@ def test_check_target_run():
     stdout, stderr = cmd.communicate()
     assert stdout.decode() == run_output_stdout
     assert stderr.decode() == run_output_stderr
+
+
+# TODO: DCOS_OSS-3469 - muted Windows tests requiring investigation
+@pytest.mark.skipif(is_windows, reason="test fails on Windows reason unknown")
+def test_check_target_run_json():
+    output = check_output([
+        'pkgpanda',
+        'check',
+        '--json',
+        '--root', resources_test_dir('opt/mesosphere'),
+        '--repository', resources_test_dir('opt/mesosphere/packages')])
+    result = json.loads(output.decode())
+    assert result['exit_code'] == 0
+    assert [(c['package'], c['check'], c['stdout'], c['failed']) for c in result['checks']] == [
+        ('pkg1--12345', 'hello_world_ok.py', 'Hello World\n', False),
+        ('pkg2--12345', 'failed_check.py', 'I exist to fail...\nAssertion error\n', False),
+        ('pkg2--12345', 'shell_script_check.sh', 'Hello World\n', False),
+    ]
+
+
+def _write_check(tmpdir, name, script):
+    path = tmpdir.join(name)
+    path.write('#!/bin/sh\n' + script)
+    path.chmod(0o755)
+    return str(path)
+
+
+@pytest.mark.skipif(is_windows, reason="uses shell script checks")
+def test_run_checks_concurrently(tmpdir, capsys):
+    checks = {
+        'pkg1--12345': [_write_check(tmpdir, 'slow_ok.sh', 'sleep 1\necho ok\n')],
+        'pkg2--12345': [
+            _write_check(tmpdir, 'slow_fail.sh', 'sleep 1\necho not ok >&2\nexit 2\n'),
+            _write_check(tmpdir, 'hangs.sh', 'sleep 60 &\nwait\n'),
+        ],
+    }
+    start = time.monotonic()
+    assert run_checks(checks, timeout=2) == 1
+    # The checks ran concurrently and the hanging check was killed together with its child.
+    assert time.monotonic() - start < 10
+
+    stdout, stderr = capsys.readouterr()
+    assert stdout == 'ok\n'
+    assert stderr == 'not ok\nCheck failed: slow_fail.sh\nCheck timed out after 2s: hangs.sh\n'
@@ -18,12 +18,8 @@ from shutil import rmtree
 from subprocess import check_call
 from typing import List
 
-import requests
 import retrying
 import teamcity
-import yaml
-from requests.adapters import HTTPAdapter
-from requests.packages.urllib3.util.retry import Retry
 from teamcity.messages import TeamcityServiceMessages
 
 from pkgpanda.exceptions import FetchError, IncompleteDownloadError, ValidationError
@@ -137,6 +133,12 @@ def variant_suffix(variant, delim='.'):
 
 
 def get_requests_retry_session(max_retries=4, backoff_factor=1, status_forcelist=None):
+    # requests is only imported here since most users of pkgpanda.util (like bootstrap on every service start) never
+    # download anything.
+    import requests
+    from requests.adapters import HTTPAdapter
+    from requests.packages.urllib3.util.retry import Retry
+
     status_forcelist = status_forcelist or [500, 502, 504]
     # Default max retries 4 with sleeping between retries 1s, 2s, 4s, 8s
     session = requests.Session()
@@ -267,6 +269,7 @@ class YamlParseError(Exception):
 
 
 def load_yaml(filename):
+    import yaml
     try:
         with open(filename) as f:
             return yaml.safe_load(f)
@@ -275,6 +278,7 @@ def load_yaml(filename):
 
 
 def write_yaml(filename, data, **kwargs):
+    import yaml
     dumped_yaml = yaml.safe_dump(data, **kwargs)
     write_string(filename, dumped_yaml)
 
@@ -1,7 +1,13 @@
 import asyncio
+import collections
 import copy
 import logging
+import math
 import os
+import shlex
+import shutil
+import tarfile
+import tempfile
 try:
     import pty
 except ImportError:
@@ -59,6 +65,135 @@ class Node():
             ', '.join(['{}:{}'.format(k, v) for k, v in sorted(self.tags.items())]))
 
 
+def write_tar_stream(files: dict, fd: int, compress: bool):
+    '''
+    Write files as a tar archive into fd and close it. Meant to run in an executor feeding the stdin of a process.
+    :param files: dict, maps a local path to its name inside the archive
+    '''
+    try:
+        with os.fdopen(fd, 'wb') as fileobj:
+            with tarfile.open(fileobj=fileobj, mode='w|gz' if compress else 'w|') as tar:
+                for local_path, arcname in sorted(files.items(), key=lambda item: item[1]):
+                    tar.add(local_path, arcname=arcname)
+    except BrokenPipeError:
+        # The receiving process went away, its return code tells the caller what happened.
+        log.error('tar stream was closed by the receiving process')
+
+
+class ArtifactSources():
+    """
+    Pool of hosts a stream can be sent from. None stands for the local host which has peer_fanout slots, every host
+    which received the stream is added as one more slot so the number of sources doubles with every wave.
+    """
+    def __init__(self, local_slots: int):
+        self._available = collections.deque([None] * local_slots)
+        self._busy = set()
+        self._retired = set()
+        self._changed = asyncio.Condition()
+
+    @asyncio.coroutine
+    def acquire(self):
+        with (yield from self._changed):
+            yield from self._changed.wait_for(lambda: self._available)
+            source = self._available.popleft()
+            if source is not None:
+                self._busy.add(source)
+            return source
+
+    @asyncio.coroutine
+    def acquire_local(self):
+        """Take one of the local slots, waiting for one to be released if all are in use."""
+        with (yield from self._changed):
+            yield from self._changed.wait_for(lambda: None in self._available)
+            self._available.remove(None)
+
+    @asyncio.coroutine
+    def release(self, source):
+        with (yield from self._changed):
+            self._busy.discard(source)
+            # Peers are handed out before the local slots to keep the local uplink free.
+            if source is None:
+                self._available.append(source)
+            elif source not in self._retired:
+                self._available.appendleft(source)
+            self._changed.notify_all()
+
+    @asyncio.coroutine
+    def retire(self, host):
+        """Stop handing out host, waiting for a relay from it which is still in flight."""
+        with (yield from self._changed):
+            self._retired.add(host)
+            if host in self._available:
+                self._available.remove(host)
+            yield from self._changed.wait_for(lambda: host not in self._busy)
+
+
+class AdaptiveLimiter():
+    """
+    Bounds the number of hosts running their chains at the same time.
+
+    The limit starts at max_limit. With adaptive set it is halved whenever a command times out or takes more than
+    slowdown_factor times as long as usual for its stage on hosts of the same role, and grows back by one after limit
+    commands completed in time. Only commands started after the last decrease can decrease it again, so one slow
+    period halves it once.
+    """
+    def __init__(self, max_limit: int, adaptive=False, slowdown_factor=3):
+        self.max_limit = max_limit
+        self.limit = max_limit
+        self.adaptive = adaptive
+        self.slowdown_factor = slowdown_factor
+        self._active = 0
+        self._credit = 0
+        self._last_decrease = None
+        self._baselines = {}
+        self._changed = asyncio.Condition()
+
+    @asyncio.coroutine
+    def acquire(self):
+        with (yield from self._changed):
+            yield from self._changed.wait_for(lambda: self._active < self.limit)
+            self._active += 1
+
+    @asyncio.coroutine
+    def release(self):
+        with (yield from self._changed):
+            self._active -= 1
+            self._changed.notify_all()
+
+    @asyncio.coroutine
+    def record(self, stage, started, duration, timed_out, role=None):
+        if not self.adaptive:
+            return
+
+        # The same stage can take much longer on masters than on agents, e.g. installing DC/OS.
+        baseline = self._baselines.get((role, stage))
+        slow = timed_out or (baseline is not None and duration > baseline * self.slowdown_factor)
+        if not timed_out:
+            # Moving average, so the baseline follows slow but steady changes such as bigger artifacts.
+            self._baselines[(role, stage)] = duration if baseline is None else 0.8 * baseline + 0.2 * duration
+
+        with (yield from self._changed):
+            if slow:
+                if self._last_decrease is None or started > self._last_decrease:
+                    self.limit = max(1, self.limit // 2)
+                    self._credit = 0
+                    self._last_decrease = started + duration
+                    log.info('{} took {:.1f} sec, reducing parallelism to {}'.format(stage, duration, self.limit))
+            elif self.limit < self.max_limit:
+                self._credit += 1
+                if self._credit >= self.limit:
+                    self.limit += 1
+                    self._credit = 0
+                    log.debug('increasing parallelism to {}'.format(self.limit))
+                    self._changed.notify_all()
+
+
+def percentile(values: list, p: float):
+    """Nearest-rank percentile of values, p in [0, 100]."""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
 def add_host(target, default_port):
     if isinstance(target, Node):
         return target
@@ -66,8 +201,12 @@ def add_host(target, default_port):
 
 
 class MultiRunner():
+    # Slowest transfer rate in bytes per second a stream is given time for, see _get_stream_timeout.
+    STREAM_MIN_RATE = 1024 * 1024
+
     def __init__(self, targets: list, async_delegate=None, user=None, key_path=None, extra_opts='',
-                 process_timeout=120, parallelism=10, default_port=22):
+                 process_timeout=120, parallelism=10, default_port=22, multiplex=False, peer_fanout=0,
+                 adaptive_parallelism=False, max_failures=None, stream_timeout=None):
         # TODO(cmaloney): accept an "ssh_config" object which generates an ssh
         # config file, then add a '-F' to that temporary config file rather than
         # manually building up / adding the arguments in _get_base_args which is
@@ -75,6 +214,7 @@ class MultiRunner():
         # host section which applies to all hosts, sets things like "user".
         self.extra_opts = extra_opts
         self.process_timeout = process_timeout
+        self.stream_timeout = stream_timeout
         self.user = user
         self.key_path = key_path
         self.ssh_bin = '/usr/bin/ssh'
@@ -85,12 +225,107 @@ class MultiRunner():
             self.__targets.append(add_host(target, default_port))
         self.__parallelism = parallelism
 
-    def _get_base_args(self, bin_name, host):
+        # Hosts are dispatched masters first. With adaptive_parallelism the number of hosts running at a time follows
+        # the observed command latency (see AdaptiveLimiter). Once more than max_failures hosts failed, hosts which
+        # did not start yet are skipped.
+        self.adaptive_parallelism = adaptive_parallelism
+        self.max_failures = max_failures
+        self.__failed_hosts = 0
+        self.stage_timings = collections.defaultdict(list)
+
+        # When multiplexing is enabled every host gets a single master connection (see _open_control_master) which
+        # all the ssh / scp invocations of its chains reuse instead of doing a full handshake each time.
+        self.multiplex = multiplex
+        self.__control_dir = None
+
+        # With a peer_fanout > 0 streams are sent from the local host to at most peer_fanout hosts at a time. Every
+        # host which received and verified a stream becomes a source for the remaining ones (see ArtifactSources).
+        self.peer_fanout = peer_fanout
+        self.__sources = {}
+        self.__agent = None
+        self.__agent_sock = None
+
+    def _get_control_dir(self):
+        if self.__control_dir is None:
+            # Unix socket paths are limited to ~100 characters, so keep the directory short.
+            self.__control_dir = tempfile.mkdtemp(prefix='dcos-ssh-')
+        return self.__control_dir
+
+    def _get_control_path(self, host):
+        return os.path.join(self._get_control_dir(), '{}-{}'.format(host.ip, host.port))
+
+    @asyncio.coroutine
+    def _cleanup(self):
+        if self.__agent is not None:
+            yield from self._stop_agent()
+        if self.__control_dir is not None:
+            shutil.rmtree(self.__control_dir, ignore_errors=True)
+            self.__control_dir = None
+        self.__sources = {}
+
+    def _get_env(self):
+        env = {'TERM': 'linux'}
+        if self.__agent_sock is not None:
+            env['SSH_AUTH_SOCK'] = self.__agent_sock
+        return env
+
+    @asyncio.coroutine
+    def _start_agent(self):
+        '''
+        Start an ssh-agent holding key_path. Hosts relaying streams to their peers authenticate through it using
+        agent forwarding, so the private key never leaves this host.
+        '''
+        agent_sock = os.path.join(self._get_control_dir(), 'agent')
+        self.__agent = yield from asyncio.create_subprocess_exec(
+            '/usr/bin/ssh-agent', '-D', '-a', agent_sock,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.DEVNULL)
+        while not os.path.exists(agent_sock):
+            if self.__agent.returncode is not None:
+                log.error('ssh-agent exited with {}, peer distribution disabled'.format(self.__agent.returncode))
+                self.__agent = None
+                return
+            yield from asyncio.sleep(0.1)
+
+        process = yield from asyncio.create_subprocess_exec(
+            '/usr/bin/ssh-add', self.key_path,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.DEVNULL,
+            env={'SSH_AUTH_SOCK': agent_sock})
+        returncode = yield from process.wait()
+        if returncode != 0:
+            log.error('ssh-add exited with {}, peer distribution disabled'.format(returncode))
+            yield from self._stop_agent()
+            return
+        self.__agent_sock = agent_sock
+
+    @asyncio.coroutine
+    def _stop_agent(self):
+        if self.__agent.returncode is None:
+            try:
+                self.__agent.terminate()
+            except ProcessLookupError:
+                log.info('ssh-agent with pid {} not found'.format(self.__agent.pid))
+            yield from self.__agent.wait()
+        self.__agent = None
+        self.__agent_sock = None
+
+    def _get_base_args(self, bin_name, host, control_master=False, tty=True):
         # TODO(cmaloney): Switch to SSH config file, documented above. A single
         # user is always required.
         if bin_name == self.ssh_bin:
             port_option = '-p'
-            add_opts = ['-tt']
+            if control_master:
+                add_opts = ['-N']
+                if self.peer_fanout:
+                    # Sessions sharing the master only get the agent forwarded which relays to peers need if the
+                    # master itself forwards it.
+                    add_opts.append('-oForwardAgent=yes')
+            elif tty:
+                add_opts = ['-tt']
+            else:
+                # A pseudo-terminal would mangle binary data sent over stdin.
+                add_opts = ['-T']
             if self.extra_opts:
                 add_opts.extend(self.extra_opts.split(' '))
         else:
@@ -105,27 +340,76 @@ class MultiRunner():
             '-oPasswordAuthentication=no',
             '{}{}'.format(port_option, host.port),
             '-i', self.key_path]
+        if self.multiplex:
+            # With ControlMaster=no a missing socket makes ssh fall back to a regular connection, so a host
+            # whose master could not be opened still works, just without the reuse.
+            shared_opts.extend([
+                '-oControlMaster={}'.format('yes' if control_master else 'no'),
+                '-oControlPath={}'.format(self._get_control_path(host))])
         shared_opts.extend(add_opts)
         return shared_opts
 
     @asyncio.coroutine
-    def run_cmd_return_dict_async(self, cmd, host, namespace, future, stage):
+    def _open_control_master(self, host):
+        '''
+        Start a master connection for host which stays up until _close_control_master is called.
+        :return: the master process or None if the control socket could not be established
+        '''
+        full_cmd = self._get_base_args(self.ssh_bin, host, control_master=True) + ['{}@{}'.format(self.user, host.ip)]
+        log.debug('opening control master {}'.format(full_cmd))
+        # The master is owned by the runner rather than left behind with ControlPersist, so it must not hold on to
+        # any pipes which would block the caller.
+        process = yield from asyncio.create_subprocess_exec(
+            *full_cmd, stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.DEVNULL,
+            env=self._get_env())
+
+        control_path = self._get_control_path(host)
+        loop = asyncio.get_event_loop()
+        # ConnectTimeout is 10 seconds, give the master slightly longer than that to publish its socket.
+        deadline = loop.time() + 15
+        while not os.path.exists(control_path):
+            if process.returncode is not None or loop.time() > deadline:
+                log.warning('Could not open a control master for {}, using a connection per command'.format(host))
+                yield from self._close_control_master(host, process)
+                return None
+            yield from asyncio.sleep(0.1)
+        return process
+
+    @asyncio.coroutine
+    def _close_control_master(self, host, process):
+        if process.returncode is None:
+            try:
+                process.terminate()
+            except ProcessLookupError:
+                log.info('control master with pid {} not found'.format(process.pid))
+            yield from process.wait()
+        try:
+            os.remove(self._get_control_path(host))
+        except FileNotFoundError:
+            pass
+
+    @asyncio.coroutine
+    def run_cmd_return_dict_async(self, cmd, host, namespace, future, stage, stdin=None, timeout=None):
+        if timeout is None:
+            timeout = self.process_timeout
         with make_slave_pty() as slave_pty:
             process = yield from asyncio.create_subprocess_exec(
                 *cmd, stdout=asyncio.subprocess.PIPE,
                 stderr=asyncio.subprocess.PIPE,
-                stdin=slave_pty,
-                env={'TERM': 'linux'})
+                stdin=slave_pty if stdin is None else stdin,
+                env=self._get_env())
             stdout = b''
             stderr = b''
             try:
-                stdout, stderr = yield from asyncio.wait_for(process.communicate(), self.process_timeout)
+                stdout, stderr = yield from asyncio.wait_for(process.communicate(), timeout)
             except asyncio.TimeoutError:
                 try:
                     process.terminate()
                 except ProcessLookupError:
                     log.info('process with pid {} not found'.format(process.pid))
-                log.error('timeout of {} sec reached. PID {} killed'.format(self.process_timeout, process.pid))
+                log.error('timeout of {} sec reached. PID {} killed'.format(timeout, process.pid))
 
         # For each possible line in stderr, match from the beginning of the line for the
         # the confusing warning: "Warning: Permanently added ...". If the warning exists,
@@ -181,7 +465,114 @@ class MultiRunner():
         result = yield from self.run_cmd_return_dict_async(full_cmd, host, namespace, future, stage)
         return result
 
-    def _run_chain_command(self, chain: CommandChain, host, chain_result):
+    def _get_extract_command(self, remote_path, compress, checksums):
+        extract_command = 'mkdir -p {path} && tar -x{compress}f - -C {path}'.format(
+            path=shlex.quote(remote_path), compress='z' if compress else '')
+        if checksums:
+            manifest = ''.join('{}  {}\n'.format(checksum, name) for name, checksum in sorted(checksums.items()))
+            extract_command += ' && cd {path} && printf %s {manifest} | sha1sum --check --quiet -'.format(
+                path=shlex.quote(remote_path), manifest=shlex.quote(manifest))
+        return extract_command
+
+    def _get_stream_timeout(self, files):
+        """
+        A stream carries all the artifacts of a host in a single command, so unless stream_timeout is set, it gets
+        process_timeout plus the time needed to transfer them at STREAM_MIN_RATE.
+        """
+        if self.stream_timeout is not None:
+            return self.stream_timeout
+        size = sum(os.path.getsize(local_path) for local_path in files)
+        return self.process_timeout + size / self.STREAM_MIN_RATE
+
+    @asyncio.coroutine
+    def _stream_from_local(self, host, command, namespace, future, stage):
+        _, files, remote_path, compress, checksums, _ = command
+        full_cmd = self._get_base_args(self.ssh_bin, host, tty=False) + [
+            '{}@{}'.format(self.user, host.ip), self._get_extract_command(remote_path, compress, checksums)]
+        log.debug('streaming {} files with command {}'.format(len(files), full_cmd))
+
+        read_fd, write_fd = os.pipe()
+        writer = asyncio.get_event_loop().run_in_executor(None, write_tar_stream, files, write_fd, compress)
+        try:
+            result = yield from self.run_cmd_return_dict_async(full_cmd, host, namespace, future, stage,
+                                                               stdin=read_fd, timeout=self._get_stream_timeout(files))
+        finally:
+            # Closing the last read end unblocks the writer if ssh exited before consuming the whole stream.
+            os.close(read_fd)
+            yield from writer
+        return result
+
+    @asyncio.coroutine
+    def _stream_from_peer(self, source, host, command, namespace, future, stage):
+        # source already has the extracted files in remote_path, it re-archives them and pipes them straight into
+        # an ssh session to host, authenticating with the forwarded agent. Only the control traffic goes through
+        # this host.
+        _, files, remote_path, compress, checksums, _ = command
+        relay_command = 'tar -c{compress}f - -C {path} {names} | {ssh} {extract}'.format(
+            compress='z' if compress else '',
+            path=shlex.quote(remote_path),
+            names=' '.join(shlex.quote(name) for name in sorted(files.values())),
+            ssh=' '.join([
+                'ssh', '-T',
+                '-oConnectTimeout=10',
+                '-oStrictHostKeyChecking=no',
+                '-oUserKnownHostsFile=/dev/null',
+                '-oBatchMode=yes',
+                '-p{}'.format(host.port),
+                '{}@{}'.format(self.user, host.ip)]),
+            extract=shlex.quote(self._get_extract_command(remote_path, compress, checksums)))
+        full_cmd = self._get_base_args(self.ssh_bin, source, tty=False) + [
+            '-oForwardAgent=yes', '{}@{}'.format(self.user, source.ip), relay_command]
+        log.debug('relaying {} files from {} with command {}'.format(len(files), source, full_cmd))
+        result = yield from self.run_cmd_return_dict_async(full_cmd, host, namespace, future, stage,
+                                                           timeout=self._get_stream_timeout(files))
+        return result
+
+    @asyncio.coroutine
+    def stream_async(self, host, command, namespace, future, stage):
+        # command[0] is command_flag, command[-1] is stage
+        # we will ignore them here.
+        _, _, remote_path, _, _, _ = command
+        if not self.peer_fanout or self.__agent_sock is None:
+            result = yield from self._stream_from_local(host, command, namespace, future, stage)
+            return result
+
+        sources = self.__sources.setdefault((namespace, remote_path), ArtifactSources(self.peer_fanout))
+        host_port = '{}:{}'.format(host.ip, host.port)
+        source = yield from sources.acquire()
+        # Only the final attempt gets reported to the delegate.
+        attempt = asyncio.Future()
+        try:
+            if source is None:
+                result = yield from self._stream_from_local(host, command, namespace, attempt, stage)
+            else:
+                result = yield from self._stream_from_peer(source, host, command, namespace, attempt, stage)
+        finally:
+            yield from sources.release(source)
+
+        if source is not None and result[host_port]['returncode'] != 0:
+            # Either side may be at fault; retry once directly so a bad peer can't fail the host.
+            log.warning('Relaying from {} to {} failed, streaming from the local host instead'.format(source, host))
+            attempt = asyncio.Future()
+            yield from sources.acquire_local()
+            try:
+                result = yield from self._stream_from_local(host, command, namespace, attempt, stage)
+            finally:
+                yield from sources.release(None)
+
+        if result[host_port]['returncode'] == 0:
+            yield from sources.release(host)
+        future.set_result(attempt.result())
+        return result
+
+    @asyncio.coroutine
+    def _retire_source(self, host, namespace):
+        # Later chains may clean up what was streamed, so a host only serves its peers until its chain is done.
+        for (sources_namespace, _), sources in list(self.__sources.items()):
+            if sources_namespace == namespace:
+                yield from sources.retire(host)
+
+    def _run_chain_command(self, chain: CommandChain, host, chain_result, limiter):
 
         # Prepare status json
         if self.async_delegate is not None:
@@ -193,7 +584,8 @@ class MultiRunner():
 
         command_map = {
             CommandChain.execute_flag: self.run_async,
-            CommandChain.copy_flag: self.copy_async
+            CommandChain.copy_flag: self.copy_async,
+            CommandChain.stream_flag: self.stream_async
         }
 
         process_exit_code_map = {
@@ -225,7 +617,15 @@ class MultiRunner():
                 future.add_done_callback(lambda future: self.async_delegate.on_update(future, callback_called))
 
             # command[0] is a type of a command, could be CommandChain.execute_flag, CommandChain.copy_flag
+            loop = asyncio.get_event_loop()
+            started = loop.time()
             result = yield from command_map.get(command[0], None)(host, command, chain.namespace, future, stage)
+            duration = loop.time() - started
+            timing_key = stage if stage is not None else command[0]
+            self.stage_timings[timing_key].append(duration)
+            yield from limiter.record(
+                timing_key, started, duration, result[host_port]['returncode'] is None, role=host.tags.get('role'))
+
             status = process_exit_code_map.get(result[host_port]['returncode'], process_exit_code_map['failed'])
             host_status = status['host_status']
 
@@ -247,19 +647,87 @@ class MultiRunner():
         if self.async_delegate is not None:
             # Update chain status.
             self.async_delegate.on_done(chain.namespace, result, host_status=host_status)
+        return host_status
+
+    def _skip_chains(self, chains, host, chain_result):
+        host_port = '{}:{}'.format(host.ip, host.port)
+        log.warning('More than {} hosts failed, skipping {}'.format(self.max_failures, host_port))
+        result = {
+            host_port: {
+                'cmd': [],
+                'stdout': [''],
+                'stderr': ['Skipped, more than {} hosts failed'.format(self.max_failures)],
+                'returncode': None,
+                'pid': None,
+                'stage': None
+            }
+        }
+        chain_result.append(result)
+        if self.async_delegate is not None:
+            for chain in chains:
+                self.async_delegate.prepare_status(chain.namespace, self.__targets)
+                self.async_delegate.on_done(chain.namespace, result, host_status='terminated')
 
     @asyncio.coroutine
-    def dispatch_chain(self, host, chains, sem):
+    def dispatch_chain(self, host, chains, limiter):
         log.debug('Started dispatch_chain for host {}'.format(host))
         chain_result = []
-        with (yield from sem):
-            for chain in chains:
-                yield from self._run_chain_command(chain, host, chain_result)
+        yield from limiter.acquire()
+        try:
+            if self.max_failures is not None and self.__failed_hosts > self.max_failures:
+                self._skip_chains(chains, host, chain_result)
+                return chain_result
+
+            control_master = None
+            if self.multiplex:
+                control_master = yield from self._open_control_master(host)
+            failed = False
+            try:
+                for chain in chains:
+                    host_status = yield from self._run_chain_command(chain, host, chain_result, limiter)
+                    failed = failed or host_status != 'success'
+                    yield from self._retire_source(host, chain.namespace)
+            finally:
+                if control_master is not None:
+                    yield from self._close_control_master(host, control_master)
+            if failed:
+                self.__failed_hosts += 1
+        finally:
+            yield from limiter.release()
         return chain_result
 
+    def get_stage_timings(self):
+        """Return count, p50, p90, p99 and max duration in seconds of every stage of the last run across all hosts."""
+        return {
+            stage: {
+                'count': len(durations),
+                'p50': percentile(durations, 50),
+                'p90': percentile(durations, 90),
+                'p99': percentile(durations, 99),
+                'max': max(durations)
+            } for stage, durations in self.stage_timings.items()}
+
+    def _log_stage_timings(self):
+        for stage, timings in sorted(self.get_stage_timings().items()):
+            log.info('{}: {count} commands, p50 {p50:.1f}s, p90 {p90:.1f}s, p99 {p99:.1f}s, max {max:.1f}s'.format(
+                stage, **timings))
+
+    @asyncio.coroutine
+    def _finish_when_done(self, tasks):
+        yield from asyncio.wait(tasks)
+        yield from self._cleanup()
+        self._log_stage_timings()
+
+    def _ordered_targets(self):
+        # Masters first, agents can't finish their installation before the masters are up anyway.
+        return sorted(self.__targets, key=lambda host: host.tags.get('role') != 'master')
+
     @asyncio.coroutine
     def run_commands_chain_async(self, chains: list, block=False, state_json_dir=None, delegate_extra_params={}):
-        sem = asyncio.Semaphore(self.__parallelism)
+        limiter = AdaptiveLimiter(self.__parallelism, adaptive=self.adaptive_parallelism)
+        # get_stage_timings and max_failures only account for the latest run.
+        self.stage_timings = collections.defaultdict(list)
+        self.__failed_hosts = 0
 
         if state_json_dir:
             log.debug('Using default JsonDelegate method, state_json_dir {}'.format(state_json_dir))
@@ -267,19 +735,26 @@ class MultiRunner():
         else:
             assert self.async_delegate, 'async delegate must be set'
 
+        if self.peer_fanout and self.__agent is None:
+            yield from self._start_agent()
+
         if block:
             log.debug('Waiting for run_command_chain_async to execute')
             tasks = []
-            for host in self.__targets:
-                tasks.append(asyncio.async(self.dispatch_chain(host, chains, sem)))
+            for host in self._ordered_targets():
+                tasks.append(asyncio.async(self.dispatch_chain(host, chains, limiter)))
 
             yield from asyncio.wait(tasks)
+            yield from self._cleanup()
+            self._log_stage_timings()
             log.debug('run_command_chain_async executed')
             return [task.result() for task in tasks]
         else:
             log.debug('Started run_command_chain_async in non-blocking mode')
-            for host in self.__targets:
-                asyncio.async(self.dispatch_chain(host, chains, sem))
+            tasks = []
+            for host in self._ordered_targets():
+                tasks.append(asyncio.async(self.dispatch_chain(host, chains, limiter)))
+            asyncio.async(self._finish_when_done(tasks))
 
     def validate(self):
         """Raises an AssertException if validation does not pass"""
@@ -236,12 +236,14 @@ def test_command_chain():
     chain.add_copy('/local', '/remote')
     chain.prepend_command(['cmd1'])
     chain.add_execute(['cmd3'])
+    chain.add_stream({'/local': 'local'}, '/remote', stage='stream')
 
     assert chain.get_commands() == [
         ('execute', ['cmd1'], None, None),
         ('execute', ['cmd2'], None, None),
         ('copy', '/local', '/remote', False, False, None),
-        ('execute', ['cmd3'], None, None)
+        ('execute', ['cmd3'], None, None),
+        ('stream', {'/local': 'local'}, '/remote', False, None, 'stream')
     ]
 
 
@@ -322,3 +324,150 @@ def test_tags_async(sshd_manager, loop):
                     "sleep",
                     "1"
                 ]
+
+
+@pytest.mark.skipif(pkgpanda.util.is_windows, reason="Windows does not support ssh native")
+def test_ssh_multiplex_async(sshd_manager, loop):
+    with sshd_manager.run(2) as sshd_ports:
+        workspace = str(sshd_manager.tmpdir)
+        pkgpanda.util.write_string(workspace + '/pilot.txt', 'pilot')
+        runner = MultiRunner(['127.0.0.1:{}'.format(port) for port in sshd_ports], user=getpass.getuser(),
+                             key_path=sshd_manager.key_path, multiplex=True)
+
+        chain = CommandChain('test')
+        chain.add_execute(['uname', '-a'])
+        chain.add_copy(workspace + '/pilot.txt', workspace + '/pilot.txt.copied')
+        chain.add_execute(['cat', workspace + '/pilot.txt.copied'])
+        try:
+            results = loop.run_until_complete(runner.run_commands_chain_async([chain], block=True,
+                                                                              state_json_dir=workspace))
+        finally:
+            loop.close()
+
+        control_paths = set()
+        assert len(results) == 2
+        for host_result in results:
+            assert len(host_result) == 3
+            for command_result in host_result:
+                for host, process_result in command_result.items():
+                    assert process_result['returncode'] == 0, process_result['stderr']
+                    assert '-oControlMaster=no' in process_result['cmd']
+                    control_paths.update(
+                        opt.split('=', 1)[1] for opt in process_result['cmd'] if opt.startswith('-oControlPath='))
+
+        # One master per host, all cleaned up once the chains completed.
+        assert len(control_paths) == 2
+        for control_path in control_paths:
+            assert not os.path.exists(control_path)
+            assert not os.path.exists(os.path.dirname(control_path))
+
+
+@pytest.mark.skipif(pkgpanda.util.is_windows, reason="Windows does not support ssh native")
+@pytest.mark.parametrize('compress', [False, True])
+def test_stream_async(sshd_manager, loop, compress):
+    with sshd_manager.run(1) as sshd_ports:
+        workspace = str(sshd_manager.tmpdir)
+        ids = [uuid.uuid4().hex for _ in range(3)]
+        files = {}
+        for i, id in enumerate(ids):
+            pkgpanda.util.write_string('{}/pilot{}.txt'.format(workspace, i), id)
+            files['{}/pilot{}.txt'.format(workspace, i)] = 'dir{}/pilot.txt'.format(i)
+        runner = MultiRunner(['127.0.0.1:{}'.format(port) for port in sshd_ports], user=getpass.getuser(),
+                             key_path=sshd_manager.key_path)
+
+        chain = CommandChain('test')
+        chain.add_stream(files, workspace + '/streamed', compress=compress)
+        try:
+            results = loop.run_until_complete(runner.run_commands_chain_async([chain], block=True,
+                                                                              state_json_dir=workspace))
+        finally:
+            loop.close()
+
+        for i, id in enumerate(ids):
+            assert pkgpanda.util.load_string('{}/streamed/dir{}/pilot.txt'.format(workspace, i)) == id
+        for host_result in results:
+            for command_result in host_result:
+                for host, process_result in command_result.items():
+                    assert process_result['returncode'] == 0, process_result['stderr']
+                    assert '-tt' not in process_result['cmd']
+
+
+@pytest.mark.skipif(pkgpanda.util.is_windows, reason="Windows does not support ssh native")
+def test_stream_outlives_process_timeout_async(sshd_manager, loop):
+    with sshd_manager.run(1) as sshd_ports:
+        workspace = str(sshd_manager.tmpdir)
+        # Streaming 64 MiB takes longer than process_timeout, but the stream timeout is scaled to its size.
+        with open(workspace + '/big.bin', 'wb') as fh:
+            fh.truncate(64 * 1024 * 1024)
+        runner = MultiRunner(['127.0.0.1:{}'.format(port) for port in sshd_ports], user=getpass.getuser(),
+                             key_path=sshd_manager.key_path, process_timeout=0.05)
+
+        chain = CommandChain('test')
+        chain.add_stream({workspace + '/big.bin': 'big.bin'}, workspace + '/streamed')
+        try:
+            results = loop.run_until_complete(runner.run_commands_chain_async([chain], block=True,
+                                                                              state_json_dir=workspace))
+        finally:
+            loop.close()
+
+        assert os.path.getsize(workspace + '/streamed/big.bin') == 64 * 1024 * 1024
+        for host_result in results:
+            for command_result in host_result:
+                for host, process_result in command_result.items():
+                    assert process_result['returncode'] == 0, process_result['stderr']
+
+
+@pytest.mark.skipif(pkgpanda.util.is_windows, reason="Windows does not support ssh native")
+def test_stream_checksum_mismatch_async(sshd_manager, loop):
+    with sshd_manager.run(1) as sshd_ports:
+        workspace = str(sshd_manager.tmpdir)
+        pkgpanda.util.write_string(workspace + '/pilot.txt', uuid.uuid4().hex)
+        runner = MultiRunner(['127.0.0.1:{}'.format(port) for port in sshd_ports], user=getpass.getuser(),
+                             key_path=sshd_manager.key_path)
+
+        chain = CommandChain('test')
+        chain.add_stream({workspace + '/pilot.txt': 'pilot.txt'}, workspace + '/streamed',
+                         checksums={'pilot.txt': '0' * 40})
+        try:
+            results = loop.run_until_complete(runner.run_commands_chain_async([chain], block=True,
+                                                                              state_json_dir=workspace))
+        finally:
+            loop.close()
+
+        for host_result in results:
+            for command_result in host_result:
+                for host, process_result in command_result.items():
+                    assert process_result['returncode'] != 0
+
+
+@pytest.mark.skipif(pkgpanda.util.is_windows, reason="Windows does not support ssh native")
+@pytest.mark.parametrize('multiplex', [False, True])
+def test_stream_peer_fanout_async(sshd_manager, loop, multiplex):
+    with sshd_manager.run(2) as sshd_ports:
+        workspace = str(sshd_manager.tmpdir)
+        id = uuid.uuid4().hex
+        pkgpanda.util.write_string(workspace + '/pilot.txt', id)
+        runner = MultiRunner(['127.0.0.1:{}'.format(port) for port in sshd_ports], user=getpass.getuser(),
+                             key_path=sshd_manager.key_path, peer_fanout=1, multiplex=multiplex)
+
+        chain = CommandChain('test')
+        chain.add_stream({workspace + '/pilot.txt': 'pilot.txt'}, workspace + '/streamed',
+                         checksums={'pilot.txt': pkgpanda.util.sha1(workspace + '/pilot.txt')})
+        # Keep the first host serving as a source while the second one is waiting for a slot.
+        chain.add_execute(['sleep', '2'])
+        try:
+            results = loop.run_until_complete(runner.run_commands_chain_async([chain], block=True,
+                                                                              state_json_dir=workspace))
+        finally:
+            loop.close()
+
+        assert pkgpanda.util.load_string(workspace + '/streamed/pilot.txt') == id
+        relayed = 0
+        for host_result in results:
+            assert len(host_result) == 2
+            for command_result in host_result:
+                for host, process_result in command_result.items():
+                    assert process_result['returncode'] == 0, process_result['stderr']
+                    relayed += '-oForwardAgent=yes' in process_result['cmd']
+        # The first host is fed from the local host, the second one from the first.
+        assert relayed == 1
@@ -1,4 +1,6 @@
+import asyncio
 import copy
+import json
 import os
 import tempfile
 
@@ -6,6 +8,8 @@ import pytest
 
 import pkgpanda.util
 import ssh.validate
+from ssh.runner import AdaptiveLimiter, ArtifactSources, MultiRunner, Node, percentile
+from ssh.utils import CommandChain, JsonDelegate
 
 
 @pytest.fixture
@@ -121,3 +125,213 @@ def test_ssh_parallelism(default_config):
         default_config['ssh_parallelism'] = 'foo'
         assert ssh.validate.validate_config(default_config) == {
             'ssh_parallelism': 'Must be an integer but got a str: foo'}
+
+
+@pytest.mark.skipif(pkgpanda.util.is_windows, reason="Windows does not support ssh native")
+def test_ssh_adaptive_parallelism(default_config):
+    with tempfile.NamedTemporaryFile() as tmp:
+        default_config['ssh_key_path'] = tmp.name
+
+        default_config['ssh_adaptive_parallelism'] = False
+        assert ssh.validate.validate_config(default_config) == {}
+
+        default_config['ssh_adaptive_parallelism'] = 'yes'
+        assert ssh.validate.validate_config(default_config) == {
+            'ssh_adaptive_parallelism': "Must be one of 'true', 'false'. Got 'yes'."}
+
+
+@pytest.mark.skipif(pkgpanda.util.is_windows, reason="Windows does not support ssh native")
+def test_deploy_peer_fanout(default_config):
+    with tempfile.NamedTemporaryFile() as tmp:
+        default_config['ssh_key_path'] = tmp.name
+
+        default_config['deploy_peer_fanout'] = -1
+        assert ssh.validate.validate_config(default_config) == {
+            'deploy_peer_fanout': 'Must be above 0'}
+
+        default_config['deploy_peer_fanout'] = 4
+        assert ssh.validate.validate_config(default_config) == {}
+
+        default_config['deploy_peer_fanout'] = 'foo'
+        assert ssh.validate.validate_config(default_config) == {
+            'deploy_peer_fanout': 'Must be an integer but got a str: foo'}
+
+
+@pytest.mark.skipif(pkgpanda.util.is_windows, reason="Windows does not support ssh native")
+def test_deploy_compress_artifacts(default_config):
+    with tempfile.NamedTemporaryFile() as tmp:
+        default_config['ssh_key_path'] = tmp.name
+
+        default_config['deploy_compress_artifacts'] = True
+        assert ssh.validate.validate_config(default_config) == {}
+
+        default_config['deploy_compress_artifacts'] = 'false'
+        assert ssh.validate.validate_config(default_config) == {}
+
+        default_config['deploy_compress_artifacts'] = 'yes'
+        assert ssh.validate.validate_config(default_config) == {
+            'deploy_compress_artifacts': "Must be one of 'true', 'false'. Got 'yes'."}
+
+
+@pytest.mark.skipif(pkgpanda.util.is_windows, reason="Windows does not support ssh native")
+def test_ssh_max_failures(default_config):
+    with tempfile.NamedTemporaryFile() as tmp:
+        default_config['ssh_key_path'] = tmp.name
+
+        default_config['ssh_max_failures'] = -1
+        assert ssh.validate.validate_config(default_config) == {
+            'ssh_max_failures': 'Must be above 0'}
+
+        default_config['ssh_max_failures'] = 0
+        assert ssh.validate.validate_config(default_config) == {}
+
+        # empty means no limit
+        default_config['ssh_max_failures'] = ''
+        assert ssh.validate.validate_config(default_config) == {}
+
+        default_config['ssh_max_failures'] = 'foo'
+        assert ssh.validate.validate_config(default_config) == {
+            'ssh_max_failures': 'Must be an integer but got a str: foo'}
+
+
+def _command_future(name, host, returncode=0):
+    future = asyncio.Future()
+    future.set_result((name, {'{}:{}'.format(host.ip, host.port): {'returncode': returncode}}, host))
+    return future
+
+
+def test_json_delegate_coalesces_updates(tmpdir):
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    state_dir = str(tmpdir)
+    nodes = [Node('127.0.0.1', {'role': 'master'}), Node('127.0.0.2', {'role': 'agent'})]
+    delegate = JsonDelegate(state_dir, len(nodes), flush_interval=60, event_log=True)
+
+    try:
+        delegate.prepare_status('test', nodes)
+        for node in nodes:
+            delegate.on_update(_command_future('test', node), asyncio.Future())
+            delegate.on_update(_command_future('test', node), asyncio.Future())
+
+        # Only the status prepared up front has been written so far.
+        with open(os.path.join(state_dir, 'test.json')) as fh:
+            assert all(host['commands'] == [] for host in json.load(fh)['hosts'].values())
+
+        delegate.on_done('test', {'127.0.0.1:22': {}}, host_status='success')
+        delegate.on_done('test', {'127.0.0.2:22': {}}, host_status='failed')
+    finally:
+        loop.close()
+
+    # The last host finishing writes the state right away.
+    with open(os.path.join(state_dir, 'test.json')) as fh:
+        status_json = json.load(fh)
+    assert status_json['hosts']['127.0.0.1:22']['host_status'] == 'success'
+    assert status_json['hosts']['127.0.0.2:22']['host_status'] == 'failed'
+    assert len(status_json['hosts']['127.0.0.2:22']['commands']) == 2
+    assert [f for f in os.listdir(state_dir) if f.startswith('.')] == []
+
+    with open(os.path.join(state_dir, 'test.events.jsonl')) as fh:
+        events = [json.loads(line) for line in fh]
+    assert len(events) == 6
+    assert events[-1] == {'chain_name': 'test', 'host': '127.0.0.2:22', 'host_status': 'failed'}
+
+
+def test_percentile():
+    assert percentile([3, 1, 2], 50) == 2
+    assert percentile(list(range(1, 101)), 90) == 90
+    assert percentile(list(range(1, 101)), 99) == 99
+    assert percentile([5], 99) == 5
+
+
+def test_stream_timeout(tmpdir):
+    artifact = tmpdir.join('artifact.tar')
+    artifact.write_binary(b'0' * 3 * MultiRunner.STREAM_MIN_RATE)
+    files = {str(artifact): 'artifact.tar'}
+
+    runner = MultiRunner(['127.0.0.1'], process_timeout=10)
+    assert runner._get_stream_timeout(files) == 13
+
+    runner = MultiRunner(['127.0.0.1'], process_timeout=10, stream_timeout=600)
+    assert runner._get_stream_timeout(files) == 600
+
+
+def test_artifact_sources_acquire_local():
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    sources = ArtifactSources(1)
+    peer = Node('127.0.0.2')
+    try:
+        assert loop.run_until_complete(sources.acquire()) is None
+        loop.run_until_complete(sources.release(peer))
+
+        # A peer is available, but a retry from the local host has to wait for the local slot.
+        retry = asyncio.async(sources.acquire_local())
+        loop.run_until_complete(asyncio.sleep(0))
+        assert not retry.done()
+        loop.run_until_complete(sources.release(None))
+        loop.run_until_complete(retry)
+        assert loop.run_until_complete(sources.acquire()) == peer
+    finally:
+        loop.close()
+
+
+def test_adaptive_limiter():
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    limiter = AdaptiveLimiter(8, adaptive=True)
+    try:
+        loop.run_until_complete(limiter.record('copy', 0, 1, False))
+        # A command three times slower than usual halves the limit ...
+        loop.run_until_complete(limiter.record('copy', 1, 10, False))
+        assert limiter.limit == 4
+        # ... but only once for commands which were already running at that time.
+        loop.run_until_complete(limiter.record('copy', 2, 10, False))
+        assert limiter.limit == 4
+        loop.run_until_complete(limiter.record('copy', 20, 1, True))
+        assert limiter.limit == 2
+
+        # The limit grows back by one after limit commands completed in time.
+        loop.run_until_complete(limiter.record('copy', 30, 1, False))
+        assert limiter.limit == 2
+        loop.run_until_complete(limiter.record('copy', 31, 1, False))
+        assert limiter.limit == 3
+    finally:
+        loop.close()
+
+
+def test_adaptive_limiter_baseline_per_role():
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    limiter = AdaptiveLimiter(8, adaptive=True)
+    try:
+        loop.run_until_complete(limiter.record('install', 0, 1, False, role='agent'))
+        loop.run_until_complete(limiter.record('install', 0, 30, False, role='master'))
+        # Masters being slower than agents isn't a slowdown.
+        assert limiter.limit == 8
+        loop.run_until_complete(limiter.record('install', 1, 10, False, role='agent'))
+        assert limiter.limit == 4
+    finally:
+        loop.close()
+
+
+def test_max_failures_per_run(tmpdir):
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    runner = MultiRunner(['127.0.0.1', '127.0.0.2'], parallelism=1, max_failures=0)
+    started = []
+
+    @asyncio.coroutine
+    def run_chain_command(chain, host, chain_result, limiter):
+        started.append(host.ip)
+        return 'failed'
+
+    runner._run_chain_command = run_chain_command
+    chain = CommandChain('test')
+    try:
+        loop.run_until_complete(runner.run_commands_chain_async([chain], block=True, state_json_dir=str(tmpdir)))
+        assert started == ['127.0.0.1']
+        # Failures of an earlier run don't skip hosts of the next one.
+        loop.run_until_complete(runner.run_commands_chain_async([chain], block=True, state_json_dir=str(tmpdir)))
+        assert started == ['127.0.0.1', '127.0.0.1']
+    finally:
+        loop.close()
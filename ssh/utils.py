@@ -1,8 +1,11 @@
 import abc
+import asyncio
 import datetime
 import json
 import logging
 import os
+import tempfile
+import time
 from typing import Callable, Union
 
 log = logging.getLogger(__name__)
@@ -19,6 +22,7 @@ class CommandChain():
     '''
     execute_flag = 'execute'
     copy_flag = 'copy'
+    stream_flag = 'stream'
 
     def __init__(self, namespace):
         self.commands_stack = []
@@ -30,6 +34,18 @@ class CommandChain():
     def add_copy(self, local_path, remote_path, remote_to_local=False, recursive=False, stage=None):
         self.commands_stack.append((self.copy_flag, local_path, remote_path, remote_to_local, recursive, stage))
 
+    def add_stream(self, files: dict, remote_path, compress=False, checksums=None, stage=None):
+        '''
+        Send several local files to a remote host as a single tar stream which is extracted in one step.
+
+        :param files: dict, maps a local path to its destination relative to remote_path
+        :param remote_path: String, directory the archive is extracted into
+        :param compress: Bool, gzip the stream
+        :param checksums: dict (optional), maps a destination to its sha1, verified after extraction
+        :param stage: String (optional)
+        '''
+        self.commands_stack.append((self.stream_flag, files, remote_path, compress, checksums, stage))
+
     def get_commands(self):
         # Return all commands
         return self.commands_stack
@@ -73,11 +89,24 @@ class AbstractSSHLibDelegate(metaclass=abc.ABCMeta):
 
 
 class JsonDelegate(AbstractSSHLibDelegate):
-    def __init__(self, state_dir, targets_len, total_hosts=None, total_masters=None, total_agents=None, **kwargs):
+    """
+    Tracks the state of every chain in <state_dir>/<chain>.json.
+
+    The state is kept in memory and written out atomically at most once every flush_interval seconds, and right away
+    once no host of a chain is running anymore. With event_log set every update is also appended as a single json line
+    to <state_dir>/<chain>.events.jsonl for consumers which want to follow the progress.
+    """
+    def __init__(self, state_dir, targets_len, total_hosts=None, total_masters=None, total_agents=None,
+                 flush_interval=1, event_log=False, **kwargs):
         self.state_dir = state_dir
         self.total_hosts = total_hosts if total_hosts else targets_len
         self.total_masters = total_masters
         self.total_agents = total_agents
+        self.flush_interval = flush_interval
+        self.event_log = event_log
+        self._states = {}
+        self._last_flush = {}
+        self._pending_flush = {}
 
     def _update_chain_props(self, status_json, name):
         # Update chain properties. We may update the properties
@@ -97,20 +126,62 @@ class JsonDelegate(AbstractSSHLibDelegate):
         status_json['chain_name'] = name
 
     def _read_json_state(self, name):
+        if name in self._states:
+            return self._states[name]
+
+        status_json = {}
         status_file = os.path.join(self.state_dir, '{}.json'.format(name))
         if os.path.isfile(status_file):
             with open(status_file) as f:
-                return json.load(f)
-        return {}
+                status_json = json.load(f)
+        self._states[name] = status_json
+        return status_json
 
     def _dump_json_state(self, name, status_json):
         status_file = os.path.join(self.state_dir, '{}.json'.format(name))
 
-        with open(status_file, 'w') as f:
-            try:
+        # Readers must never see a partially written file, so write a temporary one and move it into place.
+        try:
+            with tempfile.NamedTemporaryFile('w', dir=self.state_dir, prefix='.{}.'.format(name),
+                                             delete=False) as f:
                 json.dump(status_json, f)
-            except IOError:
-                log.error('Could not update state file {}'.format(status_file))
+            os.replace(f.name, status_file)
+        except IOError:
+            log.error('Could not update state file {}'.format(status_file))
+
+    def _append_event(self, name, event):
+        if not self.event_log:
+            return
+
+        events_file = os.path.join(self.state_dir, '{}.events.jsonl'.format(name))
+        try:
+            with open(events_file, 'a') as f:
+                f.write(json.dumps(event) + '\n')
+        except IOError:
+            log.error('Could not append to event log {}'.format(events_file))
+
+    def flush(self, name=None):
+        """Write out the state of chain name, or of every chain with pending updates if name is None."""
+        names = [name] if name is not None else list(self._pending_flush)
+        for name in names:
+            handle = self._pending_flush.pop(name, None)
+            if handle is not None:
+                handle.cancel()
+            self._dump_json_state(name, self._read_json_state(name))
+            self._last_flush[name] = time.monotonic()
+
+    def _schedule_flush(self, name):
+        if name in self._pending_flush:
+            return
+
+        delay = self._last_flush.get(name, 0) + self.flush_interval - time.monotonic()
+        if delay <= 0:
+            self.flush(name)
+        else:
+            self._pending_flush[name] = asyncio.get_event_loop().call_later(delay, self.flush, name)
+
+    def _is_chain_running(self, status_json):
+        return any(host.get('host_status') in ('unstarted', 'running') for host in status_json['hosts'].values())
 
     def on_update(self, future, callback_called):
         self._update_json_file(*future.result(), future_update=True, callback_called=callback_called)
@@ -145,11 +216,17 @@ class JsonDelegate(AbstractSSHLibDelegate):
                         status_json['hosts'][host]['host_status'] == 'unstarted'):
                     status_json['hosts'][host]['host_status'] = 'running'
 
+                self._append_event(name, {'chain_name': name, 'host': host, 'command': return_values})
+
         # Update chain status: success or fail
         if host_status:
             status_json['hosts'][host]['host_status'] = host_status
+            self._append_event(name, {'chain_name': name, 'host': host, 'host_status': host_status})
 
-        self._dump_json_state(name, status_json)
+        if host_status and not self._is_chain_running(status_json):
+            self.flush(name)
+        else:
+            self._schedule_flush(name)
         if callback_called:
                 callback_called.set_result(True)
 
@@ -171,4 +248,4 @@ class JsonDelegate(AbstractSSHLibDelegate):
             json_status['hosts'][ip_port]['tags'] = node.tags
             json_status['hosts'][ip_port]['host_status'] = 'unstarted'
 
-        self._dump_json_state(name, json_status)
+        self.flush(name)
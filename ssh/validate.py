@@ -27,6 +27,12 @@ def validate_agent_lists(agent_list, public_agent_list):
     compare_lists(agent_list, public_agent_list)
 
 
+def validate_ssh_max_failures(ssh_max_failures):
+    # Empty means hosts keep being dispatched no matter how many failed.
+    if ssh_max_failures != '':
+        gen.calc.validate_int_in_range(ssh_max_failures, 0, None)
+
+
 source = Source({
     'validate': [
         lambda agent_list: gen.calc.validate_ip_list(agent_list),
@@ -39,7 +45,11 @@ source = Source({
         lambda agent_list, public_agent_list: compare_lists(agent_list, public_agent_list),
         validate_ssh_key_path,
         lambda ssh_port: gen.calc.validate_int_in_range(ssh_port, 1, 32000),
-        lambda ssh_parallelism: gen.calc.validate_int_in_range(ssh_parallelism, 1, 100)
+        lambda ssh_parallelism: gen.calc.validate_int_in_range(ssh_parallelism, 1, 100),
+        lambda ssh_adaptive_parallelism: gen.calc.validate_true_false(ssh_adaptive_parallelism),
+        lambda deploy_peer_fanout: gen.calc.validate_int_in_range(deploy_peer_fanout, 0, None),
+        lambda deploy_compress_artifacts: gen.calc.validate_true_false(deploy_compress_artifacts),
+        validate_ssh_max_failures
     ],
     'default': {
         'ssh_key_path': 'genconf/ssh_key',
@@ -48,7 +58,11 @@ source = Source({
         'ssh_user': 'centos',
         'ssh_port': '22',
         'process_timeout': '120',
-        'ssh_parallelism': '20'
+        'ssh_parallelism': '20',
+        'ssh_adaptive_parallelism': 'true',
+        'deploy_peer_fanout': '0',
+        'deploy_compress_artifacts': 'false',
+        'ssh_max_failures': ''
     }
 })
 
@@ -62,6 +76,10 @@ def get_target():
         'agent_list',
         'public_agent_list',
         'ssh_parallelism',
+        'ssh_adaptive_parallelism',
+        'deploy_peer_fanout',
+        'deploy_compress_artifacts',
+        'ssh_max_failures',
         'process_timeout'})
 
 